@@ -0,0 +1,205 @@
+# inventory/aggregation.py
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import Substr, Upper
+from django.utils import timezone
+from datetime import timedelta
+from .models import Rack, Shelf, Bin, Item, StockAddition, Disposition
+
+
+TIMEFRAME_DELTAS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'quarter': timedelta(days=90),
+}
+
+
+def timeframe_threshold(timeframe, now=None):
+    """
+    Convert a report timeframe ('day', 'week', 'month', 'quarter', 'all')
+    into the earliest datetime it covers.
+
+    Returns:
+        A datetime, or None when the timeframe is 'all' or unknown
+    """
+    delta = TIMEFRAME_DELTAS.get(timeframe)
+    if delta is None:
+        return None
+    return (now or timezone.now()) - delta
+
+
+def _grouped(queryset, group_field, **aggregates):
+    """
+    Run a single GROUP BY query and return {group_value: {aggregate: value}}.
+    """
+    rows = queryset.order_by().values(group_field).annotate(**aggregates)
+    return {row.pop(group_field): row for row in rows}
+
+
+def warehouse_metrics(warehouses, updated_since=None, movement_days=30):
+    """
+    Compute structure, stock and movement metrics for a set of warehouses.
+
+    The work is done in a fixed number of grouped queries (one each for
+    racks, shelves, bins, items, additions and dispositions) regardless of
+    how many warehouses are included.
+
+    Args:
+        warehouses: Iterable or queryset of Warehouse objects
+        updated_since: Only count racks/shelves/bins/items updated at or
+            after this datetime (None for no filter)
+        movement_days: Window in days for addition/disposition totals
+
+    Returns:
+        Dictionary keyed by warehouse id with the metrics for each warehouse
+    """
+    warehouse_ids = [warehouse.id for warehouse in warehouses]
+    if not warehouse_ids:
+        return {}
+
+    updated_filter = Q(updated_at__gte=updated_since) if updated_since else Q()
+    movement_since = timezone.now() - timedelta(days=movement_days)
+
+    racks = _grouped(
+        Rack.objects.filter(updated_filter, warehouse_id__in=warehouse_ids),
+        'warehouse_id',
+        total=Count('id'),
+    )
+    shelves = _grouped(
+        Shelf.objects.filter(updated_filter, rack__warehouse_id__in=warehouse_ids),
+        'rack__warehouse_id',
+        total=Count('id'),
+    )
+    # Bins with items are counted over every bin in the warehouse, independent
+    # of the timeframe filter applied to the bin total.
+    bins = _grouped(
+        Bin.objects.filter(shelf__rack__warehouse_id__in=warehouse_ids),
+        'shelf__rack__warehouse_id',
+        total=Count('id', filter=updated_filter or None, distinct=True),
+        with_items=Count('id', filter=Q(items__isnull=False), distinct=True),
+    )
+    items = _grouped(
+        Item.objects.filter(updated_filter, warehouse_id__in=warehouse_ids),
+        'warehouse_id',
+        total=Count('id'),
+        quantity=Sum('quantity'),
+        unique_names=Count('name', distinct=True),
+    )
+    additions = _grouped(
+        StockAddition.objects.filter(
+            warehouse_id__in=warehouse_ids,
+            timestamp__gte=movement_since
+        ),
+        'warehouse_id',
+        total=Sum('quantity'),
+    )
+    dispositions = _grouped(
+        Disposition.objects.filter(
+            warehouse_id__in=warehouse_ids,
+            timestamp__gte=movement_since
+        ),
+        'warehouse_id',
+        total=Sum('quantity'),
+    )
+
+    metrics = {}
+    for warehouse_id in warehouse_ids:
+        bins_count = bins.get(warehouse_id, {}).get('total', 0)
+        bins_with_items = bins.get(warehouse_id, {}).get('with_items', 0)
+        items_count = items.get(warehouse_id, {}).get('total', 0)
+        items_quantity = items.get(warehouse_id, {}).get('quantity') or 0
+        added = additions.get(warehouse_id, {}).get('total') or 0
+        disposed = dispositions.get(warehouse_id, {}).get('total') or 0
+
+        metrics[warehouse_id] = {
+            'racks': racks.get(warehouse_id, {}).get('total', 0),
+            'shelves': shelves.get(warehouse_id, {}).get('total', 0),
+            'bins': bins_count,
+            'bins_with_items': bins_with_items,
+            'bins_utilization': (bins_with_items / bins_count) * 100 if bins_count > 0 else 0,
+            'items': items_count,
+            'unique_items': items.get(warehouse_id, {}).get('unique_names', 0),
+            'quantity': items_quantity,
+            'avg_items_per_bin': items_count / bins_with_items if bins_with_items > 0 else 0,
+            'additions': added,
+            'dispositions': disposed,
+            'net_change': added - disposed,
+        }
+
+    return metrics
+
+
+def item_age_counts(items_query, now=None):
+    """
+    Count items by age bucket (< 30 days, 30-90 days, > 90 days) in one query.
+
+    Returns:
+        Dictionary with 'new', 'medium' and 'old' counts
+    """
+    now = now or timezone.now()
+    month_ago = now - timedelta(days=30)
+    quarter_ago = now - timedelta(days=90)
+
+    counts = items_query.order_by().aggregate(
+        new=Count('id', filter=Q(created_at__gte=month_ago)),
+        medium=Count('id', filter=Q(created_at__lt=month_ago, created_at__gte=quarter_ago)),
+        old=Count('id', filter=Q(created_at__lt=quarter_ago)),
+    )
+    return {key: value or 0 for key, value in counts.items()}
+
+
+def category_counts(items_query):
+    """
+    Group items into pseudo-categories by the first letter of their name.
+
+    Returns:
+        Dictionary of {category name: {'items': count, 'quantity': total}}
+    """
+    rows = items_query.exclude(name='').order_by().values(
+        letter=Upper(Substr('name', 1, 1))
+    ).annotate(items=Count('id'), quantity=Sum('quantity'))
+
+    return {
+        f"Group {row['letter']}": {'items': row['items'], 'quantity': row['quantity'] or 0}
+        for row in rows
+    }
+
+
+def movement_by_period(warehouses, periods):
+    """
+    Total additions and dispositions for several time periods at once.
+
+    Args:
+        warehouses: Queryset of warehouses to include
+        periods: List of (label, start, end) tuples
+
+    Returns:
+        List of dictionaries with 'month', 'additions', 'dispositions' and
+        'net_change' for each period, in the order given
+    """
+    def period_totals(model):
+        aggregates = {
+            f'period_{index}': Sum(
+                'quantity',
+                filter=Q(timestamp__gte=start, timestamp__lt=end)
+            )
+            for index, (label, start, end) in enumerate(periods)
+        }
+        return model.objects.filter(
+            warehouse__in=warehouses
+        ).aggregate(**aggregates)
+
+    additions = period_totals(StockAddition)
+    dispositions = period_totals(Disposition)
+
+    movement = []
+    for index, (label, start, end) in enumerate(periods):
+        added = additions[f'period_{index}'] or 0
+        disposed = dispositions[f'period_{index}'] or 0
+        movement.append({
+            'month': label,
+            'additions': added,
+            'dispositions': disposed,
+            'net_change': added - disposed
+        })
+    return movement
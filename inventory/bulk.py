@@ -0,0 +1,317 @@
+# inventory/bulk.py
+import csv
+import io
+import json
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .models import Bin, Item, StockAddition, Disposition
+from . import rollups, search
+
+
+BULK_ACTIONS = ('add', 'dispose', 'transfer')
+LOOKUP_CHUNK_SIZE = 2000
+WRITE_BATCH_SIZE = 1000
+
+ADDITION_TYPES = {value for value, label in StockAddition.ADDITION_TYPES}
+DISPOSITION_TYPES = {value for value, label in Disposition.DISPOSITION_TYPES}
+DEFAULT_ADDITION_TYPE = 'correction'
+DEFAULT_DISPOSITION_TYPE = 'other'
+
+ITEM_STATE_FIELDS = ('id', 'bin_id', 'warehouse_id', 'name', 'description', 'sku', 'quantity')
+
+
+def read_batch(data, fmt='csv'):
+    """
+    Parse a batch of stock adjustments.
+
+    CSV batches need a header row. JSON batches are a list of objects, or an
+    object with the list under "rows". Recognised columns are action (add,
+    dispose or transfer), item_id or sku, quantity, type, notes and to_bin
+    (destination bin id for transfers).
+
+    Args:
+        data: Batch contents as bytes or text
+        fmt: 'csv' or 'json'
+
+    Returns:
+        List of row dictionaries
+
+    Raises:
+        ValueError: If the batch cannot be read at all
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError('Batch is not UTF-8 encoded')
+
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('rows')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('JSON batches must be a list of objects')
+        return rows
+
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames:
+            raise ValueError('CSV batch has no header row')
+        # Extra cells without a header end up under the None key
+        return [{key: value for key, value in row.items() if key} for row in reader]
+
+    raise ValueError(f"Unsupported batch format '{fmt}'")
+
+
+def _chunked(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _positive_int(value, field):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be a whole number")
+    if number < 1:
+        raise ValueError(f"'{field}' must be at least 1")
+    return number
+
+
+def _ids(rows, field):
+    ids = set()
+    for row in rows:
+        try:
+            ids.add(int(_text(row, field)))
+        except ValueError:
+            pass
+    return ids
+
+
+class _BatchState:
+    """
+    Items, bins and bin contents referenced by a batch, fetched up front in
+    a handful of queries and updated in memory as rows are validated.
+    """
+
+    def __init__(self, user, rows):
+        item_ids = _ids(rows, 'item_id')
+        skus = {_text(row, 'sku') for row in rows if not _text(row, 'item_id') and _text(row, 'sku')}
+
+        self.items = {}
+        self.items_by_sku = defaultdict(list)
+        owned = Item.objects.filter(owner=user).select_for_update().order_by()
+        for chunk in _chunked(item_ids):
+            for item in owned.filter(id__in=chunk).values(*ITEM_STATE_FIELDS):
+                self.items[item['id']] = item
+        for chunk in _chunked(skus):
+            for item in owned.filter(sku__in=chunk).values(*ITEM_STATE_FIELDS):
+                self.items.setdefault(item['id'], item)
+                self.items_by_sku[item['sku']].append(self.items[item['id']])
+
+        self.bins = {}
+        for chunk in _chunked(_ids(rows, 'to_bin')):
+            self.bins.update(
+                Bin.objects.filter(id__in=chunk, shelf__rack__warehouse__user=user)
+                .values_list('id', 'shelf__rack__warehouse_id')
+            )
+
+        # Item names per bin, to respect the unique (bin, name) constraint
+        self.bin_names = defaultdict(set)
+        bin_ids = set(self.bins) | {item['bin_id'] for item in self.items.values()}
+        for chunk in _chunked(bin_ids):
+            for bin_id, name in Item.objects.filter(bin_id__in=chunk).values_list('bin_id', 'name'):
+                self.bin_names[bin_id].add(name)
+
+    def item_for(self, row):
+        item_id = _text(row, 'item_id')
+        if item_id:
+            try:
+                item = self.items.get(int(item_id))
+            except ValueError:
+                raise ValueError("'item_id' must be a whole number")
+            if item is None:
+                raise ValueError(f'Item {item_id} does not exist')
+            return item
+
+        sku = _text(row, 'sku')
+        if not sku:
+            raise ValueError("Each row needs an 'item_id' or 'sku'")
+        matches = self.items_by_sku.get(sku, [])
+        if not matches:
+            raise ValueError(f"No item has SKU '{sku}'")
+        if len(matches) > 1:
+            raise ValueError(f"SKU '{sku}' matches {len(matches)} items; use 'item_id' instead")
+        return matches[0]
+
+
+def apply_batch(user, rows, dry_run=False):
+    """
+    Validate and apply a batch of additions, dispositions and transfers.
+
+    Items and bins are looked up once for the whole batch and rows are
+    applied in order against that in-memory state, so later rows see the
+    quantities left by earlier ones. Valid rows are then written with bulk
+    inserts and updates inside one transaction; invalid rows are skipped
+    and reported.
+
+    Args:
+        user: Owner of the inventory being adjusted
+        rows: Row dictionaries, as returned by read_batch
+        dry_run: Validate the batch without saving anything
+
+    Returns:
+        Dictionary with the number of 'rows', 'applied' rows per action,
+        the list of row 'errors' and whether this was a 'dry_run'
+    """
+    applied = dict.fromkeys(BULK_ACTIONS, 0)
+    errors = []
+
+    with transaction.atomic():
+        state = _BatchState(user, rows)
+        additions = []
+        dispositions = []
+        new_items = []
+        changed_ids = set()
+        moved_ids = set()
+        touched_bins = set()
+
+        for number, row in enumerate(rows, start=1):
+            try:
+                action = _text(row, 'action').lower()
+                if action not in BULK_ACTIONS:
+                    raise ValueError(f"'action' must be one of: {', '.join(BULK_ACTIONS)}")
+                item = state.item_for(row)
+                quantity = _positive_int(_text(row, 'quantity'), 'quantity')
+                notes = _text(row, 'notes')
+
+                if action == 'add':
+                    addition_type = _text(row, 'type') or DEFAULT_ADDITION_TYPE
+                    if addition_type not in ADDITION_TYPES:
+                        raise ValueError(f"Unknown addition type '{addition_type}'")
+                    item['quantity'] += quantity
+                    additions.append(StockAddition(
+                        item_id=item['id'], quantity=quantity, addition_type=addition_type,
+                        notes=notes, created_by=user, owner=user,
+                        warehouse_id=item['warehouse_id']
+                    ))
+
+                elif action == 'dispose':
+                    disposition_type = _text(row, 'type') or DEFAULT_DISPOSITION_TYPE
+                    if disposition_type not in DISPOSITION_TYPES:
+                        raise ValueError(f"Unknown disposition type '{disposition_type}'")
+                    if quantity > item['quantity']:
+                        raise ValueError(
+                            f"Cannot dispose of {quantity} units of '{item['name']}'; "
+                            f"only {item['quantity']} available"
+                        )
+                    item['quantity'] -= quantity
+                    dispositions.append(Disposition(
+                        item_id=item['id'], quantity=quantity, disposition_type=disposition_type,
+                        notes=notes, created_by=user, owner=user,
+                        warehouse_id=item['warehouse_id']
+                    ))
+
+                else:
+                    to_bin = _text(row, 'to_bin')
+                    try:
+                        to_bin = int(to_bin)
+                    except ValueError:
+                        raise ValueError("Transfers need a numeric 'to_bin'")
+                    if to_bin not in state.bins:
+                        raise ValueError(f'Bin {to_bin} does not exist')
+                    if to_bin == item['bin_id']:
+                        raise ValueError(f"'{item['name']}' is already in bin {to_bin}")
+                    if quantity > item['quantity']:
+                        raise ValueError(
+                            f"Cannot transfer {quantity} units of '{item['name']}'; "
+                            f"only {item['quantity']} available"
+                        )
+                    if item['name'] in state.bin_names[to_bin]:
+                        raise ValueError(f"Bin {to_bin} already has an item named '{item['name']}'")
+
+                    touched_bins.update((item['bin_id'], to_bin))
+                    state.bin_names[to_bin].add(item['name'])
+                    if quantity == item['quantity']:
+                        # Transfer the entire item
+                        state.bin_names[item['bin_id']].discard(item['name'])
+                        item['bin_id'] = to_bin
+                        item['warehouse_id'] = state.bins[to_bin]
+                        moved_ids.add(item['id'])
+                    else:
+                        # Transfer part of the quantity to a new item in the destination
+                        item['quantity'] -= quantity
+                        new_items.append(Item(
+                            name=item['name'], description=item['description'], sku=item['sku'],
+                            bin_id=to_bin, quantity=quantity, owner=user,
+                            warehouse_id=state.bins[to_bin]
+                        ))
+            except ValueError as e:
+                errors.append({'row': number, 'error': str(e)})
+                continue
+
+            applied[action] += 1
+            changed_ids.add(item['id'])
+            touched_bins.add(item['bin_id'])
+
+        if not dry_run:
+            _write_batch(state, additions, dispositions, new_items, changed_ids, moved_ids, touched_bins)
+
+    return {
+        'rows': len(rows),
+        'applied': applied,
+        'errors': errors,
+        'dry_run': dry_run,
+    }
+
+
+def _write_batch(state, additions, dispositions, new_items, changed_ids, moved_ids, touched_bins):
+    """
+    Save the result of a validated batch. Bulk writes skip Model.save() and
+    signals, so the denormalized locations, stock summaries and search
+    entries are brought up to date here.
+    """
+    StockAddition.objects.bulk_create(additions, batch_size=WRITE_BATCH_SIZE)
+    Disposition.objects.bulk_create(dispositions, batch_size=WRITE_BATCH_SIZE)
+    Item.objects.bulk_create(new_items, batch_size=WRITE_BATCH_SIZE)
+
+    now = timezone.now()
+    Item.objects.bulk_update(
+        [
+            Item(
+                id=item_id,
+                quantity=state.items[item_id]['quantity'],
+                bin_id=state.items[item_id]['bin_id'],
+                warehouse_id=state.items[item_id]['warehouse_id'],
+                updated_at=now,
+            )
+            for item_id in changed_ids
+        ],
+        ['quantity', 'bin', 'warehouse', 'updated_at'],
+        batch_size=WRITE_BATCH_SIZE
+    )
+
+    # Stock history follows a transferred item, as in Item.save()
+    moved_by_warehouse = defaultdict(list)
+    for item_id in moved_ids:
+        moved_by_warehouse[state.items[item_id]['warehouse_id']].append(item_id)
+    for warehouse_id, item_ids in moved_by_warehouse.items():
+        for chunk in _chunked(item_ids):
+            StockAddition.objects.filter(item_id__in=chunk).update(warehouse_id=warehouse_id)
+            Disposition.objects.filter(item_id__in=chunk).update(warehouse_id=warehouse_id)
+
+    rollups.refresh_bins(touched_bins)
+
+    reindex_ids = list(moved_ids) + [item.id for item in new_items if item.id]
+    for chunk in _chunked(reindex_ids):
+        search.index_objects('item', Item.objects.filter(id__in=chunk))
@@ -0,0 +1,47 @@
+# inventory/locations.py
+from .models import Warehouse, Rack, Shelf, Bin, format_location
+
+
+PATH_BATCH_SIZE = 1000
+
+# Bin field pointing at each kind of container
+BIN_CONTAINER_FIELDS = {
+    Warehouse: 'warehouse',
+    Rack: 'rack',
+    Shelf: 'shelf',
+}
+
+
+def refresh_bin_paths(bins):
+    """
+    Recompute the stored location paths of a set of bins, e.g. after one of
+    their containers was renamed.
+
+    Args:
+        bins: Queryset of bins to update
+
+    Returns:
+        Number of bins updated
+    """
+    rows = bins.order_by().values_list(
+        'id', 'shelf__rack__warehouse__name', 'shelf__rack__name', 'shelf__name', 'name'
+    ).iterator(chunk_size=PATH_BATCH_SIZE)
+
+    updated = 0
+    batch = []
+    for bin_id, *names in rows:
+        batch.append(Bin(id=bin_id, location_path=format_location(*names)))
+        if len(batch) >= PATH_BATCH_SIZE:
+            Bin.objects.bulk_update(batch, ['location_path'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        Bin.objects.bulk_update(batch, ['location_path'])
+        updated += len(batch)
+    return updated
+
+
+def refresh_container_paths(container):
+    """Update the paths of every bin inside a warehouse, rack or shelf."""
+    field = BIN_CONTAINER_FIELDS[type(container)]
+    return refresh_bin_paths(Bin.objects.filter(**{field: container}))
@@ -0,0 +1,59 @@
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from inventory.bulk import read_batch, apply_batch
+
+class Command(BaseCommand):
+    help = 'Apply a CSV or JSON batch of stock additions, dispositions and transfers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON batch file')
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username that owns the inventory being adjusted'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help='Batch format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the batch without saving anything'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+        
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        if not os.path.exists(path):
+            raise CommandError(f"File '{path}' does not exist")
+        
+        with open(path, 'rb') as f:
+            try:
+                rows = read_batch(f.read(), fmt)
+            except ValueError as e:
+                raise CommandError(str(e))
+        
+        result = apply_batch(user, rows, dry_run=options['dry_run'])
+        
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['error']}"))
+        
+        applied = result['applied']
+        verb = 'Validated' if options['dry_run'] else 'Applied'
+        self.stdout.write(
+            f"{verb} {applied['add']} additions, {applied['dispose']} dispositions "
+            f"and {applied['transfer']} transfers from {result['rows']} rows"
+        )
+        
+        if result['errors']:
+            raise CommandError(f"{len(result['errors'])} rows were rejected")
+        
+        self.stdout.write(self.style.SUCCESS('Batch applied' if not options['dry_run'] else 'Batch is valid'))
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from inventory.rollups import rebuild_rollups, verify_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify the materialized inventory stock summaries'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild/verify summaries for this username (default: all users)'
+        )
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Report mismatches between summaries and source tables without rebuilding'
+        )
+    
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        
+        if not options['verify_only']:
+            written = rebuild_rollups(user=user)
+            self.stdout.write(
+                f"Rebuilt {written['bin']} bin, {written['warehouse']} warehouse "
+                f"and {written['user']} user summaries"
+            )
+        
+        mismatches = verify_rollups(user=user)
+        for level, owner_id, field, stored, expected in mismatches:
+            self.stdout.write(
+                self.style.WARNING(f'{level} {owner_id}: {field} is {stored}, expected {expected}')
+            )
+        
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} summary values do not match the source tables')
+        
+        self.stdout.write(self.style.SUCCESS('Inventory summaries match the source tables'))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from inventory.search import rebuild_search_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the inventory search index from the inventory tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild entries for this username (default: all users)'
+        )
+    
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        
+        written = rebuild_search_index(user=user)
+        summary = ', '.join(f'{count} {kind}' for kind, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {summary} entries'))
@@ -0,0 +1,108 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_stock_summaries(apps, schema_editor):
+    """
+    Populate the summary tables from existing inventory so that the
+    incremental updates made by inventory.rollups start from correct totals.
+    """
+    from collections import defaultdict
+
+    Bin = apps.get_model('inventory', 'Bin')
+    Item = apps.get_model('inventory', 'Item')
+    StockAddition = apps.get_model('inventory', 'StockAddition')
+    Disposition = apps.get_model('inventory', 'Disposition')
+
+    levels = [
+        ('bin_id', apps.get_model('inventory', 'BinStockSummary'), 'bin_id'),
+        ('bin__shelf__rack__warehouse_id', apps.get_model('inventory', 'WarehouseStockSummary'), 'warehouse_id'),
+        ('bin__shelf__rack__warehouse__user_id', apps.get_model('inventory', 'UserStockSummary'), 'user_id'),
+    ]
+    low_stock = models.Q(min_stock_level__gt=0, quantity__lt=models.F('min_stock_level'))
+
+    for path, summary_model, key in levels:
+        totals = defaultdict(dict)
+        for row in Item.objects.order_by().values(path).annotate(
+            item_count=models.Count('id'),
+            total_quantity=models.Sum('quantity'),
+            low_stock_count=models.Count('id', filter=low_stock),
+        ):
+            totals[row[path]].update(
+                item_count=row['item_count'],
+                total_quantity=row['total_quantity'] or 0,
+                low_stock_count=row['low_stock_count'],
+            )
+        for movement_model, field in ((StockAddition, 'added_quantity'), (Disposition, 'disposed_quantity')):
+            for row in movement_model.objects.order_by().values(f'item__{path}').annotate(
+                total=models.Sum('quantity')
+            ):
+                totals[row[f'item__{path}']][field] = row['total'] or 0
+
+        summary_model.objects.bulk_create(
+            [summary_model(**{key: owner_id}, **values) for owner_id, values in totals.items()],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0005_add_min_stock_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarehouseStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('added_quantity', models.BigIntegerField(default=0)),
+                ('disposed_quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('warehouse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summary', to='inventory.warehouse')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('added_quantity', models.BigIntegerField(default=0)),
+                ('disposed_quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_stock_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BinStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('added_quantity', models.BigIntegerField(default=0)),
+                ('disposed_quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bin', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summary', to='inventory.bin')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(build_stock_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def backfill_locations(apps, schema_editor):
+    """
+    Copy warehouse/owner onto items and their stock movements in batches,
+    committing each batch separately so large tables are not locked for the
+    whole run.
+    """
+    Item = apps.get_model('inventory', 'Item')
+    StockAddition = apps.get_model('inventory', 'StockAddition')
+    Disposition = apps.get_model('inventory', 'Disposition')
+
+    sources = [
+        (Item, 'bin__shelf__rack__warehouse_id', 'bin__shelf__rack__warehouse__user_id'),
+        (StockAddition, 'item__bin__shelf__rack__warehouse_id', 'item__bin__shelf__rack__warehouse__user_id'),
+        (Disposition, 'item__bin__shelf__rack__warehouse_id', 'item__bin__shelf__rack__warehouse__user_id'),
+    ]
+
+    for model, warehouse_path, owner_path in sources:
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id, warehouse__isnull=True)
+                .order_by('id')
+                .values_list('id', warehouse_path, owner_path)[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            objs = [model(id=row_id, warehouse_id=warehouse_id, owner_id=owner_id)
+                    for row_id, warehouse_id, owner_id in rows]
+            model.objects.bulk_update(objs, ['warehouse', 'owner'])
+            last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0007_item_location_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
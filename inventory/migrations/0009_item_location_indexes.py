@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_backfill_item_locations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disposition',
+            index=models.Index(fields=['owner', 'timestamp'], name='inventory_d_owner_i_bb78e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disposition',
+            index=models.Index(fields=['warehouse', 'timestamp'], name='inventory_d_warehou_0764a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['warehouse', 'quantity'], name='inventory_i_warehou_894097_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['owner', 'quantity'], name='inventory_i_owner_i_50058c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockaddition',
+            index=models.Index(fields=['owner', 'timestamp'], name='inventory_s_owner_i_f73784_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockaddition',
+            index=models.Index(fields=['warehouse', 'timestamp'], name='inventory_s_warehou_0fc675_idx'),
+        ),
+    ]
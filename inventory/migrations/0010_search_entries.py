@@ -0,0 +1,101 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:02
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SEARCH_LEVELS = [
+    ('warehouse', 'Warehouse', ['id', None, None, None, None, 'user_id']),
+    ('rack', 'Rack', ['warehouse_id', 'id', None, None, None, 'warehouse__user_id']),
+    ('shelf', 'Shelf', ['rack__warehouse_id', 'rack_id', 'id', None, None, 'rack__warehouse__user_id']),
+    ('bin', 'Bin', ['shelf__rack__warehouse_id', 'shelf__rack_id', 'shelf_id', 'id', None,
+                    'shelf__rack__warehouse__user_id']),
+    ('item', 'Item', ['bin__shelf__rack__warehouse_id', 'bin__shelf__rack_id', 'bin__shelf_id', 'bin_id', 'id',
+                      'bin__shelf__rack__warehouse__user_id']),
+]
+LOCATION_FIELDS = ['warehouse_id', 'rack_id', 'shelf_id', 'bin_id', 'item_id', 'owner_id']
+
+
+def build_search_entries(apps, schema_editor):
+    """
+    Index the existing warehouses, racks, shelves, bins and items. New and
+    changed objects are indexed by inventory.search from then on.
+    """
+    from django.contrib.postgres.search import SearchVector
+
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+
+    for kind, model_name, paths in SEARCH_LEVELS:
+        model = apps.get_model('inventory', model_name)
+        lookups = [path for path in paths if path] + ['name', 'description']
+        if kind == 'item':
+            lookups.append('sku')
+
+        entries = []
+        for row in model.objects.order_by().values_list(*lookups).iterator(chunk_size=2000):
+            values = iter(row)
+            location = {field: next(values) if path else None for field, path in zip(LOCATION_FIELDS, paths)}
+            name, description, *sku = values
+            sku = (sku[0] if sku else None) or ''
+            entries.append(SearchEntry(
+                kind=kind, name=name, sku=sku, description=description,
+                document=' '.join([name, sku, description]).lower(), **location
+            ))
+        SearchEntry.objects.bulk_create(entries, batch_size=1000)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        SearchEntry.objects.update(search_vector=(
+            SearchVector('name', weight='A', config='simple')
+            + SearchVector('sku', weight='A', config='simple')
+            + SearchVector('description', weight='B', config='simple')
+        ))
+
+
+def create_search_vector_index(apps, schema_editor):
+    # GIN indexes are PostgreSQL-only, so the index is not declared on the model
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX inventory_searchentry_vector_gin '
+            'ON inventory_searchentry USING gin (search_vector)'
+        )
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS inventory_searchentry_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0009_item_location_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('warehouse', 'Warehouse'), ('rack', 'Rack'), ('shelf', 'Shelf'), ('bin', 'Bin'), ('item', 'Item')], max_length=20)),
+                ('name', models.CharField(max_length=200)),
+                ('sku', models.CharField(blank=True, max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('document', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('bin', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.bin')),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.item')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('rack', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.rack')),
+                ('shelf', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.shelf')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.warehouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'kind'], name='inventory_s_owner_i_7fc939_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_vector_index, drop_search_vector_index),
+        migrations.RunPython(build_search_entries, migrations.RunPython.noop),
+    ]
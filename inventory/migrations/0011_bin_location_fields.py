@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_search_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bin',
+            name='location_path',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='bin',
+            name='rack',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.rack'),
+        ),
+        migrations.AddField(
+            model_name='bin',
+            name='warehouse',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.warehouse'),
+        ),
+    ]
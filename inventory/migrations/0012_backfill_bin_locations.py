@@ -0,0 +1,43 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def backfill_bin_locations(apps, schema_editor):
+    """
+    Copy rack/warehouse onto bins and build their location paths in batches,
+    committing each batch separately.
+    """
+    Bin = apps.get_model('inventory', 'Bin')
+
+    last_id = 0
+    while True:
+        rows = list(
+            Bin.objects.filter(id__gt=last_id, warehouse__isnull=True)
+            .order_by('id')
+            .values_list(
+                'id', 'shelf__rack_id', 'shelf__rack__warehouse_id',
+                'shelf__rack__warehouse__name', 'shelf__rack__name', 'shelf__name', 'name'
+            )[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        objs = [
+            Bin(id=bin_id, rack_id=rack_id, warehouse_id=warehouse_id, location_path=' > '.join(names))
+            for bin_id, rack_id, warehouse_id, *names in rows
+        ]
+        Bin.objects.bulk_update(objs, ['rack', 'warehouse', 'location_path'])
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0011_bin_location_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bin_locations, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.urls import reverse
 
 class Warehouse(models.Model):
     name = models.CharField(max_length=100)
@@ -31,15 +33,52 @@ class Shelf(models.Model):
     def __str__(self):
         return f"{self.rack.warehouse.name} - {self.rack.name} - {self.name}"
 
+LOCATION_SEPARATOR = ' > '
+
+def format_location(*names):
+    """Join container names into a display path such as "W1 > R1 > S1 > B1"."""
+    return LOCATION_SEPARATOR.join(names)
+
 class Bin(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     shelf = models.ForeignKey(Shelf, on_delete=models.CASCADE, related_name='bins')
+    # Denormalized from shelf -> rack -> warehouse so paths and URLs need no joins;
+    # container renames are propagated by inventory.locations
+    rack = models.ForeignKey(
+        Rack, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    location_path = models.CharField(max_length=500, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.shelf.rack.warehouse.name} - {self.shelf.rack.name} - {self.shelf.name} - {self.name}"
+        return self.location_path or self.name
+
+    def save(self, *args, **kwargs):
+        """
+        Keep the denormalized rack, warehouse and location path in sync with
+        the shelf and the bin's own name.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'name', 'shelf'} & set(update_fields):
+            return super().save(*args, **kwargs)
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'rack', 'warehouse', 'location_path'}
+
+        warehouse_name, rack_name, shelf_name, self.rack_id, self.warehouse_id = Shelf.objects.filter(
+            id=self.shelf_id
+        ).values_list('rack__warehouse__name', 'rack__name', 'name', 'rack_id', 'rack__warehouse_id').get()
+        self.location_path = format_location(warehouse_name, rack_name, shelf_name, self.name)
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return reverse('inventory:bin-detail', args=[self.warehouse_id, self.rack_id, self.shelf_id, self.id])
 
 # Add this field to the Item model in inventory/models.py
 
@@ -54,16 +93,63 @@ class Item(models.Model):
         help_text='Minimum stock level before item is considered low stock'
     )
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Denormalized from bin -> shelf -> rack -> warehouse for join-free filtering
+    warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['bin', 'name']
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['warehouse', 'quantity']),
+            models.Index(fields=['owner', 'quantity']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.bin})"
     
+    @property
+    def location(self):
+        """Display path of the item's bin; select_related('bin') to avoid a query."""
+        return self.bin.location_path
+    
+    def get_absolute_url(self):
+        return reverse('inventory:item-detail', args=[
+            self.warehouse_id, self.bin.rack_id, self.bin.shelf_id, self.bin_id, self.id
+        ])
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep the denormalized warehouse/owner columns in sync with the bin,
+        including the item's addition and disposition history on transfer.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'bin' not in update_fields:
+            return super().save(*args, **kwargs)
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'warehouse', 'owner'}
+        
+        previous_warehouse_id = self.warehouse_id
+        self.warehouse_id, self.owner_id = Bin.objects.filter(id=self.bin_id).values_list(
+            'shelf__rack__warehouse_id', 'shelf__rack__warehouse__user_id'
+        ).get()
+        
+        # History is moved first, so the stock summaries refreshed when the
+        # item is saved already count it in the new warehouse
+        if self.pk and previous_warehouse_id is not None and previous_warehouse_id != self.warehouse_id:
+            location = {'warehouse_id': self.warehouse_id, 'owner_id': self.owner_id}
+            self.additions.update(**location)
+            self.dispositions.update(**location)
+        super().save(*args, **kwargs)
+    
     @property 
     def is_low_stock(self):
         """Return True if current quantity is below minimum stock level."""
@@ -95,6 +181,26 @@ class Disposition(models.Model):
     notes = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    # Copied from the item so activity can be filtered without joins
+    warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'timestamp']),
+            models.Index(fields=['warehouse', 'timestamp']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.warehouse_id = self.item.warehouse_id
+        self.owner_id = self.item.owner_id
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.get_disposition_type_display()} - {self.quantity} units of {self.item.name}"
@@ -114,6 +220,115 @@ class StockAddition(models.Model):
     notes = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    # Copied from the item so activity can be filtered without joins
+    warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        null=True, editable=False, db_index=False
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'timestamp']),
+            models.Index(fields=['warehouse', 'timestamp']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.warehouse_id = self.item.warehouse_id
+        self.owner_id = self.item.owner_id
+        super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.get_addition_type_display()} - {self.quantity} units of {self.item.name}"
\ No newline at end of file
+        return f"{self.get_addition_type_display()} - {self.quantity} units of {self.item.name}"
+
+class StockSummary(models.Model):
+    """
+    Materialized stock totals, maintained by inventory.rollups whenever
+    items, stock additions or dispositions change.
+    """
+    item_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    added_quantity = models.BigIntegerField(default=0)
+    disposed_quantity = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class BinStockSummary(StockSummary):
+    bin = models.OneToOneField(Bin, on_delete=models.CASCADE, related_name='stock_summary')
+
+    def __str__(self):
+        return f"Stock summary for bin {self.bin_id}"
+
+class WarehouseStockSummary(StockSummary):
+    warehouse = models.OneToOneField(Warehouse, on_delete=models.CASCADE, related_name='stock_summary')
+
+    def __str__(self):
+        return f"Stock summary for warehouse {self.warehouse_id}"
+
+class UserStockSummary(StockSummary):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='inventory_stock_summary')
+
+    def __str__(self):
+        return f"Stock summary for user {self.user_id}"
+
+class SearchEntry(models.Model):
+    """
+    One row per warehouse, rack, shelf, bin and item, maintained by
+    inventory.search so that every level can be searched, ranked and
+    counted with a single query.
+    """
+    KINDS = [
+        ('warehouse', 'Warehouse'),
+        ('rack', 'Rack'),
+        ('shelf', 'Shelf'),
+        ('bin', 'Bin'),
+        ('item', 'Item'),
+    ]
+    DETAIL_URLS = {
+        'warehouse': 'inventory:warehouse-detail',
+        'rack': 'inventory:rack-detail',
+        'shelf': 'inventory:shelf-detail',
+        'bin': 'inventory:bin-detail',
+        'item': 'inventory:item-detail',
+    }
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # The indexed object and its ancestors; deleting any of them removes the entry
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='+')
+    rack = models.ForeignKey(Rack, on_delete=models.CASCADE, related_name='+', null=True)
+    shelf = models.ForeignKey(Shelf, on_delete=models.CASCADE, related_name='+', null=True)
+    bin = models.ForeignKey(Bin, on_delete=models.CASCADE, related_name='+', null=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='+', null=True)
+    name = models.CharField(max_length=200)
+    sku = models.CharField(max_length=100, blank=True)
+    description = models.TextField(blank=True)
+    # Lowercased name, SKU and description, used by the non-PostgreSQL backend
+    document = models.TextField(blank=True)
+    # Only populated on PostgreSQL, where migration 0010 adds a GIN index on it
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.name}"
+
+    def get_absolute_url(self):
+        path = [self.warehouse_id, self.rack_id, self.shelf_id, self.bin_id, self.item_id]
+        return reverse(self.DETAIL_URLS[self.kind], args=[pk for pk in path if pk])
+
+    @property
+    def location(self):
+        """Names of the containers above this entry, outermost first."""
+        containers = [self.warehouse, self.rack, self.shelf, self.bin]
+        depth = [kind for kind, label in self.KINDS].index(self.kind)
+        return ' > '.join(container.name for container in containers[:depth])
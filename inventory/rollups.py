@@ -0,0 +1,272 @@
+# inventory/rollups.py
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F
+from django.utils import timezone
+from .models import (
+    Warehouse, Bin, Item, StockAddition, Disposition,
+    BinStockSummary, WarehouseStockSummary, UserStockSummary
+)
+
+
+SUMMARY_FIELDS = (
+    'item_count', 'total_quantity', 'low_stock_count',
+    'added_quantity', 'disposed_quantity',
+)
+
+# Field holding the owner of each rollup level on items and on stock movements
+ITEM_PATHS = {
+    'bin': 'bin_id',
+    'warehouse': 'warehouse_id',
+    'user': 'owner_id',
+}
+
+MOVEMENT_PATHS = {
+    'bin': 'item__bin_id',
+    'warehouse': 'warehouse_id',
+    'user': 'owner_id',
+}
+
+SUMMARY_MODELS = {
+    'bin': (BinStockSummary, 'bin_id'),
+    'warehouse': (WarehouseStockSummary, 'warehouse_id'),
+    'user': (UserStockSummary, 'user_id'),
+}
+
+LOW_STOCK_FILTER = Q(min_stock_level__gt=0, quantity__lt=F('min_stock_level'))
+
+
+def _empty_totals():
+    return dict.fromkeys(SUMMARY_FIELDS, 0)
+
+
+def compute_totals(level, ids=None, user=None):
+    """
+    Compute summary totals from the source tables for one rollup level.
+
+    Args:
+        level: 'bin', 'warehouse' or 'user'
+        ids: Restrict to these owner ids (None for all)
+        user: Restrict to inventory belonging to this user (None for all)
+
+    Returns:
+        Dictionary keyed by owner id; owners without stock are omitted
+    """
+    path = ITEM_PATHS[level]
+    movement_path = MOVEMENT_PATHS[level]
+    items = Item.objects.all()
+    additions = StockAddition.objects.all()
+    dispositions = Disposition.objects.all()
+
+    if ids is not None:
+        items = items.filter(**{f'{path}__in': ids})
+        additions = additions.filter(**{f'{movement_path}__in': ids})
+        dispositions = dispositions.filter(**{f'{movement_path}__in': ids})
+    if user is not None:
+        items = items.filter(owner=user)
+        additions = additions.filter(owner=user)
+        dispositions = dispositions.filter(owner=user)
+
+    totals = defaultdict(_empty_totals)
+
+    item_rows = items.order_by().values(path).annotate(
+        item_count=Count('id'),
+        total_quantity=Sum('quantity'),
+        low_stock_count=Count('id', filter=LOW_STOCK_FILTER),
+    )
+    for row in item_rows:
+        totals[row[path]].update({
+            'item_count': row['item_count'],
+            'total_quantity': row['total_quantity'] or 0,
+            'low_stock_count': row['low_stock_count'],
+        })
+
+    for queryset, field in ((additions, 'added_quantity'), (dispositions, 'disposed_quantity')):
+        for row in queryset.order_by().values(movement_path).annotate(total=Sum('quantity')):
+            totals[row[movement_path]][field] = row['total'] or 0
+
+    return dict(totals)
+
+
+def _apply_deltas(level, deltas):
+    """
+    Add per-owner deltas to a summary table. Owners without a summary row
+    are initialised from the source tables instead, so the rollups heal
+    themselves if they were never built.
+    """
+    model, key = SUMMARY_MODELS[level]
+    deltas = {owner_id: delta for owner_id, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    existing = set(model.objects.filter(**{f'{key}__in': deltas}).values_list(key, flat=True))
+    missing = [owner_id for owner_id in deltas if owner_id not in existing]
+    if missing:
+        fresh = compute_totals(level, ids=missing)
+        for owner_id in missing:
+            model.objects.get_or_create(**{key: owner_id}, defaults=fresh.get(owner_id, _empty_totals()))
+
+    now = timezone.now()
+    for owner_id in existing:
+        model.objects.filter(**{key: owner_id}).update(
+            updated_at=now,
+            **{field: F(field) + value for field, value in deltas[owner_id].items()}
+        )
+
+
+def refresh_bins(bin_ids):
+    """
+    Recompute the summaries of the given bins and push the resulting
+    changes up to their warehouse and user summaries.
+    """
+    bin_ids = {bin_id for bin_id in bin_ids if bin_id}
+    if not bin_ids:
+        return
+
+    with transaction.atomic():
+        owners = {
+            bin_id: (warehouse_id, user_id)
+            for bin_id, warehouse_id, user_id in Bin.objects.filter(id__in=bin_ids).values_list(
+                'id', 'shelf__rack__warehouse_id', 'shelf__rack__warehouse__user_id'
+            )
+        }
+        for bin_id in owners:
+            BinStockSummary.objects.get_or_create(bin_id=bin_id)
+        # The rows are locked before the totals are read. A concurrent
+        # refresh of the same bins then waits here until the other
+        # transaction commits, and under READ COMMITTED the totals read
+        # below include its change. Reading first would let both compute
+        # totals missing the other's change, and the second writer's deltas
+        # would undo the first's at every level.
+        summaries = {
+            summary.bin_id: summary
+            for summary in BinStockSummary.objects.select_for_update().filter(bin_id__in=owners).order_by('bin_id')
+        }
+        fresh = compute_totals('bin', ids=list(owners))
+
+        warehouse_deltas = defaultdict(_empty_totals)
+        user_deltas = defaultdict(_empty_totals)
+
+        for bin_id, (warehouse_id, user_id) in owners.items():
+            summary = summaries[bin_id]
+            new_totals = fresh.get(bin_id, _empty_totals())
+            for field in SUMMARY_FIELDS:
+                delta = new_totals[field] - getattr(summary, field)
+                warehouse_deltas[warehouse_id][field] += delta
+                user_deltas[user_id][field] += delta
+                setattr(summary, field, new_totals[field])
+            summary.save()
+
+        _apply_deltas('warehouse', warehouse_deltas)
+        _apply_deltas('user', user_deltas)
+
+
+def remove_bin(bin_obj):
+    """
+    Subtract a bin that is about to be deleted from its warehouse and user
+    summaries. The bin's own summary row is removed by cascade.
+    """
+    totals = compute_totals('bin', ids=[bin_obj.id]).get(bin_obj.id)
+    if not totals:
+        return
+
+    owner = Bin.objects.filter(id=bin_obj.id).values_list(
+        'shelf__rack__warehouse_id', 'shelf__rack__warehouse__user_id'
+    ).first()
+    if owner is None:
+        return
+
+    warehouse_id, user_id = owner
+    negated = {field: -value for field, value in totals.items()}
+    with transaction.atomic():
+        _apply_deltas('warehouse', {warehouse_id: negated})
+        _apply_deltas('user', {user_id: dict(negated)})
+
+
+def get_summary(level, owner_id):
+    """
+    Return the summary row for an owner, building it from the source
+    tables if it does not exist yet.
+    """
+    model, key = SUMMARY_MODELS[level]
+    summary = model.objects.filter(**{key: owner_id}).first()
+    if summary is None:
+        totals = compute_totals(level, ids=[owner_id]).get(owner_id, _empty_totals())
+        summary, _ = model.objects.get_or_create(**{key: owner_id}, defaults=totals)
+    return summary
+
+
+def _owner_ids(level, user=None):
+    """
+    All owners that should have a summary row at the given level.
+    """
+    if level == 'bin':
+        queryset = Bin.objects.all()
+        if user is not None:
+            queryset = queryset.filter(shelf__rack__warehouse__user=user)
+    elif level == 'warehouse':
+        queryset = Warehouse.objects.all()
+        if user is not None:
+            queryset = queryset.filter(user=user)
+    else:
+        queryset = User.objects.filter(warehouses__isnull=False).distinct()
+        if user is not None:
+            queryset = queryset.filter(id=user.id)
+    return set(queryset.order_by().values_list('id', flat=True))
+
+
+def rebuild_rollups(user=None):
+    """
+    Rebuild every summary table from the source tables.
+
+    Args:
+        user: Only rebuild summaries for this user's inventory (None for all)
+
+    Returns:
+        Dictionary with the number of summary rows written per level
+    """
+    written = {}
+    with transaction.atomic():
+        for level, (model, key) in SUMMARY_MODELS.items():
+            owner_ids = _owner_ids(level, user=user)
+            fresh = compute_totals(level, user=user)
+
+            stale = model.objects.all()
+            if user is not None:
+                stale = stale.filter(**{f'{key}__in': owner_ids})
+            stale.delete()
+
+            model.objects.bulk_create([
+                model(**{key: owner_id}, **fresh.get(owner_id, _empty_totals()))
+                for owner_id in owner_ids
+            ], batch_size=1000)
+            written[level] = len(owner_ids)
+    return written
+
+
+def verify_rollups(user=None):
+    """
+    Compare the stored summaries against the source tables.
+
+    Returns:
+        List of (level, owner_id, field, stored, expected) tuples, one per
+        mismatching value
+    """
+    mismatches = []
+    for level, (model, key) in SUMMARY_MODELS.items():
+        owner_ids = _owner_ids(level, user=user)
+        fresh = compute_totals(level, user=user)
+        stored = {
+            row[key]: row
+            for row in model.objects.filter(**{f'{key}__in': owner_ids}).values(key, *SUMMARY_FIELDS)
+        }
+
+        for owner_id in owner_ids:
+            expected = fresh.get(owner_id, _empty_totals())
+            # A missing row is only wrong if the owner actually has stock
+            actual = stored.get(owner_id, _empty_totals())
+            for field in SUMMARY_FIELDS:
+                if actual[field] != expected[field]:
+                    mismatches.append((level, owner_id, field, actual[field], expected[field]))
+    return mismatches
@@ -0,0 +1,252 @@
+# inventory/search.py
+import math
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Value, When
+from .models import Warehouse, Rack, Shelf, Bin, Item, SearchEntry
+
+
+SEARCH_PAGE_SIZE = 25
+INDEX_BATCH_SIZE = 2000
+
+# Name and SKU matches outrank description matches
+SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config='simple')
+    + SearchVector('sku', weight='A', config='simple')
+    + SearchVector('description', weight='B', config='simple')
+)
+
+# For each level: the model and the (SearchEntry field, lookup path) pairs
+# used to build its entries
+SEARCH_LEVELS = {
+    'warehouse': (Warehouse, (
+        ('warehouse_id', 'id'),
+        ('owner_id', 'user_id'),
+    )),
+    'rack': (Rack, (
+        ('rack_id', 'id'),
+        ('warehouse_id', 'warehouse_id'),
+        ('owner_id', 'warehouse__user_id'),
+    )),
+    'shelf': (Shelf, (
+        ('shelf_id', 'id'),
+        ('rack_id', 'rack_id'),
+        ('warehouse_id', 'rack__warehouse_id'),
+        ('owner_id', 'rack__warehouse__user_id'),
+    )),
+    'bin': (Bin, (
+        ('bin_id', 'id'),
+        ('shelf_id', 'shelf_id'),
+        ('rack_id', 'shelf__rack_id'),
+        ('warehouse_id', 'shelf__rack__warehouse_id'),
+        ('owner_id', 'shelf__rack__warehouse__user_id'),
+    )),
+    'item': (Item, (
+        ('item_id', 'id'),
+        ('bin_id', 'bin_id'),
+        ('shelf_id', 'bin__shelf_id'),
+        ('rack_id', 'bin__shelf__rack_id'),
+        ('warehouse_id', 'bin__shelf__rack__warehouse_id'),
+        ('owner_id', 'bin__shelf__rack__warehouse__user_id'),
+    )),
+}
+
+SEARCH_KINDS = {model: kind for kind, (model, paths) in SEARCH_LEVELS.items()}
+
+# Fields whose changes require an object to be re-indexed: the text and
+# the container an entry is filed under
+INDEXED_FIELDS = {'name', 'description', 'sku', 'user', 'warehouse', 'rack', 'shelf', 'bin'}
+
+
+def _uses_search_vector():
+    return connection.vendor == 'postgresql'
+
+
+def _build_entries(kind, rows):
+    """
+    Turn values_list rows of SEARCH_LEVELS paths followed by name,
+    description and (for items) SKU into unsaved SearchEntry objects.
+    """
+    paths = SEARCH_LEVELS[kind][1]
+    entries = []
+    for row in rows:
+        name, description, *sku = row[len(paths):]
+        sku = (sku[0] if sku else None) or ''
+        entries.append(SearchEntry(
+            kind=kind,
+            name=name,
+            sku=sku,
+            description=description,
+            document=' '.join([name, sku, description]).lower(),
+            **dict(zip((field for field, path in paths), row))
+        ))
+    return entries
+
+
+def index_objects(kind, queryset):
+    """
+    Create or replace the search entries for the objects in a queryset.
+
+    Args:
+        kind: 'warehouse', 'rack', 'shelf', 'bin' or 'item'
+        queryset: Objects of that level to index
+
+    Returns:
+        Number of objects indexed
+    """
+    model, paths = SEARCH_LEVELS[kind]
+    lookups = [path for field, path in paths] + ['name', 'description']
+    if model is Item:
+        lookups.append('sku')
+    rows = queryset.order_by().values_list(*lookups)
+
+    indexed = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            _write_entries(kind, batch)
+            indexed += len(batch)
+            batch = []
+    if batch:
+        _write_entries(kind, batch)
+        indexed += len(batch)
+    return indexed
+
+
+def _write_entries(kind, rows):
+    ids = [row[0] for row in rows]
+    with transaction.atomic():
+        SearchEntry.objects.filter(kind=kind, **{f'{kind}_id__in': ids}).delete()
+        SearchEntry.objects.bulk_create(_build_entries(kind, rows))
+        if _uses_search_vector():
+            SearchEntry.objects.filter(kind=kind, **{f'{kind}_id__in': ids}).update(
+                search_vector=SEARCH_VECTOR
+            )
+
+
+def indexed_attnames(model):
+    """The columns of a model whose values its search entry depends on"""
+    return [field.attname for field in model._meta.concrete_fields if field.name in INDEXED_FIELDS]
+
+
+def index_instance(instance):
+    """Re-index a single warehouse, rack, shelf, bin or item."""
+    kind = SEARCH_KINDS[type(instance)]
+    index_objects(kind, type(instance).objects.filter(pk=instance.pk))
+
+
+def rebuild_search_index(user=None):
+    """
+    Rebuild the search entries for every level from the inventory tables.
+
+    Args:
+        user: Only rebuild entries for this user's inventory (None for all)
+
+    Returns:
+        Dictionary with the number of entries written per level
+    """
+    written = {}
+    with transaction.atomic():
+        stale = SearchEntry.objects.all()
+        if user is not None:
+            stale = stale.filter(owner=user)
+        stale.delete()
+
+        for kind, (model, paths) in SEARCH_LEVELS.items():
+            owner_path = dict(paths)['owner_id']
+            queryset = model.objects.all()
+            if user is not None:
+                queryset = queryset.filter(**{owner_path: user.id})
+            written[kind] = index_objects(kind, queryset)
+    return written
+
+
+def _search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _match_postgres(entries, query, terms):
+    # Prefix matching keeps partial SKUs and names findable, as icontains did
+    search_query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config='simple'
+    )
+    return (
+        entries.filter(search_vector=search_query),
+        SearchRank(F('search_vector'), search_query),
+    )
+
+
+def _match_fallback(entries, query, terms):
+    for term in terms:
+        entries = entries.filter(document__contains=term)
+    rank = Case(
+        When(name__iexact=query, then=Value(1.0)),
+        When(name__istartswith=query, then=Value(0.75)),
+        When(name__icontains=query, then=Value(0.5)),
+        When(sku__icontains=query, then=Value(0.5)),
+        default=Value(0.25),
+        output_field=FloatField(),
+    )
+    return entries, rank
+
+
+def search_inventory(user, query, kind=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Search a user's warehouses, racks, shelves, bins and items.
+
+    Uses the full-text index on PostgreSQL and substring matching on other
+    databases. Either way the counts take one query and the page another.
+
+    Args:
+        user: Owner of the inventory to search
+        query: Search text; every word must match (as a prefix on PostgreSQL)
+        kind: Restrict results to one level (None for all)
+        page: 1-based page number; out of range values are clamped
+        page_size: Results per page
+
+    Returns:
+        Dictionary with the page of ranked 'results', match 'counts' per
+        level, the 'total' for the selected level and paging information
+    """
+    terms = _search_terms(query)
+    entries = SearchEntry.objects.filter(owner=user)
+    if terms:
+        match = _match_postgres if _uses_search_vector() else _match_fallback
+        entries, rank = match(entries, query, terms)
+    else:
+        entries, rank = entries.none(), Value(0.0, output_field=FloatField())
+
+    counts = dict.fromkeys(SEARCH_LEVELS, 0)
+    counts.update(entries.order_by().values_list('kind').annotate(total=Count('id')))
+
+    if kind in SEARCH_LEVELS:
+        entries = entries.filter(kind=kind)
+        total = counts[kind]
+    else:
+        total = sum(counts.values())
+
+    num_pages = max(1, math.ceil(total / page_size))
+    page = min(max(1, page), num_pages)
+    offset = (page - 1) * page_size
+
+    results = []
+    if total:
+        results = list(
+            entries.annotate(rank=rank)
+            .select_related('warehouse', 'rack', 'shelf', 'bin', 'item')
+            .order_by('-rank', 'name', 'id')[offset:offset + page_size]
+        )
+
+    return {
+        'results': results,
+        'counts': counts,
+        'total': total,
+        'page': page,
+        'num_pages': num_pages,
+        'has_previous': page > 1,
+        'has_next': page < num_pages,
+    }
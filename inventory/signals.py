@@ -0,0 +1,121 @@
+# inventory/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Warehouse, Rack, Shelf, Bin, Item, StockAddition, Disposition
+from . import rollups, search, locations
+
+
+def _deleted_via(origin, models):
+    """
+    Return True if a cascade delete was started from one of the given models.
+    `origin` is either a model instance or a queryset.
+    """
+    origin_model = getattr(origin, 'model', None) or type(origin)
+    return isinstance(origin_model, type) and issubclass(origin_model, models)
+
+
+def _remember_indexed_values(instance, stored):
+    """Keep the stored values of an object's indexed fields from a values() row."""
+    instance._indexed_values = None
+    if stored is not None:
+        instance._indexed_values = [stored[attname] for attname in search.indexed_attnames(type(instance))]
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_bin(sender, instance, **kwargs):
+    """
+    Remember the bin an existing item was in so transfers update both bins,
+    and its indexed fields so saves that leave them alone skip re-indexing.
+    """
+    stored = None
+    if instance.pk:
+        stored = Item.objects.filter(pk=instance.pk).values(
+            'bin_id', *search.indexed_attnames(Item)
+        ).first()
+    instance._previous_bin_id = stored['bin_id'] if stored else None
+    _remember_indexed_values(instance, stored)
+
+
+@receiver(post_save, sender=Item)
+def update_rollups_for_item(sender, instance, **kwargs):
+    rollups.refresh_bins({instance.bin_id, getattr(instance, '_previous_bin_id', None)})
+
+
+@receiver(post_delete, sender=Item)
+def update_rollups_for_deleted_item(sender, instance, origin=None, **kwargs):
+    # Container deletes are handled once per bin by remove_bin_from_rollups
+    if _deleted_via(origin, (Bin, Shelf, Rack, Warehouse, User)):
+        return
+    rollups.refresh_bins({instance.bin_id})
+
+
+@receiver(post_save, sender=StockAddition)
+@receiver(post_save, sender=Disposition)
+def update_rollups_for_movement(sender, instance, **kwargs):
+    rollups.refresh_bins(
+        Item.objects.filter(pk=instance.item_id).values_list('bin_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=StockAddition)
+@receiver(post_delete, sender=Disposition)
+def update_rollups_for_deleted_movement(sender, instance, origin=None, **kwargs):
+    # Deleting the item (or a container) refreshes the bin afterwards
+    if _deleted_via(origin, (Item, Bin, Shelf, Rack, Warehouse, User)):
+        return
+    rollups.refresh_bins(
+        Item.objects.filter(pk=instance.item_id).values_list('bin_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Bin)
+def remove_bin_from_rollups(sender, instance, origin=None, **kwargs):
+    if _deleted_via(origin, User):
+        return
+    rollups.remove_bin(instance)
+
+
+@receiver(pre_save, sender=Warehouse)
+@receiver(pre_save, sender=Rack)
+@receiver(pre_save, sender=Shelf)
+@receiver(pre_save, sender=Bin)
+def remember_container_name(sender, instance, **kwargs):
+    """
+    Remember the stored name so renames can be pushed down to bin paths,
+    and the indexed fields so saves that leave them alone skip re-indexing.
+    """
+    stored = None
+    if instance.pk:
+        stored = sender.objects.filter(pk=instance.pk).values(
+            'name', *search.indexed_attnames(sender)
+        ).first()
+    instance._previous_name = stored['name'] if stored else None
+    _remember_indexed_values(instance, stored)
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_save, sender=Rack)
+@receiver(post_save, sender=Shelf)
+def update_bin_paths(sender, instance, created, **kwargs):
+    previous_name = getattr(instance, '_previous_name', None)
+    if created or previous_name is None or previous_name == instance.name:
+        return
+    locations.refresh_container_paths(instance)
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_save, sender=Rack)
+@receiver(post_save, sender=Shelf)
+@receiver(post_save, sender=Bin)
+@receiver(post_save, sender=Item)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    # Entries are removed by cascade when the object or a container is deleted
+    if update_fields is not None and not search.INDEXED_FIELDS & set(update_fields):
+        return
+    previous = getattr(instance, '_indexed_values', None)
+    if not created and previous is not None and previous == [
+        getattr(instance, attname) for attname in search.indexed_attnames(sender)
+    ]:
+        return
+    search.index_instance(instance)
@@ -1,3 +1,250 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from .bulk import apply_batch
+from .models import (
+    Warehouse, Rack, Shelf, Bin, Item, StockAddition, Disposition,
+    BinStockSummary, WarehouseStockSummary, UserStockSummary
+)
+from .rollups import get_summary, rebuild_rollups, refresh_bins, verify_rollups
+from .utils import decode_activity_cursor, encode_activity_cursor, get_activity_data
 
-# Create your tests here.
+
+def create_bin(user, warehouse_name, bin_name='B1'):
+    warehouse, created = Warehouse.objects.get_or_create(name=warehouse_name, user=user)
+    rack, created = Rack.objects.get_or_create(name='R1', warehouse=warehouse)
+    shelf, created = Shelf.objects.get_or_create(name='S1', rack=rack)
+    return Bin.objects.create(name=bin_name, shelf=shelf)
+
+
+class RollupTests(TestCase):
+    """Every path that changes stock leaves the summaries matching the source tables"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        self.bin = create_bin(self.user, 'Main')
+        self.other_bin = create_bin(self.user, 'Main', 'B2')
+        self.remote_bin = create_bin(self.user, 'Remote')
+        self.item = Item.objects.create(name='Widget', sku='W-1', bin=self.bin, quantity=10, min_stock_level=5)
+        Item.objects.create(name='Gadget', sku='G-1', bin=self.other_bin, quantity=3, min_stock_level=5)
+
+        # Someone else's stock, which must not be touched
+        self.stranger = User.objects.create_user('stranger', password='secret')
+        Item.objects.create(name='Widget', bin=create_bin(self.stranger, 'Theirs'), quantity=4)
+
+        self.client.force_login(self.user)
+
+    def assertNoDrift(self):
+        self.assertEqual(verify_rollups(), [])
+
+    def item_url(self, name, item):
+        bin_obj = item.bin
+        return reverse(f'inventory:{name}', kwargs={
+            'warehouse_id': bin_obj.shelf.rack.warehouse_id, 'rack_id': bin_obj.shelf.rack_id,
+            'shelf_id': bin_obj.shelf_id, 'bin_id': bin_obj.id, 'item_id': item.id,
+        })
+
+    def test_create_item(self):
+        self.assertNoDrift()
+        summary = get_summary('warehouse', self.bin.shelf.rack.warehouse_id)
+        self.assertEqual((summary.item_count, summary.total_quantity, summary.low_stock_count), (2, 13, 1))
+
+    def test_add_stock(self):
+        self.client.post(self.item_url('item-add-stock', self.item),
+                         {'quantity': 5, 'addition_type': 'new_stock', 'notes': ''})
+        self.assertEqual(StockAddition.objects.filter(item=self.item).count(), 1)
+        self.assertNoDrift()
+        self.assertEqual(get_summary('bin', self.bin.id).added_quantity, 5)
+
+    def test_dispose(self):
+        self.client.post(self.item_url('item-disposition', self.item),
+                         {'quantity': 7, 'disposition_type': 'sold', 'notes': ''})
+        self.assertEqual(Item.objects.get(pk=self.item.pk).quantity, 3)
+        self.assertNoDrift()
+        self.assertEqual(get_summary('user', self.user.id).low_stock_count, 2)
+
+    def test_restock(self):
+        self.client.post(reverse('inventory:restock-item'), {'item_id': self.item.id, 'quantity': 4})
+        self.assertEqual(Item.objects.get(pk=self.item.pk).quantity, 14)
+        self.assertNoDrift()
+
+    def test_delete_movement(self):
+        addition = StockAddition.objects.create(item=self.item, quantity=2, addition_type='new_stock',
+                                                created_by=self.user)
+        Disposition.objects.create(item=self.item, quantity=1, disposition_type='waste', created_by=self.user)
+        self.assertNoDrift()
+        addition.delete()
+        self.assertNoDrift()
+
+    def test_transfer_whole_item(self):
+        StockAddition.objects.create(item=self.item, quantity=2, addition_type='new_stock', created_by=self.user)
+        # As item_transfer does for a whole item
+        self.item.bin = self.remote_bin
+        self.item.save()
+        self.assertNoDrift()
+        self.assertEqual(get_summary('warehouse', self.remote_bin.shelf.rack.warehouse_id).added_quantity, 2)
+
+    def test_transfer_part_of_item(self):
+        # As item_transfer does for part of an item
+        Item.objects.create(name=self.item.name, sku=self.item.sku, bin=self.remote_bin, quantity=4)
+        self.item.quantity -= 4
+        self.item.save(update_fields=['quantity', 'updated_at'])
+        self.assertNoDrift()
+
+    def test_bulk_batch(self):
+        gadget = Item.objects.get(name='Gadget')
+        result = apply_batch(self.user, [
+            {'action': 'add', 'item_id': str(self.item.id), 'quantity': '5'},
+            {'action': 'dispose', 'sku': 'G-1', 'quantity': '1'},
+            {'action': 'transfer', 'item_id': str(self.item.id), 'quantity': '6', 'to_bin': str(self.remote_bin.id)},
+            {'action': 'transfer', 'item_id': str(gadget.id), 'quantity': '2', 'to_bin': str(self.remote_bin.id)},
+            {'action': 'dispose', 'item_id': str(gadget.id), 'quantity': '99'},
+        ])
+        self.assertEqual(result['applied'], {'add': 1, 'dispose': 1, 'transfer': 2})
+        self.assertEqual(len(result['errors']), 1)
+        self.assertNoDrift()
+
+    def test_delete_item(self):
+        StockAddition.objects.create(item=self.item, quantity=2, addition_type='new_stock', created_by=self.user)
+        self.client.post(self.item_url('item-delete', self.item))
+        self.assertFalse(Item.objects.filter(pk=self.item.pk).exists())
+        self.assertNoDrift()
+
+    def test_delete_bin(self):
+        Disposition.objects.create(item=self.item, quantity=1, disposition_type='waste', created_by=self.user)
+        shelf = self.bin.shelf
+        self.client.post(reverse('inventory:bin-delete', kwargs={
+            'warehouse_id': shelf.rack.warehouse_id, 'rack_id': shelf.rack_id,
+            'shelf_id': shelf.id, 'bin_id': self.bin.id,
+        }))
+        self.assertFalse(Bin.objects.filter(pk=self.bin.pk).exists())
+        self.assertNoDrift()
+        self.assertEqual(get_summary('warehouse', shelf.rack.warehouse_id).total_quantity, 3)
+
+    def test_delete_warehouse(self):
+        self.remote_bin.shelf.rack.warehouse.delete()
+        Item.objects.create(name='Bolt', bin=self.bin, quantity=1)
+        self.assertNoDrift()
+
+    def test_delete_user(self):
+        user_id = self.user.id
+        self.user.delete()
+        self.assertNoDrift()
+        self.assertFalse(UserStockSummary.objects.filter(user_id=user_id).exists())
+        self.assertEqual(get_summary('user', self.stranger.id).total_quantity, 4)
+
+    def test_rebuild_matches_incremental(self):
+        self.client.post(self.item_url('item-disposition', self.item),
+                         {'quantity': 2, 'disposition_type': 'sold', 'notes': ''})
+
+        def stocked(model):
+            # A rebuild also writes empty rows for owners without stock
+            return sorted(model.objects.filter(item_count__gt=0).values_list(
+                'item_count', 'total_quantity', 'low_stock_count', 'disposed_quantity'
+            ))
+
+        models = (BinStockSummary, WarehouseStockSummary, UserStockSummary)
+        before = {model: stocked(model) for model in models}
+        rebuild_rollups()
+        self.assertEqual({model: stocked(model) for model in models}, before)
+
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row locks')
+class ConcurrentRollupTests(TransactionTestCase):
+    """Two transactions refreshing the same bin both end up counted"""
+
+    def test_interleaved_refreshes(self):
+        user = User.objects.create_user('owner', password='secret')
+        item = Item.objects.create(name='Widget', bin=create_bin(user, 'Main'), quantity=10)
+        refreshed = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def add_stock(quantity, hold=False):
+            try:
+                with transaction.atomic():
+                    # Bulk inserts skip the signals, so the refresh happens here
+                    StockAddition.objects.bulk_create([StockAddition(
+                        item=item, quantity=quantity, addition_type='new_stock', created_by=user,
+                        warehouse_id=item.warehouse_id, owner=user
+                    )])
+                    refresh_bins({item.bin_id})
+                    if hold:
+                        refreshed.set()
+                        release.wait(5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=add_stock, args=(5, True))
+        first.start()
+        refreshed.wait(5)
+        # The second transaction adds its stock and refreshes the same bin
+        # while the first has not committed yet
+        second = threading.Thread(target=add_stock, args=(3,))
+        second.start()
+        time.sleep(0.5)
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(verify_rollups(), [])
+        self.assertEqual(get_summary('bin', item.bin_id).added_quantity, 8)
+
+class ActivityCursorTests(TestCase):
+    """Keyset paging through the activity feed when many rows share a timestamp"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        item = Item.objects.create(name='Widget', bin=create_bin(self.user, 'Main'), quantity=100)
+        for index in range(5):
+            StockAddition.objects.create(item=item, quantity=index + 1, addition_type='new_stock',
+                                         created_by=self.user)
+            Disposition.objects.create(item=item, quantity=1, disposition_type='sold', created_by=self.user)
+
+        now = timezone.now()
+        tied = now - timedelta(minutes=5)
+        # Most rows of both types share one timestamp; one of each is newer
+        StockAddition.objects.update(timestamp=tied)
+        Disposition.objects.update(timestamp=tied)
+        StockAddition.objects.filter(pk=StockAddition.objects.order_by('pk').first().pk).update(timestamp=now)
+        Disposition.objects.filter(pk=Disposition.objects.order_by('-pk').first().pk).update(timestamp=now)
+
+    def page_through(self, page_size, **filters):
+        seen = []
+        cursor = None
+        while True:
+            page = get_activity_data(self.user, limit=page_size, cursor=cursor, **filters)
+            seen.extend(activity['id'] for activity in page)
+            if len(page) < page_size:
+                return seen
+            cursor = decode_activity_cursor(encode_activity_cursor(page[-1]))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        everything = [activity['id'] for activity in get_activity_data(self.user)]
+        self.assertEqual(len(everything), 10)
+        for page_size in (1, 2, 3, 4):
+            self.assertEqual(self.page_through(page_size), everything)
+
+    def test_pages_of_one_type(self):
+        everything = [activity['id'] for activity in get_activity_data(self.user, activity_type='disposition')]
+        self.assertEqual(len(everything), 5)
+        self.assertEqual(self.page_through(2, activity_type='disposition'), everything)
+
+    def test_order_breaks_ties_by_type_then_id(self):
+        activities = get_activity_data(self.user)
+        keys = [(activity['timestamp'], activity['type'], activity['pk']) for activity in activities]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_invalid_cursor(self):
+        self.assertIsNone(decode_activity_cursor('not a cursor'))
+        self.assertIsNone(decode_activity_cursor(f'{timezone.now().isoformat()}|transfer|1'))
@@ -68,6 +68,7 @@ urlpatterns = [
     path('search/', views.search, name='search'),
     path('low-stock/', views.low_stock, name='low-stock'),
     path('restock-item/', views.restock_item, name='restock-item'),
+    path('bulk-adjust/', views.bulk_adjust, name='bulk-adjust'),
     path('report/', views.report, name='report'),
     path('export/low-stock/', views.export_low_stock, name='export-low-stock'),
 ]
\ No newline at end of file
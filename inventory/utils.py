@@ -1,121 +1,225 @@
 # inventory/utils.py
+import csv
+import itertools
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.urls import reverse
-from django.db.models import Q
-from datetime import timedelta
+from django.db.models import Q, F, Value, CharField
+from datetime import datetime, timedelta
 from .models import StockAddition, Disposition
 
 
-def get_activity_data(user, hours_limit=24, warehouse_id=None, activity_type=None, limit=None):
+# Rows fetched per database round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# CSV rows joined into each chunk of a streaming response
+CSV_ROWS_PER_CHUNK = 500
+
+
+ACTIVITY_SOURCES = {
+    'addition': {
+        'model': StockAddition,
+        'reason_field': 'addition_type',
+        'reasons': dict(StockAddition.ADDITION_TYPES),
+        'type_display': 'Stock Addition',
+        'sign': '+',
+        'badge_class': 'bg-success',
+    },
+    'disposition': {
+        'model': Disposition,
+        'reason_field': 'disposition_type',
+        'reasons': dict(Disposition.DISPOSITION_TYPES),
+        'type_display': 'Stock Disposition',
+        'sign': '-',
+        'badge_class': 'bg-danger',
+    },
+}
+
+# Columns selected from both activity tables; they must line up for the UNION
+ACTIVITY_FIELDS = (
+    'id', 'timestamp', 'quantity', 'notes', 'item_id', 'warehouse_id',
+)
+ACTIVITY_EXPRESSIONS = {
+    'item_name': F('item__name'),
+    'item_sku': F('item__sku'),
+    'username': F('created_by__username'),
+    'bin_id': F('item__bin_id'),
+    'shelf_id': F('item__bin__shelf_id'),
+    'rack_id': F('item__bin__rack_id'),
+    'location': F('item__bin__location_path'),
+    'warehouse_name': F('warehouse__name'),
+}
+
+
+class ActivityRow(dict):
+    """
+    Activity dictionary that only builds its item URL when it is looked up,
+    so rows that are never rendered never call reverse().
+    """
+    def __missing__(self, key):
+        if key != 'item_url':
+            raise KeyError(key)
+        self['item_url'] = reverse('inventory:item-detail', kwargs=self['_location'])
+        return self['item_url']
+
+
+def encode_activity_cursor(activity):
+    """
+    Encode the keyset position of an activity row for the next page link.
+    """
+    return f"{activity['timestamp'].isoformat()}|{activity['type']}|{activity['pk']}"
+
+
+def decode_activity_cursor(value):
+    """
+    Decode a cursor produced by encode_activity_cursor.
+    
+    Returns:
+        (timestamp, activity_type, id) tuple, or None if the value is invalid
+    """
+    try:
+        timestamp, activity_type, pk = value.split('|')
+        timestamp = datetime.fromisoformat(timestamp)
+        pk = int(pk)
+    except (AttributeError, ValueError):
+        return None
+    if activity_type not in ACTIVITY_SOURCES:
+        return None
+    return timestamp, activity_type, pk
+
+
+def _keyset_filter(activity_type, cursor):
+    """
+    Rows that sort after the cursor in (timestamp, type, id) descending order.
+    Within one table the type is constant, so the comparison is resolved here.
+    """
+    timestamp, cursor_type, pk = cursor
+    if activity_type < cursor_type:
+        return Q(timestamp__lte=timestamp)
+    if activity_type > cursor_type:
+        return Q(timestamp__lt=timestamp)
+    return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+
+
+def _activity_filter(user, hours_limit=None, warehouse_id=None):
+    filters = Q(owner=user)
+    if warehouse_id:
+        filters &= Q(warehouse_id=warehouse_id)
+    if hours_limit:
+        filters &= Q(timestamp__gte=timezone.now() - timedelta(hours=hours_limit))
+    return filters
+
+
+def _activity_types(activity_type):
+    return [activity_type] if activity_type in ACTIVITY_SOURCES else list(ACTIVITY_SOURCES)
+
+
+def get_activity_queryset(user, hours_limit=24, warehouse_id=None, activity_type=None, cursor=None):
+    """
+    Build a single UNION ALL query over stock additions and dispositions,
+    ordered newest first by (timestamp, type, id).
+    
+    Returns:
+        A values queryset; slice it to apply a limit in the database
+    """
+    filters = _activity_filter(user, hours_limit, warehouse_id)
+    
+    querysets = []
+    for kind in _activity_types(activity_type):
+        source = ACTIVITY_SOURCES[kind]
+        kind_filter = filters
+        if cursor:
+            kind_filter &= _keyset_filter(kind, cursor)
+        querysets.append(
+            source['model'].objects.filter(kind_filter).order_by().values(
+                *ACTIVITY_FIELDS,
+                kind=Value(kind, output_field=CharField()),
+                reason_code=F(source['reason_field']),
+                **ACTIVITY_EXPRESSIONS
+            )
+        )
+    
+    queryset = querysets[0]
+    if len(querysets) > 1:
+        queryset = queryset.union(*querysets[1:], all=True)
+    return queryset.order_by('-timestamp', '-kind', '-id')
+
+
+def build_activity_row(row):
+    """
+    Turn a row from get_activity_queryset into the activity dictionary used
+    by templates and exports.
+    """
+    source = ACTIVITY_SOURCES[row['kind']]
+    return ActivityRow({
+        'id': f"{row['kind']}_{row['id']}",
+        'pk': row['id'],
+        'item_name': row['item_name'],
+        'item_sku': row['item_sku'] or 'N/A',
+        'type': row['kind'],
+        'type_display': source['type_display'],
+        'quantity': row['quantity'],
+        'quantity_display': f"{source['sign']}{row['quantity']}",
+        'reason': source['reasons'].get(row['reason_code'], row['reason_code']),
+        'notes': row['notes'],
+        'timestamp': row['timestamp'],
+        'user': row['username'],
+        'warehouse_name': row['warehouse_name'],
+        'location': row['location'],
+        'badge_class': source['badge_class'],
+        '_location': {
+            'warehouse_id': row['warehouse_id'],
+            'rack_id': row['rack_id'],
+            'shelf_id': row['shelf_id'],
+            'bin_id': row['bin_id'],
+            'item_id': row['item_id']
+        },
+    })
+
+
+def get_activity_data(user, hours_limit=24, warehouse_id=None, activity_type=None, limit=None, cursor=None):
     """
     Get combined activity data from StockAddition and Disposition models.
     
+    Merging, ordering and the limit are applied in the database, so only
+    the requested rows are fetched.
+    
     Args:
         user: The user to filter activities for
         hours_limit: Number of hours to look back (None for no limit)
         warehouse_id: Specific warehouse ID to filter by (None for all warehouses)
         activity_type: 'addition', 'disposition', or None for both
         limit: Maximum number of activities to return (None for no limit)
+        cursor: Decoded cursor to start after (see decode_activity_cursor)
     
     Returns:
         List of activity dictionaries sorted by timestamp (newest first)
     """
-    # Calculate time threshold
-    time_threshold = None
-    if hours_limit:
-        time_threshold = timezone.now() - timedelta(hours=hours_limit)
-    
-    # Base filter for user's warehouses
-    base_filter = Q(item__bin__shelf__rack__warehouse__user=user)
-    
-    # Add warehouse filter if specified
-    if warehouse_id:
-        base_filter &= Q(item__bin__shelf__rack__warehouse__id=warehouse_id)
-    
-    # Add time filter if specified
-    if time_threshold:
-        time_filter = Q(timestamp__gte=time_threshold)
-    else:
-        time_filter = Q()
-    
-    activities = []
-    
-    # Get StockAdditions if requested
-    if activity_type in [None, 'addition']:
-        additions = StockAddition.objects.filter(
-            base_filter & time_filter
-        ).select_related(
-            'item__bin__shelf__rack__warehouse',
-            'created_by'
-        ).order_by('-timestamp')
-        
-        for addition in additions:
-            activities.append({
-                'id': f"addition_{addition.id}",
-                'item_name': addition.item.name,
-                'item_sku': addition.item.sku or 'N/A',
-                'type': 'addition',
-                'type_display': 'Stock Addition',
-                'quantity': addition.quantity,
-                'quantity_display': f"+{addition.quantity}",
-                'reason': addition.get_addition_type_display(),
-                'notes': addition.notes,
-                'timestamp': addition.timestamp,
-                'user': addition.created_by.username,
-                'warehouse_name': addition.item.bin.shelf.rack.warehouse.name,
-                'location': f"{addition.item.bin.shelf.rack.warehouse.name} > {addition.item.bin.shelf.rack.name} > {addition.item.bin.shelf.name} > {addition.item.bin.name}",
-                'item_url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': addition.item.bin.shelf.rack.warehouse.id,
-                    'rack_id': addition.item.bin.shelf.rack.id,
-                    'shelf_id': addition.item.bin.shelf.id,
-                    'bin_id': addition.item.bin.id,
-                    'item_id': addition.item.id
-                }),
-                'badge_class': 'bg-success'
-            })
-    
-    # Get Dispositions if requested
-    if activity_type in [None, 'disposition']:
-        dispositions = Disposition.objects.filter(
-            base_filter & time_filter
-        ).select_related(
-            'item__bin__shelf__rack__warehouse',
-            'created_by'
-        ).order_by('-timestamp')
-        
-        for disposition in dispositions:
-            activities.append({
-                'id': f"disposition_{disposition.id}",
-                'item_name': disposition.item.name,
-                'item_sku': disposition.item.sku or 'N/A',
-                'type': 'disposition',
-                'type_display': 'Stock Disposition',
-                'quantity': disposition.quantity,
-                'quantity_display': f"-{disposition.quantity}",
-                'reason': disposition.get_disposition_type_display(),
-                'notes': disposition.notes,
-                'timestamp': disposition.timestamp,
-                'user': disposition.created_by.username,
-                'warehouse_name': disposition.item.bin.shelf.rack.warehouse.name,
-                'location': f"{disposition.item.bin.shelf.rack.warehouse.name} > {disposition.item.bin.shelf.rack.name} > {disposition.item.bin.shelf.name} > {disposition.item.bin.name}",
-                'item_url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': disposition.item.bin.shelf.rack.warehouse.id,
-                    'rack_id': disposition.item.bin.shelf.rack.id,
-                    'shelf_id': disposition.item.bin.shelf.id,
-                    'bin_id': disposition.item.bin.id,
-                    'item_id': disposition.item.id
-                }),
-                'badge_class': 'bg-danger'
-            })
-    
-    # Sort by timestamp (newest first)
-    activities.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Apply limit if specified
+    queryset = get_activity_queryset(
+        user,
+        hours_limit=hours_limit,
+        warehouse_id=warehouse_id,
+        activity_type=activity_type,
+        cursor=cursor
+    )
     if limit:
-        activities = activities[:limit]
+        queryset = queryset[:limit]
     
-    return activities
+    return [build_activity_row(row) for row in queryset]
+
+
+def get_activity_counts(user, hours_limit=24, warehouse_id=None, activity_type=None):
+    """
+    Count matching activities per type without fetching them.
+    
+    Returns:
+        Dictionary with 'addition' and 'disposition' counts
+    """
+    filters = _activity_filter(user, hours_limit, warehouse_id)
+    counts = dict.fromkeys(ACTIVITY_SOURCES, 0)
+    for kind in _activity_types(activity_type):
+        counts[kind] = ACTIVITY_SOURCES[kind]['model'].objects.filter(filters).count()
+    return counts
 
 
 def get_activity_summary(user, hours_limit=24):
@@ -143,55 +247,83 @@ def get_activity_summary(user, hours_limit=24):
     }
 
 
+class _Echo:
+    """
+    File-like object whose write() hands the value back, so csv.writer can
+    format rows for a generator instead of a buffer.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, headers, filename):
+    """
+    Stream CSV rows to the client without building the file in memory.
+    
+    Args:
+        rows: Iterable of row lists; consumed lazily while the response is sent
+        headers: List of column headers
+        filename: Download filename
+    
+    Returns:
+        StreamingHttpResponse with CSV content and appropriate headers
+    """
+    writer = csv.writer(_Echo())
+    
+    def generate():
+        yield writer.writerow(headers)
+        
+        # Group rows into larger chunks to keep per-write overhead low
+        chunk = []
+        for row in rows:
+            chunk.append(writer.writerow(row))
+            if len(chunk) >= CSV_ROWS_PER_CHUNK:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+    
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def generate_csv_export(data, field_mappings, filename_prefix):
     """
-    Generate CSV export from data with flexible field mapping.
+    Generate a streaming CSV export from data with flexible field mapping.
     
     Args:
-        data: List of dictionaries containing the data to export
+        data: Iterable of dictionaries containing the data to export; a
+            generator keeps memory flat regardless of row count
         field_mappings: List of tuples (field_key, csv_header, transform_func)
         filename_prefix: Prefix for the filename (e.g., 'inventory_activity')
     
     Returns:
-        HttpResponse with CSV content and appropriate headers
+        StreamingHttpResponse with CSV content and appropriate headers
     """
-    import csv
-    from django.http import HttpResponse
-    from django.utils import timezone
-    
     # Generate filename with timestamp
     timestamp = timezone.now().strftime('%Y-%m-%d')
     filename = f"{filename_prefix}_{timestamp}.csv"
     
-    # Create HTTP response with CSV content type
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Create CSV writer
-    writer = csv.writer(response)
-    
-    # Write header row
     headers = [mapping[1] for mapping in field_mappings]
-    writer.writerow(headers)
     
-    # Write data rows
-    for item in data:
-        row = []
-        for field_key, header, transform_func in field_mappings:
-            value = item.get(field_key, '')
-            
-            # Apply transformation function if provided
-            if transform_func and value:
-                try:
-                    value = transform_func(value)
-                except:
-                    value = str(value)  # Fallback to string conversion
-            
-            row.append(value)
-        
-        writer.writerow(row)
+    def rows():
+        for item in data:
+            row = []
+            for field_key, header, transform_func in field_mappings:
+                value = item.get(field_key, '')
+                
+                # Apply transformation function if provided
+                if transform_func and value:
+                    try:
+                        value = transform_func(value)
+                    except:
+                        value = str(value)  # Fallback to string conversion
+                
+                row.append(value)
+            yield row
     
-    return response
+    return stream_csv(rows(), headers, filename)
 
 
 def export_activity_csv(user, hours_limit=None, warehouse_id=None, activity_type=None):
@@ -205,15 +337,16 @@ def export_activity_csv(user, hours_limit=None, warehouse_id=None, activity_type
         activity_type: 'addition', 'disposition', or None for both
     
     Returns:
-        HttpResponse with CSV content
+        StreamingHttpResponse with CSV content
     """
-    # Get the activity data
-    activities = get_activity_data(
+    # Stream activity rows straight from the database cursor
+    activity_rows = get_activity_queryset(
         user=user,
         hours_limit=hours_limit,
         warehouse_id=warehouse_id,
         activity_type=activity_type
-    )
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    activities = (build_activity_row(row) for row in activity_rows)
     
     # Define field mappings for activity CSV
     field_mappings = [
@@ -236,11 +369,11 @@ def export_report_csv(data, report_type):
     Export report data to CSV with appropriate formatting.
     
     Args:
-        data: The report data (list of dictionaries)
+        data: The report data (iterable of dictionaries)
         report_type: Type of report for filename generation
     
     Returns:
-        HttpResponse with CSV content
+        StreamingHttpResponse with CSV content
     """
     if report_type == 'low_stock':
         field_mappings = [
@@ -278,9 +411,12 @@ def export_report_csv(data, report_type):
         
     else:
         # Generic fallback
-        if data and len(data) > 0:
+        data = iter(data)
+        first = next(data, None)
+        if first is not None:
             # Auto-generate mappings from first item keys
-            field_mappings = [(key, key.replace('_', ' ').title(), None) for key in data[0].keys()]
+            field_mappings = [(key, key.replace('_', ' ').title(), None) for key in first.keys()]
+            data = itertools.chain([first], data)
         else:
             field_mappings = []
         filename_prefix = f'inventory_report_{report_type}'
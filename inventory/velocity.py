@@ -0,0 +1,62 @@
+# inventory/velocity.py
+from collections import defaultdict
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Disposition
+
+
+# Number of most recent dispositions used to estimate an item's usage rate
+RECENT_DISPOSITION_SAMPLE = 5
+
+NO_USAGE = {'weekly_usage': 0, 'days_until_stockout': None}
+
+
+def stock_velocity(items, sample_size=RECENT_DISPOSITION_SAMPLE):
+    """
+    Estimate weekly usage and days until stockout for a set of items.
+    
+    Uses the `sample_size` most recent dispositions of each item, selected
+    with a window function so the whole set costs a single query.
+    
+    Args:
+        items: Queryset of items or iterable of item ids
+        sample_size: Number of recent dispositions to sample per item
+    
+    Returns:
+        Dictionary keyed by item id with 'weekly_usage' and
+        'days_until_stockout' (None when there is no usage). Items without
+        dispositions are omitted; use NO_USAGE as the default.
+    """
+    recent_dispositions = Disposition.objects.filter(item__in=items).annotate(
+        recency=Window(
+            expression=RowNumber(),
+            partition_by=[F('item_id')],
+            order_by=[F('timestamp').desc(), F('id').desc()]
+        )
+    ).filter(recency__lte=sample_size).values_list(
+        'item_id', 'quantity', 'timestamp', 'item__quantity'
+    )
+    
+    samples = defaultdict(list)
+    stock_levels = {}
+    for item_id, quantity, timestamp, stock_level in recent_dispositions:
+        samples[item_id].append((quantity, timestamp))
+        stock_levels[item_id] = stock_level
+    
+    velocity = {}
+    for item_id, sample in samples.items():
+        timestamps = [timestamp for quantity, timestamp in sample]
+        days_diff = (max(timestamps) - min(timestamps)).days or 1  # Avoid divide by zero
+        total_disposed = sum(quantity for quantity, timestamp in sample)
+        weekly_usage = round((total_disposed / days_diff) * 7, 1)
+        
+        days_until_stockout = None
+        if weekly_usage:
+            days_until_stockout = round(stock_levels[item_id] / (weekly_usage / 7), 1)
+        
+        velocity[item_id] = {
+            'weekly_usage': weekly_usage,
+            'days_until_stockout': days_until_stockout,
+        }
+    
+    return velocity
@@ -5,7 +5,6 @@ from django.contrib import messages
 from django.db.models import Sum, Count, Q, F
 from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
-from django.urls import reverse
 from datetime import datetime
 import csv
 import json
@@ -17,6 +16,14 @@ from .forms import (
     StockAdditionForm
 )
 from . import utils
+from .aggregation import (
+    timeframe_threshold, warehouse_metrics, item_age_counts,
+    category_counts, movement_by_period
+)
+from .rollups import get_summary
+from .velocity import stock_velocity, NO_USAGE
+from .search import search_inventory
+from .bulk import read_batch, apply_batch
 
 # Dashboard
 def dashboard(request):
@@ -27,21 +34,11 @@ def dashboard(request):
     
     warehouse_count = Warehouse.objects.filter(user=request.user).count()
     
-    item_count = Item.objects.filter(
-        bin__shelf__rack__warehouse__user=request.user
-    ).count()
-    
-    total_quantity = Item.objects.filter(
-        bin__shelf__rack__warehouse__user=request.user
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    
-    # Define what "low stock" means - items with quantity < 5 for this example
-    low_stock_count = Item.objects.filter(
-        bin__shelf__rack__warehouse__user=request.user,
-        min_stock_level__gt=0  # Only count items with a minimum set
-    ).filter(
-        quantity__lt=F('min_stock_level')  # Current quantity < minimum
-    ).count()
+    # Item, quantity and low stock totals come from the materialized summary
+    stock_summary = get_summary('user', request.user.id)
+    item_count = stock_summary.item_count
+    total_quantity = stock_summary.total_quantity
+    low_stock_count = stock_summary.low_stock_count
     
     # Get real recent activity using our utility function
     activity_summary = get_activity_summary(request.user, hours_limit=24)
@@ -79,7 +76,7 @@ def warehouse_detail(request, warehouse_id):
     # Count all items, shelves and bins in this warehouse
     shelves_count = Shelf.objects.filter(rack__warehouse=warehouse).count()
     bins_count = Bin.objects.filter(shelf__rack__warehouse=warehouse).count()
-    items_count = Item.objects.filter(bin__shelf__rack__warehouse=warehouse).count()
+    items_count = Item.objects.filter(warehouse=warehouse).count()
     
     context = {
         'warehouse': warehouse,
@@ -144,7 +141,7 @@ def warehouse_delete(request, warehouse_id):
     # Count all shelves, bins and items in this warehouse for the confirmation page
     shelves_count = Shelf.objects.filter(rack__warehouse=warehouse).count()
     bins_count = Bin.objects.filter(shelf__rack__warehouse=warehouse).count()
-    items_count = Item.objects.filter(bin__shelf__rack__warehouse=warehouse).count()
+    items_count = Item.objects.filter(warehouse=warehouse).count()
     
     if request.method == 'POST':
         warehouse_name = warehouse.name
@@ -379,7 +376,7 @@ def bin_detail(request, warehouse_id, rack_id, shelf_id, bin_id):
     bin_obj = get_object_or_404(Bin, id=bin_id, shelf=shelf)
     
     # Calculate total quantity of all items in this bin
-    total_quantity = Item.objects.filter(bin=bin_obj).aggregate(total=Sum('quantity'))['total'] or 0
+    total_quantity = get_summary('bin', bin_obj.id).total_quantity
     
     context = {
         'warehouse': warehouse,
@@ -467,7 +464,7 @@ def bin_delete(request, warehouse_id, rack_id, shelf_id, bin_id):
     bin_obj = get_object_or_404(Bin, id=bin_id, shelf=shelf)
     
     # Get total quantity for confirmation page
-    total_quantity = Item.objects.filter(bin=bin_obj).aggregate(total=Sum('quantity'))['total'] or 0
+    total_quantity = get_summary('bin', bin_obj.id).total_quantity
     
     if request.method == 'POST':
         bin_name = bin_obj.name
@@ -720,7 +717,7 @@ def item_transfer(request, warehouse_id, rack_id, shelf_id, bin_id, item_id):
                 
                 # Update the original item's quantity
                 item.quantity -= transfer_quantity
-                item.save()
+                item.save(update_fields=['quantity', 'updated_at'])
                 
                 messages.success(request, f'{transfer_quantity} units of "{item.name}" have been transferred.')
                 
@@ -762,67 +759,35 @@ def item_transfer(request, warehouse_id, rack_id, shelf_id, bin_id, item_id):
 # Utility Views
 def search(request):
     """
-    Search for inventory items.
+    Search for inventory across warehouses, racks, shelves, bins and items.
     """
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     search_type = request.GET.get('type', 'all')
     
     if query:
-        # Perform search based on the selected type
-        if search_type == 'warehouse' or search_type == 'all':
-            warehouses = Warehouse.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query),
-                user=request.user
-            )
-        else:
-            warehouses = Warehouse.objects.none()
-            
-        if search_type == 'rack' or search_type == 'all':
-            racks = Rack.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query),
-                warehouse__user=request.user
-            )
-        else:
-            racks = Rack.objects.none()
-            
-        if search_type == 'shelf' or search_type == 'all':
-            shelves = Shelf.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query),
-                rack__warehouse__user=request.user
-            )
-        else:
-            shelves = Shelf.objects.none()
-            
-        if search_type == 'bin' or search_type == 'all':
-            bins = Bin.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query),
-                shelf__rack__warehouse__user=request.user
-            )
-        else:
-            bins = Bin.objects.none()
-            
-        if search_type == 'item' or search_type == 'all':
-            items = Item.objects.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query) | 
-                Q(sku__icontains=query),
-                bin__shelf__rack__warehouse__user=request.user
-            )
-        else:
-            items = Item.objects.none()
-            
-        # Calculate total results
-        results_count = warehouses.count() + racks.count() + shelves.count() + bins.count() + items.count()
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+        
+        found = search_inventory(
+            request.user,
+            query,
+            kind=None if search_type == 'all' else search_type,
+            page=page
+        )
         
         context = {
             'query': query,
             'type': search_type,
-            'warehouses': warehouses,
-            'racks': racks,
-            'shelves': shelves,
-            'bins': bins,
-            'items': items,
-            'results_count': results_count
+            'results': found['results'],
+            'type_counts': found['counts'],
+            'results_count': found['total'],
+            'all_count': sum(found['counts'].values()),
+            'page': found['page'],
+            'num_pages': found['num_pages'],
+            'has_previous': found['has_previous'],
+            'has_next': found['has_next'],
         }
         
         return render(request, 'inventory/search_results.html', context)
@@ -830,6 +795,34 @@ def search(request):
         # If no query, show the search form
         return render(request, 'inventory/search.html')
 
+@login_required
+def bulk_adjust(request):
+    """
+    Apply a CSV or JSON batch of additions, dispositions and transfers.
+    
+    The batch is either an uploaded 'file' or the request body. Add
+    ?dry_run=1 to validate it without saving. Responds with JSON listing
+    how many rows were applied and the errors for rows that were not.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a CSV or JSON batch'}, status=405)
+    
+    upload = request.FILES.get('file')
+    if upload:
+        data = upload.read()
+        fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+    else:
+        data = request.body
+        fmt = 'json' if 'json' in request.content_type else 'csv'
+    
+    try:
+        rows = read_batch(data, fmt)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    result = apply_batch(request.user, rows, dry_run=request.GET.get('dry_run') == '1')
+    return JsonResponse(result)
+
 # Update the low_stock view in inventory/views.py
 
 @login_required
@@ -840,7 +833,7 @@ def low_stock(request):
     # Get items where current quantity is less than minimum stock level
     # AND minimum stock level is greater than 0 (items with no minimum set are excluded)
     low_stock_items = Item.objects.filter(
-        bin__shelf__rack__warehouse__user=request.user,
+        owner=request.user,
         min_stock_level__gt=0  # Only items with a minimum set
     ).filter(
         quantity__lt=F('min_stock_level')  # Current quantity < minimum
@@ -869,13 +862,13 @@ def restock_item(request):
             try:
                 item = Item.objects.get(
                     id=item_id,
-                    bin__shelf__rack__warehouse__user=request.user
+                    owner=request.user
                 )
                 
                 # Update quantity
                 old_quantity = item.quantity
                 item.quantity += quantity
-                item.save()
+                item.save(update_fields=['quantity', 'updated_at'])
                 
                 messages.success(
                     request, 
@@ -954,23 +947,14 @@ def report(request):
             warehouses_to_include = warehouses
         
         # Get overall stats
-        items_query = Item.objects.filter(bin__shelf__rack__warehouse__in=warehouses_to_include)
+        items_query = Item.objects.filter(warehouse__in=warehouses_to_include)
         total_items = items_query.count()
         total_quantity = items_query.aggregate(total=Sum('quantity'))['total'] or 0
         total_bins = Bin.objects.filter(shelf__rack__warehouse__in=warehouses_to_include).count()
         
         # Apply time filter if specified
-        if timeframe != 'all':
-            time_threshold = timezone.now()
-            if timeframe == 'day':
-                time_threshold = time_threshold - timezone.timedelta(days=1)
-            elif timeframe == 'week':
-                time_threshold = time_threshold - timezone.timedelta(weeks=1)
-            elif timeframe == 'month':
-                time_threshold = time_threshold - timezone.timedelta(days=30)
-            elif timeframe == 'quarter':
-                time_threshold = time_threshold - timezone.timedelta(days=90)
-            
+        time_threshold = timeframe_threshold(timeframe)
+        if time_threshold:
             # Filter for recently updated items
             items_query = items_query.filter(updated_at__gte=time_threshold)
             
@@ -979,41 +963,22 @@ def report(request):
             total_quantity = items_query.aggregate(total=Sum('quantity'))['total'] or 0
         
         # Get warehouse-specific data with more metrics
+        metrics = warehouse_metrics(warehouses_to_include)
         for warehouse in warehouses_to_include:
-            racks_count = Rack.objects.filter(warehouse=warehouse).count()
-            shelves_count = Shelf.objects.filter(rack__warehouse=warehouse).count()
-            bins_count = Bin.objects.filter(shelf__rack__warehouse=warehouse).count()
-            items_count = Item.objects.filter(bin__shelf__rack__warehouse=warehouse).count()
-            items_quantity = Item.objects.filter(bin__shelf__rack__warehouse=warehouse).aggregate(
-                total=Sum('quantity'))['total'] or 0
-            
-            # Calculate bins utilization
-            bins_with_items = Bin.objects.filter(
-                shelf__rack__warehouse=warehouse,
-                items__isnull=False
-            ).distinct().count()
-            
-            bins_utilization = 0
-            if bins_count > 0:
-                bins_utilization = (bins_with_items / bins_count) * 100
-            
-            # Get item stats - like average items per bin
-            avg_items_per_bin = 0
-            if bins_with_items > 0:
-                avg_items_per_bin = items_count / bins_with_items
+            warehouse_metric = metrics[warehouse.id]
             
             # Add enhanced warehouse data
             warehouse_data.append({
                 'id': warehouse.id,
                 'name': warehouse.name,
-                'items': items_count,
-                'quantity': items_quantity,
-                'racks': racks_count,
-                'shelves': shelves_count,
-                'bins': bins_count,
-                'bins_with_items': bins_with_items,
-                'bins_utilization': round(bins_utilization, 1),
-                'avg_items_per_bin': round(avg_items_per_bin, 1),
+                'items': warehouse_metric['items'],
+                'quantity': warehouse_metric['quantity'],
+                'racks': warehouse_metric['racks'],
+                'shelves': warehouse_metric['shelves'],
+                'bins': warehouse_metric['bins'],
+                'bins_with_items': warehouse_metric['bins_with_items'],
+                'bins_utilization': round(warehouse_metric['bins_utilization'], 1),
+                'avg_items_per_bin': round(warehouse_metric['avg_items_per_bin'], 1),
                 'last_updated': warehouse.updated_at
             })
         
@@ -1029,16 +994,11 @@ def report(request):
         
         # Get top stocked items with enhanced details
         top_items_query = Item.objects.filter(
-            bin__shelf__rack__warehouse__in=warehouses_to_include
-        ).order_by('-quantity')[:10]
+            warehouse__in=warehouses_to_include
+        ).select_related('bin', 'warehouse').order_by('-quantity')[:10]
         
         # Format top items for display with more details
         for item in top_items_query:
-            bin_obj = item.bin
-            shelf = bin_obj.shelf
-            rack = shelf.rack
-            warehouse = rack.warehouse
-            
             # Calculate how long the item has been in stock
             days_in_stock = (timezone.now() - item.created_at).days
             
@@ -1048,34 +1008,18 @@ def report(request):
                 'sku': item.sku or 'N/A',
                 'quantity': item.quantity,
                 'days_in_stock': days_in_stock,
-                'warehouse': warehouse.name,
-                'location': f"{warehouse.name} > {rack.name} > {shelf.name} > {bin_obj.name}",
-                'location_url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': warehouse.id,
-                    'rack_id': rack.id,
-                    'shelf_id': shelf.id,
-                    'bin_id': bin_obj.id,
-                    'item_id': item.id
-                })
+                'warehouse': item.warehouse.name,
+                'location': item.location,
+                'location_url': item.get_absolute_url()
             })
         
         # Calculate item age distribution
-        now = timezone.now()
-        new_items = Item.objects.filter(
-            bin__shelf__rack__warehouse__in=warehouses_to_include,
-            created_at__gte=now - timezone.timedelta(days=30)
-        ).count()
-        
-        medium_items = Item.objects.filter(
-            bin__shelf__rack__warehouse__in=warehouses_to_include,
-            created_at__lt=now - timezone.timedelta(days=30),
-            created_at__gte=now - timezone.timedelta(days=90)
-        ).count()
-        
-        old_items = Item.objects.filter(
-            bin__shelf__rack__warehouse__in=warehouses_to_include,
-            created_at__lt=now - timezone.timedelta(days=90)
-        ).count()
+        age_counts = item_age_counts(
+            Item.objects.filter(warehouse__in=warehouses_to_include)
+        )
+        new_items = age_counts['new']
+        medium_items = age_counts['medium']
+        old_items = age_counts['old']
         
         item_age_distribution = [
             {'name': 'New (< 30 days)', 'count': new_items, 'percentage': round((new_items / total_items) * 100, 1) if total_items > 0 else 0},
@@ -1085,11 +1029,17 @@ def report(request):
         
         # Get recent activity - both additions and dispositions
         recent_additions = StockAddition.objects.filter(
-            item__bin__shelf__rack__warehouse__in=warehouses_to_include
+            warehouse__in=warehouses_to_include
+        ).select_related(
+            'item__bin',
+            'created_by'
         ).order_by('-timestamp')[:5]
         
         recent_dispositions = Disposition.objects.filter(
-            item__bin__shelf__rack__warehouse__in=warehouses_to_include
+            warehouse__in=warehouses_to_include
+        ).select_related(
+            'item__bin',
+            'created_by'
         ).order_by('-timestamp')[:5]
         
         # Combine and sort
@@ -1101,13 +1051,7 @@ def report(request):
                 'reason': addition.get_addition_type_display(),
                 'timestamp': addition.timestamp,
                 'user': addition.created_by.username,
-                'item_url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': addition.item.bin.shelf.rack.warehouse.id,
-                    'rack_id': addition.item.bin.shelf.rack.id,
-                    'shelf_id': addition.item.bin.shelf.id,
-                    'bin_id': addition.item.bin.id,
-                    'item_id': addition.item.id
-                })
+                'item_url': addition.item.get_absolute_url()
             })
         
         for disposition in recent_dispositions:
@@ -1118,13 +1062,7 @@ def report(request):
                 'reason': disposition.get_disposition_type_display(),
                 'timestamp': disposition.timestamp,
                 'user': disposition.created_by.username,
-                'item_url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': disposition.item.bin.shelf.rack.warehouse.id,
-                    'rack_id': disposition.item.bin.shelf.rack.id,
-                    'shelf_id': disposition.item.bin.shelf.id,
-                    'bin_id': disposition.item.bin.id,
-                    'item_id': disposition.item.id
-                })
+                'item_url': disposition.item.get_absolute_url()
             })
         
         # Sort by timestamp
@@ -1135,44 +1073,30 @@ def report(request):
         
         # Filter by warehouse if specified
         if warehouse_id and warehouse_id != 'all':
-            warehouse_filter = Q(bin__shelf__rack__warehouse__id=warehouse_id)
+            warehouse_filter = Q(warehouse_id=warehouse_id, owner=request.user)
         else:
-            warehouse_filter = Q(bin__shelf__rack__warehouse__user=request.user)
+            warehouse_filter = Q(owner=request.user)
         
         # Get low stock items using the threshold parameter
         low_stock_items_query = Item.objects.filter(
             warehouse_filter,
             quantity__lt=low_stock_threshold
-        ).order_by('quantity')
+        ).select_related('bin', 'warehouse').order_by('quantity')
         
         low_stock_count = low_stock_items_query.count()
         
+        # Usage rates for every low stock item in a single query
+        velocity = stock_velocity(low_stock_items_query)
+        
         # Format low stock items for display with enhanced details
         for item in low_stock_items_query:
-            bin_obj = item.bin
-            shelf = bin_obj.shelf
-            rack = shelf.rack
-            warehouse = rack.warehouse
-            
             # Calculate if stock is critically low (less than 20% of threshold)
             is_critical = item.quantity < (low_stock_threshold * 0.2)
             
-            # Get recent dispositions to see rate of use
-            recent_dispositions = Disposition.objects.filter(
-                item=item
-            ).order_by('-timestamp')[:5]
-            
-            disposition_rate = 0
-            if recent_dispositions.exists():
-                # Calculate average weekly usage if we have data
-                oldest_disposition = recent_dispositions.last().timestamp
-                newest_disposition = recent_dispositions.first().timestamp
-                days_diff = (newest_disposition - oldest_disposition).days or 1  # Avoid divide by zero
-                total_disposed = sum(d.quantity for d in recent_dispositions)
-                disposition_rate = round((total_disposed / days_diff) * 7, 1)  # Weekly rate
-            
-            # Calculate estimated days until stockout
-            days_until_stockout = float('inf') if disposition_rate == 0 else round(item.quantity / (disposition_rate / 7), 1)
+            # Weekly usage rate and estimated days until stockout
+            item_velocity = velocity.get(item.id, NO_USAGE)
+            disposition_rate = item_velocity['weekly_usage']
+            days_until_stockout = item_velocity['days_until_stockout']
             
             low_stock_items.append({
                 'id': item.id,
@@ -1181,18 +1105,12 @@ def report(request):
                 'quantity': item.quantity,
                 'min_quantity': low_stock_threshold,
                 'is_critical': is_critical,
-                'warehouse': warehouse.name,
-                'location': f"{warehouse.name} > {rack.name} > {shelf.name} > {bin_obj.name}",
+                'warehouse': item.warehouse.name,
+                'location': item.location,
                 'weekly_usage': disposition_rate,
-                'days_until_stockout': days_until_stockout if days_until_stockout != float('inf') else 'N/A',
+                'days_until_stockout': days_until_stockout if days_until_stockout is not None else 'N/A',
                 'last_updated': item.updated_at,
-                'url': reverse('inventory:item-detail', kwargs={
-                    'warehouse_id': warehouse.id,
-                    'rack_id': rack.id,
-                    'shelf_id': shelf.id,
-                    'bin_id': bin_obj.id,
-                    'item_id': item.id
-                })
+                'url': item.get_absolute_url()
             })
             
         # Sort low stock items
@@ -1217,70 +1135,26 @@ def report(request):
             warehouses_to_include = warehouses
         
         # Apply time filter if specified
-        time_condition = Q()
-        if timeframe != 'all':
-            time_threshold = timezone.now()
-            if timeframe == 'day':
-                time_threshold = time_threshold - timezone.timedelta(days=1)
-            elif timeframe == 'week':
-                time_threshold = time_threshold - timezone.timedelta(weeks=1)
-            elif timeframe == 'month':
-                time_threshold = time_threshold - timezone.timedelta(days=30)
-            elif timeframe == 'quarter':
-                time_threshold = time_threshold - timezone.timedelta(days=90)
-            
-            time_condition = Q(updated_at__gte=time_threshold)
+        time_threshold = timeframe_threshold(timeframe)
         
         # Calculate capacity and other metrics for each warehouse
         total_capacity = 0
+        metrics = warehouse_metrics(warehouses_to_include, updated_since=time_threshold)
         
         for warehouse in warehouses_to_include:
-            # Get racks, shelves, bins and items with time filter if applicable
-            racks_query = Rack.objects.filter(warehouse=warehouse)
-            if timeframe != 'all':
-                racks_query = racks_query.filter(time_condition)
-            racks_count = racks_query.count()
-            
-            shelves_query = Shelf.objects.filter(rack__warehouse=warehouse)
-            if timeframe != 'all':
-                shelves_query = shelves_query.filter(time_condition)
-            shelves_count = shelves_query.count()
-            
-            bins_query = Bin.objects.filter(shelf__rack__warehouse=warehouse)
-            if timeframe != 'all':
-                bins_query = bins_query.filter(time_condition)
-            bins_count = bins_query.count()
-            
-            items_query = Item.objects.filter(bin__shelf__rack__warehouse=warehouse)
-            if timeframe != 'all':
-                items_query = items_query.filter(time_condition)
-            items_count = items_query.count()
-            
-            items_quantity = items_query.aggregate(total=Sum('quantity'))['total'] or 0
-            
-            # Count bins with items for utilization calculation
-            bins_with_items = Bin.objects.filter(
-                shelf__rack__warehouse=warehouse,
-                items__isnull=False
-            ).distinct().count()
-            
-            bins_utilization = 0
-            if bins_count > 0:
-                bins_utilization = (bins_with_items / bins_count) * 100
+            warehouse_metric = metrics[warehouse.id]
+            racks_count = warehouse_metric['racks']
+            shelves_count = warehouse_metric['shelves']
+            bins_count = warehouse_metric['bins']
+            items_count = warehouse_metric['items']
+            items_quantity = warehouse_metric['quantity']
+            bins_with_items = warehouse_metric['bins_with_items']
+            bins_utilization = warehouse_metric['bins_utilization']
             
             # Get item movement data
-            additions_last_30_days = StockAddition.objects.filter(
-                item__bin__shelf__rack__warehouse=warehouse,
-                timestamp__gte=timezone.now() - timezone.timedelta(days=30)
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            dispositions_last_30_days = Disposition.objects.filter(
-                item__bin__shelf__rack__warehouse=warehouse,
-                timestamp__gte=timezone.now() - timezone.timedelta(days=30)
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            # Calculate net change
-            net_change_30_days = additions_last_30_days - dispositions_last_30_days
+            additions_last_30_days = warehouse_metric['additions']
+            dispositions_last_30_days = warehouse_metric['dispositions']
+            net_change_30_days = warehouse_metric['net_change']
             
             # Calculate turnover rate (ratio of dispositions to average inventory)
             turnover_rate = 0
@@ -1352,6 +1226,7 @@ def report(request):
             })
             
         # Get item movement data
+        periods = []
         for i in range(6):  # Last 6 months
             month_start = timezone.now() - timezone.timedelta(days=30 * (i + 1))
             month_end = timezone.now() - timezone.timedelta(days=30 * i)
@@ -1364,27 +1239,9 @@ def report(request):
                 month_end = month_end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             
             month_name = month_start.strftime("%b %Y")
-            
-            additions = StockAddition.objects.filter(
-                item__bin__shelf__rack__warehouse__in=warehouses_to_include,
-                timestamp__gte=month_start,
-                timestamp__lt=month_end
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            dispositions = Disposition.objects.filter(
-                item__bin__shelf__rack__warehouse__in=warehouses_to_include,
-                timestamp__gte=month_start,
-                timestamp__lt=month_end
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            net_change = additions - dispositions
-            
-            movement_data.append({
-                'month': month_name,
-                'additions': additions,
-                'dispositions': dispositions,
-                'net_change': net_change
-            })
+            periods.append((month_name, month_start, month_end))
+        
+        movement_data = movement_by_period(warehouses_to_include, periods)
         
         # Reverse to show chronological order
         movement_data.reverse()
@@ -1399,52 +1256,25 @@ def report(request):
             warehouses_to_include = warehouses
         
         # Apply time filter if specified
-        time_condition = Q()
-        if timeframe != 'all':
-            time_threshold = timezone.now()
-            if timeframe == 'day':
-                time_threshold = time_threshold - timezone.timedelta(days=1)
-            elif timeframe == 'week':
-                time_threshold = time_threshold - timezone.timedelta(weeks=1)
-            elif timeframe == 'month':
-                time_threshold = time_threshold - timezone.timedelta(days=30)
-            elif timeframe == 'quarter':
-                time_threshold = time_threshold - timezone.timedelta(days=90)
-            
-            time_condition = Q(updated_at__gte=time_threshold)
+        time_threshold = timeframe_threshold(timeframe)
         
         # Get total items and quantity with filters
         items_query = Item.objects.filter(
-            bin__shelf__rack__warehouse__in=warehouses_to_include
+            warehouse__in=warehouses_to_include
         )
         
-        if timeframe != 'all':
-            items_query = items_query.filter(time_condition)
+        if time_threshold:
+            items_query = items_query.filter(updated_at__gte=time_threshold)
         
         total_items = items_query.count()
         total_quantity = items_query.aggregate(total=Sum('quantity'))['total'] or 0
         
         # For this example, we'll create pseudo-categories based on the first letter of the item name
         # This is a stand-in for real categories which would require model changes
-        category_counts = {}
-        
-        for item in items_query:
-            # Create a pseudo-category based on first letter
-            if item.name:
-                first_letter = item.name[0].upper()
-                category = f"Group {first_letter}"
-                
-                if category not in category_counts:
-                    category_counts[category] = {
-                        'items': 0,
-                        'quantity': 0
-                    }
-                
-                category_counts[category]['items'] += 1
-                category_counts[category]['quantity'] += item.quantity
+        category_totals = category_counts(items_query)
         
         # Convert to list format for template
-        for category, counts in category_counts.items():
+        for category, counts in category_totals.items():
             if total_items > 0:
                 percentage = round((counts['items'] / total_items) * 100, 1)
             else:
@@ -1468,17 +1298,13 @@ def report(request):
             category_distribution = sorted(category_distribution, key=lambda x: x['name'])
         
         # Warehouse distribution with enhanced metrics
+        metrics = warehouse_metrics(warehouses_to_include, updated_since=time_threshold)
         for warehouse in warehouses_to_include:
-            warehouse_items_query = Item.objects.filter(bin__shelf__rack__warehouse=warehouse)
-            
-            if timeframe != 'all':
-                warehouse_items_query = warehouse_items_query.filter(time_condition)
-            
-            items_count = warehouse_items_query.count()
-            items_quantity = warehouse_items_query.aggregate(total=Sum('quantity'))['total'] or 0
+            items_count = metrics[warehouse.id]['items']
+            items_quantity = metrics[warehouse.id]['quantity']
             
-            # Calculate number of unique item names (products) in this warehouse
-            unique_items = warehouse_items_query.values('name').distinct().count()
+            # Number of unique item names (products) in this warehouse
+            unique_items = metrics[warehouse.id]['unique_items']
             
             # Calculate average quantity per item
             avg_quantity = 0
@@ -1511,14 +1337,10 @@ def report(request):
             warehouse_distribution = sorted(warehouse_distribution, key=lambda x: x['name'])
         
         # Item age distribution calculation
-        now = timezone.now()
-        
-        new_items = items_query.filter(created_at__gte=now - timezone.timedelta(days=30)).count()
-        medium_items = items_query.filter(
-            created_at__lt=now - timezone.timedelta(days=30),
-            created_at__gte=now - timezone.timedelta(days=90)
-        ).count()
-        old_items = items_query.filter(created_at__lt=now - timezone.timedelta(days=90)).count()
+        age_counts = item_age_counts(items_query)
+        new_items = age_counts['new']
+        medium_items = age_counts['medium']
+        old_items = age_counts['old']
         
         if total_items > 0:
             new_percentage = round((new_items / total_items) * 100, 1)
@@ -1577,25 +1399,54 @@ def export_low_stock(request):
     
     # Filter by warehouse if specified
     if warehouse_id and warehouse_id != 'all':
-        warehouse_filter = Q(bin__shelf__rack__warehouse__id=warehouse_id)
+        warehouse_filter = Q(warehouse_id=warehouse_id, owner=request.user)
     else:
-        warehouse_filter = Q(bin__shelf__rack__warehouse__user=request.user)
+        warehouse_filter = Q(owner=request.user)
     
-    # Get low stock items
-    low_stock_items = Item.objects.filter(
+    low_stock_query = Item.objects.filter(
         warehouse_filter,
         quantity__lt=low_stock_threshold
     )
     
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="low_stock_items_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+    # Usage rates for every low stock item in a single query
+    velocity = stock_velocity(low_stock_query)
     
-    # Create the CSV writer
-    writer = csv.writer(response)
+    # Get low stock items, reading only the columns the export needs
+    low_stock_items = low_stock_query.values_list(
+        'id', 'name', 'sku', 'quantity', 'updated_at', 'warehouse__name',
+        'bin__shelf__rack__name', 'bin__shelf__name', 'bin__name'
+    ).iterator(chunk_size=utils.EXPORT_CHUNK_SIZE)
     
-    # Write the header row with enhanced columns
-    writer.writerow([
+    def rows():
+        for (item_id, name, sku, quantity, updated_at,
+             warehouse_name, rack_name, shelf_name, bin_name) in low_stock_items:
+            # Calculate if stock is critically low (less than 20% of threshold)
+            is_critical = quantity < (low_stock_threshold * 0.2)
+            
+            # Weekly usage rate and estimated days until stockout
+            item_velocity = velocity.get(item_id, NO_USAGE)
+            disposition_rate = item_velocity['weekly_usage']
+            days_until_stockout = item_velocity['days_until_stockout']
+            if days_until_stockout is None:
+                days_until_stockout = "N/A"
+            
+            yield [
+                name,
+                sku or 'N/A',
+                quantity,
+                low_stock_threshold,
+                disposition_rate,
+                days_until_stockout,
+                updated_at.strftime("%Y-%m-%d"),
+                warehouse_name,
+                rack_name,
+                shelf_name,
+                bin_name,
+                "Yes" if is_critical else "No"
+            ]
+    
+    # Stream the CSV with enhanced columns
+    headers = [
         'Item Name', 
         'SKU', 
         'Current Quantity', 
@@ -1608,46 +1459,11 @@ def export_low_stock(request):
         'Shelf', 
         'Bin',
         'Critically Low'
-    ])
+    ]
+    filename = f'low_stock_items_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
-    # Process and write the data rows
-    for item in low_stock_items:
-        # Calculate if stock is critically low (less than 20% of threshold)
-        is_critical = item.quantity < (low_stock_threshold * 0.2)
-        
-        # Get recent dispositions to see rate of use
-        recent_dispositions = Disposition.objects.filter(
-            item=item
-        ).order_by('-timestamp')[:5]
-        
-        disposition_rate = 0
-        if recent_dispositions.exists():
-            # Calculate average weekly usage if we have data
-            oldest_disposition = recent_dispositions.last().timestamp
-            newest_disposition = recent_dispositions.first().timestamp
-            days_diff = (newest_disposition - oldest_disposition).days or 1  # Avoid divide by zero
-            total_disposed = sum(d.quantity for d in recent_dispositions)
-            disposition_rate = round((total_disposed / days_diff) * 7, 1)  # Weekly rate
-        
-        # Calculate estimated days until stockout
-        days_until_stockout = "N/A" if disposition_rate == 0 else round(item.quantity / (disposition_rate / 7), 1)
-        
-        writer.writerow([
-            item.name,
-            item.sku or 'N/A',
-            item.quantity,
-            low_stock_threshold,
-            disposition_rate,
-            days_until_stockout,
-            item.updated_at.strftime("%Y-%m-%d"),
-            item.bin.shelf.rack.warehouse.name,
-            item.bin.shelf.rack.name,
-            item.bin.shelf.name,
-            item.bin.name,
-            "Yes" if is_critical else "No"
-        ])
-    
-    return response
+    return utils.stream_csv(rows(), headers, filename)
+
 # Error handler view
 def handle_error(request, error_title=None, error_message=None, error_details=None, back_url=None):
     """
@@ -1682,7 +1498,7 @@ def item_disposition(request, warehouse_id, rack_id, shelf_id, bin_id, item_id):
             
             # Update item quantity
             item.quantity -= disposition.quantity
-            item.save()
+            item.save(update_fields=['quantity', 'updated_at'])
             
             messages.success(
                 request, 
@@ -1736,7 +1552,7 @@ def item_add_stock(request, warehouse_id, rack_id, shelf_id, bin_id, item_id):
             
             # Update item quantity
             item.quantity += addition.quantity
-            item.save()
+            item.save(update_fields=['quantity', 'updated_at'])
             
             messages.success(
                 request, 
@@ -1774,12 +1590,17 @@ def item_add_stock(request, warehouse_id, rack_id, shelf_id, bin_id, item_id):
 
 # Add this new view to inventory/views.py
 
+ACTIVITY_PAGE_SIZE = 50
+
 @login_required
 def activity_list(request):
     """
     Display all activity with filtering options.
     """
-    from .utils import get_activity_data
+    from .utils import (
+        get_activity_data, get_activity_counts,
+        encode_activity_cursor, decode_activity_cursor
+    )
     
     # Get filter parameters from GET request
     time_filter = request.GET.get('time_filter', '24_hours')
@@ -1809,8 +1630,24 @@ def activity_list(request):
     if activity_type == 'all' or not activity_type:
         activity_type = None
     
-    # Get filtered activities
+    # Get one page of filtered activities, starting after the cursor if given
+    cursor = decode_activity_cursor(request.GET.get('after'))
     activities = get_activity_data(
+        user=request.user,
+        hours_limit=hours_limit,
+        warehouse_id=warehouse_id,
+        activity_type=activity_type,
+        limit=ACTIVITY_PAGE_SIZE + 1,
+        cursor=cursor
+    )
+    
+    # The extra row only tells us whether another page exists
+    next_cursor = None
+    if len(activities) > ACTIVITY_PAGE_SIZE:
+        activities = activities[:ACTIVITY_PAGE_SIZE]
+        next_cursor = encode_activity_cursor(activities[-1])
+    
+    activity_counts = get_activity_counts(
         user=request.user,
         hours_limit=hours_limit,
         warehouse_id=warehouse_id,
@@ -1840,14 +1677,20 @@ def activity_list(request):
         ]
     }
 
-    addition_count = len([a for a in activities if a['type'] == 'addition'])
-    disposition_count = len([a for a in activities if a['type'] == 'disposition'])
+    # Query string for the next page link, keeping the current filters
+    next_page_query = None
+    if next_cursor:
+        next_params = request.GET.copy()
+        next_params['after'] = next_cursor
+        next_page_query = next_params.urlencode()
     
     context = {
         'activities': activities,
-        'activity_count': len(activities),
-        'addition_count': addition_count,
-        'disposition_count': disposition_count,
+        'activity_count': activity_counts['addition'] + activity_counts['disposition'],
+        'addition_count': activity_counts['addition'],
+        'disposition_count': activity_counts['disposition'],
+        'is_first_page': cursor is None,
+        'next_page_query': next_page_query,
         **filter_context
     }
     
@@ -1899,6 +1742,26 @@ def export_activity_csv(request):
     )
 
 
+def _report_export_rows(items_query):
+    """
+    Yield report export dictionaries for items, reading the queryset in chunks.
+    """
+    now = timezone.now()
+    rows = items_query.values_list(
+        'name', 'sku', 'quantity', 'created_at', 'warehouse__name', 'bin__location_path'
+    ).iterator(chunk_size=utils.EXPORT_CHUNK_SIZE)
+    
+    for name, sku, quantity, created_at, warehouse_name, location in rows:
+        yield {
+            'name': name,
+            'sku': sku or 'N/A',
+            'quantity': quantity,
+            'days_in_stock': (now - created_at).days,
+            'warehouse': warehouse_name,
+            'location': location,
+        }
+
+
 @login_required  
 def export_report_csv(request):
     """
@@ -1925,63 +1788,30 @@ def export_report_csv(request):
     if report_type == 'low_stock':
         # Get low stock data
         if warehouse_id and warehouse_id != 'all':
-            warehouse_filter = Q(bin__shelf__rack__warehouse__id=warehouse_id)
+            warehouse_filter = Q(warehouse_id=warehouse_id, owner=request.user)
         else:
-            warehouse_filter = Q(bin__shelf__rack__warehouse__user=request.user)
+            warehouse_filter = Q(owner=request.user)
         
         low_stock_items_query = Item.objects.filter(
             warehouse_filter,
             quantity__lt=low_stock_threshold
         ).order_by('quantity')
         
-        # Format for CSV export
-        export_data = []
-        for item in low_stock_items_query:
-            bin_obj = item.bin
-            shelf = bin_obj.shelf
-            rack = shelf.rack
-            warehouse = rack.warehouse
-            
-            days_in_stock = (timezone.now() - item.created_at).days
-            
-            export_data.append({
-                'name': item.name,
-                'sku': item.sku or 'N/A',
-                'quantity': item.quantity,
-                'days_in_stock': days_in_stock,
-                'warehouse': warehouse.name,
-                'location': f"{warehouse.name} > {rack.name} > {shelf.name} > {bin_obj.name}",
-            })
+        # Rows are produced lazily while the CSV streams
+        export_data = _report_export_rows(low_stock_items_query)
             
     elif report_type == 'inventory_summary':
         # Get all items for summary
         if warehouse_id and warehouse_id != 'all':
-            warehouse_filter = Q(bin__shelf__rack__warehouse__id=warehouse_id)
+            warehouse_filter = Q(warehouse_id=warehouse_id, owner=request.user)
         else:
-            warehouse_filter = Q(bin__shelf__rack__warehouse__user=request.user)
+            warehouse_filter = Q(owner=request.user)
             
         items_query = Item.objects.filter(warehouse_filter)
         
-        export_data = []
-        for item in items_query:
-            bin_obj = item.bin
-            shelf = bin_obj.shelf
-            rack = shelf.rack
-            warehouse = rack.warehouse
-            
-            days_in_stock = (timezone.now() - item.created_at).days
-            
-            export_data.append({
-                'name': item.name,
-                'sku': item.sku or 'N/A',
-                'quantity': item.quantity,
-                'warehouse': warehouse.name,
-                'location': f"{warehouse.name} > {rack.name} > {shelf.name} > {bin_obj.name}",
-                'days_in_stock': days_in_stock,
-            })
+        export_data = _report_export_rows(items_query)
     else:
         # Fallback for unknown report types
-        export_data = []
         messages.error(request, f"Export not available for report type: {report_type}")
         return redirect('inventory:report')
     
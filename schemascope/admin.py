@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import DataSource, SchemaDefinition, PrimaryKeyCandidate, SchemaChange, SchemaRelationship
+from .models import (
+    DataSource, SchemaDefinition, PrimaryKeyCandidate, CompositeKeyCandidate, SchemaChange, SchemaRelationship, IngestJob,
+    QualityRule
+)
 
 @admin.register(DataSource)
 class DataSourceAdmin(admin.ModelAdmin):
@@ -9,7 +12,8 @@ class DataSourceAdmin(admin.ModelAdmin):
 
 @admin.register(SchemaDefinition)
 class SchemaDefinitionAdmin(admin.ModelAdmin):
-    list_display = ('data_source', 'detected_date', 'row_count')
+    list_display = ('data_source', 'detected_date', 'row_count', 'profile_mode')
+    list_filter = ('profile_mode',)
     search_fields = ('data_source__original_filename', 'data_source__canonical_name')
 
 @admin.register(PrimaryKeyCandidate)
@@ -18,6 +22,12 @@ class PrimaryKeyCandidateAdmin(admin.ModelAdmin):
     list_filter = ('is_confirmed',)
     search_fields = ('column_name', 'schema__data_source__original_filename')
 
+@admin.register(CompositeKeyCandidate)
+class CompositeKeyCandidateAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'schema', 'is_confirmed')
+    list_filter = ('is_confirmed',)
+    search_fields = ('schema__data_source__original_filename',)
+
 @admin.register(SchemaChange)
 class SchemaChangeAdmin(admin.ModelAdmin):
     list_display = ('source', 'change_type', 'change_date')
@@ -26,6 +36,18 @@ class SchemaChangeAdmin(admin.ModelAdmin):
 
 @admin.register(SchemaRelationship)
 class SchemaRelationshipAdmin(admin.ModelAdmin):
-    list_display = ('source_schema', 'target_schema', 'relationship_type', 'similarity_score')
+    list_display = ('source_schema', 'target_schema', 'relationship_type', 'similarity_score', 'containment_ratio')
     list_filter = ('relationship_type',)
-    search_fields = ('source_schema__data_source__original_filename', 'target_schema__data_source__original_filename')
\ No newline at end of file
+    search_fields = ('source_schema__data_source__original_filename', 'target_schema__data_source__original_filename')
+
+@admin.register(IngestJob)
+class IngestJobAdmin(admin.ModelAdmin):
+    list_display = ('data_source', 'status', 'stage', 'attempts', 'created_date', 'finished_date')
+    list_filter = ('status', 'stage')
+    search_fields = ('data_source__original_filename', 'data_source__canonical_name')
+
+@admin.register(QualityRule)
+class QualityRuleAdmin(admin.ModelAdmin):
+    list_display = ('column_name', 'rule_type', 'schema', 'created_date')
+    list_filter = ('rule_type',)
+    search_fields = ('column_name', 'schema__data_source__original_filename')
@@ -0,0 +1,297 @@
+# schemascope/cache.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+from django.conf import settings
+from .profiling import promote_dtype
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The cache is skipped without pyarrow
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+
+# Parquet files of parsed uploads, one directory per file content hash
+CACHE_DIR = getattr(settings, 'SCHEMASCOPE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'schemascope_cache'))
+
+# Options that change how a file parses; anything else does not affect the cache
+PARSE_OPTIONS = ('file_type', 'delimiter', 'encoding', 'sheet_name')
+
+# Rows per Parquet row group, and per chunk when reading the cache back
+ROW_GROUP_SIZE = 100000
+
+# Bytes read at a time when hashing a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """SHA-256 hex digest of a file, read a block at a time"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(datasource):
+    """
+    The content hash of a data source's file, computed and saved the first
+    time it is needed.
+    """
+    if not datasource.content_hash:
+        datasource.content_hash = file_hash(datasource.file.path)
+        datasource.save(update_fields=['content_hash'])
+    return datasource.content_hash
+
+
+def cache_path(datasource, options):
+    """
+    Path of the cached Parquet file for a data source parsed with the given
+    options. Files with the same content share their cache.
+    """
+    parse_options = {name: options[name] for name in PARSE_OPTIONS if name in options}
+    key = hashlib.sha256(json.dumps(parse_options, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, content_hash(datasource), f'{key}.parquet')
+
+
+class ParquetReader:
+    """
+    Reads a cached Parquet file with the same interface as ingest.CSVReader.
+    The file is memory-mapped and only the requested columns are decoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self):
+        return pq.ParquetFile(self.path, memory_map=True)
+
+    def chunks(self, usecols=None):
+        """Yield the file as DataFrames, one row group at a time"""
+        parquet = self._file()
+        for index in range(parquet.num_row_groups):
+            yield parquet.read_row_group(index, columns=usecols).to_pandas()
+
+    def head(self, rows):
+        """The first rows of the file, decoding no more than needed"""
+        parquet = self._file()
+        batch = next(parquet.iter_batches(batch_size=rows), None)
+        if batch is None:
+            return parquet.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas()
+
+    def fallback(self):
+        return None
+
+
+def cached_reader(datasource, options):
+    """
+    A ParquetReader for the data source's parsed file, or None if it has not
+    been cached with these options (or pyarrow is not installed).
+    """
+    if pq is None or not datasource.file:
+        return None
+    try:
+        path = cache_path(datasource, options)
+    except OSError:
+        return None
+    return ParquetReader(path) if os.path.exists(path) else None
+
+
+def _arrow_schema(dtypes, chunk):
+    """
+    Arrow types for the columns of a file, from their dtypes over all the
+    rows written, as chunks may have read narrower ones. Object columns
+    hold text, or booleans when some are missing; which one is taken from
+    the first chunk.
+    """
+    fields = []
+    for name, dtype in dtypes.items():
+        dtype = dtype if dtype is not None else np.dtype('float64')
+        if dtype == object:
+            arrow_type = pa.array(chunk[str(name)].dropna(), from_pandas=True).type
+            if arrow_type != pa.bool_():
+                arrow_type = pa.string()
+        else:
+            arrow_type = pa.from_numpy_dtype(dtype)
+        fields.append(pa.field(str(name), arrow_type))
+    return pa.schema(fields)
+
+
+def _normalize(chunk, dtypes):
+    """Give a chunk the given columns and dtypes"""
+    chunk = chunk.reindex(columns=list(dtypes))
+    for name, dtype in dtypes.items():
+        dtype = dtype if dtype is not None else np.dtype('float64')
+        if chunk[name].dtype == dtype:
+            continue
+        if dtype == object:
+            # Numbers read from chunks before the column turned out to hold text
+            values = chunk[name]
+            chunk[name] = values.astype(str).where(values.notna(), None)
+        else:
+            chunk[name] = chunk[name].astype(dtype)
+    chunk.columns = [str(name) for name in chunk.columns]
+    return chunk
+
+
+class CacheWriter:
+    """
+    Writes a file to the cache from the chunks of a pass already reading
+    it, such as profiling, so the file is only parsed once.
+
+    Chunks are written with the dtypes of the rows read so far, combined as
+    profiling.promote_dtype does. When a chunk widens a column, e.g. a
+    chunk with missing integers, the rows before it are left in a part file
+    of their own, and the parts are rewritten with the final dtypes from
+    Parquet when the pass is done.
+
+    Caching is best effort: files whose values Parquet cannot hold as
+    profiled, such as text columns holding nested JSON, are not cached,
+    and a failure to write never fails the pass reading the file.
+    """
+
+    def __init__(self, datasource, path):
+        self.datasource = datasource
+        self.path = path
+        self.parts = []
+        self.failed = False
+        self._writer = None
+        self._schema = None
+        self._dtypes = {}
+        self._rows = 0
+
+    def restart(self):
+        """Start again from the first chunk, as when the file is read again"""
+        self.discard()
+        self.failed = False
+
+    def write(self, chunk):
+        """Add the next chunk of the file"""
+        if self.failed:
+            return
+        try:
+            self._write(chunk)
+        except Exception:
+            logger.info('Not caching %s', self.datasource.file.name, exc_info=True)
+            self.discard()
+
+    def _write(self, chunk):
+        dtypes = dict(self._dtypes)
+        for name in dtypes:
+            if name not in chunk.columns:
+                dtypes[name] = promote_dtype(dtypes[name], np.dtype('float64'))
+        for name in chunk.columns:
+            if name not in dtypes and self._rows:
+                # Missing from the rows before
+                dtypes[name] = np.dtype('float64')
+            dtypes[name] = promote_dtype(dtypes.get(name), chunk[name].dtype)
+
+        chunk = _normalize(chunk, dtypes)
+        if self._writer is None or dtypes != self._dtypes:
+            self._close()
+            self._schema = _arrow_schema(dtypes, chunk)
+            part = f'{self.path}.{os.getpid()}.{len(self.parts)}.tmp'
+            self.parts.append(part)
+            self._writer = pq.ParquetWriter(part, self._schema)
+        self._dtypes = dtypes
+        self._rows += len(chunk)
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def finish(self, profile):
+        """
+        Complete the cached file once every chunk has been written.
+
+        Args:
+            profile: TableProfile of the whole file
+
+        Returns:
+            ParquetReader for the cached file, or None if it was not cached
+        """
+        if self.failed or not self.parts:
+            # Nothing to read back; an empty file is quick to parse anyway
+            self.discard()
+            return None
+        try:
+            self._close()
+            dtypes = {name: column.dtype for name, column in profile.columns.items()}
+            if len(self.parts) == 1 and dtypes == self._dtypes:
+                # Concurrent workers may cache the same file; the rename is atomic
+                os.replace(self.parts[0], self.path)
+            else:
+                self._rewrite({str(name): dtype for name, dtype in dtypes.items()})
+        except Exception:
+            logger.info('Not caching %s', self.datasource.file.name, exc_info=True)
+            self.discard()
+            return None
+        self.parts = []
+        return ParquetReader(self.path)
+
+    def _rewrite(self, dtypes):
+        """Combine the part files into the cached file, with the final dtypes"""
+        parts = list(self.parts)
+        partial = f'{self.path}.{os.getpid()}.tmp'
+        self.parts.append(partial)
+        writer = None
+        try:
+            for part in parts:
+                parquet = pq.ParquetFile(part)
+                for index in range(parquet.num_row_groups):
+                    chunk = _normalize(parquet.read_row_group(index).to_pandas(), dtypes)
+                    if writer is None:
+                        schema = _arrow_schema(dtypes, chunk)
+                        writer = pq.ParquetWriter(partial, schema)
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(partial, self.path)
+        for part in parts:
+            os.remove(part)
+
+    def discard(self):
+        """Stop caching and remove the files written so far"""
+        self._close()
+        for part in self.parts:
+            if os.path.exists(part):
+                os.remove(part)
+        self.parts = []
+        self._dtypes = {}
+        self._rows = 0
+        self.failed = True
+
+
+def cache_writer(datasource, options, reader):
+    """
+    A CacheWriter for a data source's file parsed with the given options,
+    or None if the reader already reads the cache (or pyarrow is not
+    installed).
+    """
+    if pq is None or isinstance(reader, ParquetReader):
+        return None
+    try:
+        path = cache_path(datasource, options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    except OSError:
+        logger.info('Not caching %s', datasource.file.name, exc_info=True)
+        return None
+    return CacheWriter(datasource, path)
+
+
+def remove_cache(content_hash):
+    """Delete every cached parse of the file with the given content hash"""
+    if content_hash:
+        shutil.rmtree(os.path.join(CACHE_DIR, content_hash), ignore_errors=True)
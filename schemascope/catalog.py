@@ -0,0 +1,147 @@
+# schemascope/catalog.py
+import hashlib
+from datetime import datetime
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from .models import SchemaDefinition, SchemaColumn
+from .matching import normalize_column_name
+
+
+# Schemas shown per catalog page
+CATALOG_PAGE_SIZE = 50
+
+# Seconds a catalog page is cached; ingesting or deleting a data source
+# invalidates the owner's pages sooner
+CATALOG_CACHE_SECONDS = 600
+
+
+def encode_catalog_cursor(row):
+    """
+    Encode the keyset position of a catalog row for the next page link.
+    """
+    return f"{row['detected_date'].isoformat()}|{row['id']}"
+
+
+def decode_catalog_cursor(value):
+    """
+    Decode a cursor produced by encode_catalog_cursor.
+
+    Returns:
+        (detected_date, id) tuple, or None if the value is invalid
+    """
+    try:
+        detected_date, pk = value.split('|')
+        return datetime.fromisoformat(detected_date), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _generation_key(user_id):
+    return f'schemascope:catalog:{user_id}:generation'
+
+
+def invalidate_catalog(user_id):
+    """
+    Drop a user's cached catalog pages, after one of their data sources has
+    been ingested or deleted. Pages are keyed by a generation number, so
+    moving it on orphans every cached page at once; they expire unread.
+    """
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _column_filter(user, column=None, column_type=None):
+    filters = Q(user=user)
+    if column:
+        filters &= Q(normalized_name=normalize_column_name(column))
+    if column_type:
+        filters &= Q(column_type=column_type)
+    return filters
+
+
+def catalog_page(user, cursor=None, column=None, column_type=None, limit=CATALOG_PAGE_SIZE):
+    """
+    One page of a user's schemas, newest first, optionally only those with
+    a column of a given name (compared normalized) and/or type.
+
+    Column searches go through the SchemaColumn index rather than the
+    schemas' column definitions, which are never loaded. Pages are cached
+    per user until their data sources change.
+
+    Args:
+        user: User whose schemas are listed
+        cursor: Optional (detected_date, id) position to start after
+        column: Optional column name to search for
+        column_type: Optional column type to search for
+        limit: Most schemas to return
+
+    Returns:
+        (rows, encoded cursor of the next page or None) tuple; each row is
+        a dictionary of the schema's id, its data source's fields, its
+        column count and, when searching, the 'matched_columns' as
+        {'name', 'type'} dictionaries
+    """
+    generation = cache.get(_generation_key(user.pk), 0)
+    # Search terms are hashed, as cache keys must not contain spaces
+    search = [cursor and f'{cursor[0].isoformat()}|{cursor[1]}', column and normalize_column_name(column),
+              column_type, limit]
+    digest = hashlib.blake2b(repr(search).encode('utf-8'), digest_size=16).hexdigest()
+    key = f'schemascope:catalog:{user.pk}:{generation}:{digest}'
+    page = cache.get(key)
+    if page is None:
+        page = _catalog_page(user, cursor, column, column_type, limit)
+        cache.set(key, page, CATALOG_CACHE_SECONDS)
+    return page
+
+
+def _catalog_page(user, cursor, column, column_type, limit):
+    schemas = SchemaDefinition.objects.filter(data_source__user=user)
+    searching = bool(column or column_type)
+    if searching:
+        schemas = schemas.filter(
+            pk__in=SchemaColumn.objects.filter(_column_filter(user, column, column_type)).values('schema_id')
+        )
+    if cursor:
+        detected_date, pk = cursor
+        schemas = schemas.filter(Q(detected_date__lt=detected_date) | Q(detected_date=detected_date, pk__lt=pk))
+
+    # One more than a page, which only tells us whether another page exists
+    rows = list(
+        schemas.order_by('-detected_date', '-pk')
+        .annotate(column_count=Count('indexed_columns'))
+        .values(
+            'id', 'detected_date', 'row_count', 'profile_mode', 'column_count', 'data_source_id',
+            original_filename=F('data_source__original_filename'),
+            canonical_name=F('data_source__canonical_name'),
+            schema_version=F('data_source__schema_version'),
+            source_type=F('data_source__source_type'),
+        )[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_catalog_cursor(rows[-1])
+
+    if searching:
+        matched = {}
+        for schema_id, name, found_type in (
+            SchemaColumn.objects.filter(_column_filter(user, column, column_type))
+            .filter(schema_id__in=[row['id'] for row in rows])
+            .order_by('position')
+            .values_list('schema_id', 'name', 'column_type')
+        ):
+            matched.setdefault(schema_id, []).append({'name': name, 'type': found_type})
+        for row in rows:
+            row['matched_columns'] = matched.get(row['id'], [])
+    return rows, next_cursor
+
+
+def catalog_column_types(user):
+    """The distinct column types among a user's schemas, for filtering the catalog"""
+    return list(
+        SchemaColumn.objects.filter(user=user).exclude(column_type='')
+        .order_by('column_type').values_list('column_type', flat=True).distinct()
+    )
@@ -0,0 +1,158 @@
+# schemascope/inclusion.py
+import numpy as np
+from django.db.models import Q
+from .models import ColumnFingerprint, SchemaRelationship
+from .sketches import KMVSketch
+
+
+# Share of a column's distinct values that must appear in a key column of
+# another data source for the pair to be recorded as a foreign key
+MIN_CONTAINMENT = 0.95
+
+# Columns with fewer distinct values match almost any key column by chance
+MIN_DISTINCT_VALUES = 10
+
+# Fewest sampled values a containment estimate may be based on, unless the
+# whole column was compared
+MIN_SAMPLE_SIZE = 30
+
+
+def value_kind(column):
+    """
+    'number' or 'text' for a profiled column, or None for columns that are
+    not fingerprinted. Values are hashed by kind (see sketches.hash_values),
+    so a number never matches a text value.
+    """
+    if column.dtype is None:
+        return None
+    if column.dtype.kind in 'iuf':
+        return 'number'
+    if column.dtype.kind in 'OSU':
+        return 'text'
+    return None
+
+
+def save_fingerprints(schema, profile):
+    """
+    Store the distinct value sketch of each column that could take part in
+    a foreign key.
+
+    Args:
+        schema: SchemaDefinition the profile was saved as
+        profile: TableProfile of the schema's file
+    """
+    fingerprints = []
+    for name, column in profile.columns.items():
+        kind = value_kind(column)
+        if kind is None or column.distinct_count < MIN_DISTINCT_VALUES:
+            continue
+        fingerprints.append(ColumnFingerprint(
+            schema=schema,
+            user_id=schema.data_source.user_id,
+            column_name=name,
+            value_kind=kind,
+            distinct_count=column.distinct_count,
+            is_unique=not column.null_count and column.distinct_count == column.count,
+            hashes=column.distinct.hashes.tobytes(),
+        ))
+    ColumnFingerprint.objects.bulk_create(fingerprints)
+
+
+def fingerprint_sketch(fingerprint):
+    return KMVSketch(hashes=np.frombuffer(bytes(fingerprint.hashes), dtype=np.uint64))
+
+
+def estimate_containment(dependent, referenced):
+    """
+    Estimate the share of one column's distinct values found in another,
+    from their sketches alone.
+
+    The referenced sketch holds every hash of its column below its largest
+    hash, so the dependent column's hashes in that range are a uniform
+    sample whose values are in the referenced column exactly when their
+    hashes are in its sketch.
+
+    Args:
+        dependent: KMVSketch of the column whose values are looked up
+        referenced: KMVSketch of the column they are looked up in
+
+    Returns:
+        (containment ratio, number of values the estimate is based on)
+    """
+    sample = dependent.hashes
+    if not referenced.is_exact:
+        sample = sample[sample <= referenced.hashes[-1]]
+    if not len(sample):
+        return 0.0, 0
+    found = np.isin(sample, referenced.hashes, assume_unique=True)
+    return float(found.mean()), len(sample)
+
+
+def _versions(schema):
+    """Ids of the schemas recorded as versions of a schema"""
+    related = SchemaRelationship.objects.filter(
+        Q(source_schema=schema) | Q(target_schema=schema), relationship_type='version'
+    ).values_list('source_schema_id', 'target_schema_id')
+    return {schema_id for pair in related for schema_id in pair} - {schema.pk}
+
+
+def find_inclusion_dependencies(schema):
+    """
+    Record foreign keys between a schema and the user's other schemas:
+    columns whose values are (almost) all found in a unique column of
+    another data source. Both directions are checked, so the new schema
+    can hold either the foreign key or the key it references.
+
+    Only the stored fingerprints are compared; no file is read. Versions
+    of the same data source share their keys, so they are skipped.
+
+    Args:
+        schema: SchemaDefinition whose fingerprints have been saved
+    """
+    own = list(ColumnFingerprint.objects.filter(schema=schema))
+    if not own:
+        return
+
+    others = ColumnFingerprint.objects.filter(
+        user_id=schema.data_source.user_id,
+        value_kind__in={fingerprint.value_kind for fingerprint in own},
+    ).exclude(schema_id__in=_versions(schema) | {schema.pk}).defer('hashes')
+
+    # Containment of at least MIN_CONTAINMENT needs the referenced column
+    # to have about as many distinct values as the dependent one; checking
+    # counts first avoids loading most fingerprints
+    pairs = []
+    for other in others:
+        for fingerprint in own:
+            if fingerprint.value_kind != other.value_kind:
+                continue
+            if other.is_unique and other.distinct_count >= fingerprint.distinct_count * MIN_CONTAINMENT:
+                pairs.append((fingerprint, other))
+            if fingerprint.is_unique and fingerprint.distinct_count >= other.distinct_count * MIN_CONTAINMENT:
+                pairs.append((other, fingerprint))
+    if not pairs:
+        return
+
+    loaded = ColumnFingerprint.objects.in_bulk({other.pk for pair in pairs for other in pair if other.schema_id != schema.pk})
+    sketches = {fingerprint.pk: fingerprint_sketch(fingerprint) for fingerprint in own}
+    sketches.update({pk: fingerprint_sketch(fingerprint) for pk, fingerprint in loaded.items()})
+
+    relationships = []
+    for dependent, referenced in pairs:
+        dependent_sketch = sketches[dependent.pk]
+        ratio, sample_size = estimate_containment(dependent_sketch, sketches[referenced.pk])
+        if ratio < MIN_CONTAINMENT:
+            continue
+        if sample_size < MIN_SAMPLE_SIZE and sample_size < len(dependent_sketch.hashes):
+            continue
+        relationships.append(SchemaRelationship(
+            source_schema_id=dependent.schema_id,
+            target_schema_id=referenced.schema_id,
+            relationship_type='foreign_key',
+            source_columns=[dependent.column_name],
+            target_columns=[referenced.column_name],
+            similarity_score=ratio,
+            containment_ratio=ratio,
+        ))
+
+    SchemaRelationship.objects.bulk_create(relationships)
@@ -0,0 +1,770 @@
+# schemascope/ingest.py
+import os
+import csv
+import json
+import itertools
+import datetime
+from decimal import Decimal
+import pandas as pd
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .models import SchemaDefinition, SchemaProfile, PrimaryKeyCandidate, CompositeKeyCandidate, SchemaChange
+from .cache import PARSE_OPTIONS, cache_writer, cached_reader, content_hash
+from .inclusion import save_fingerprints, find_inclusion_dependencies
+from .lineage import record_lineage
+from .quality import attach_rules, snapshot_rules, validate_schema
+from .catalog import invalidate_catalog
+from .jsonstream import MAX_RECORD_LINE, JSONStream, detect_format, flatten_record, iter_ndjson
+from .keys import find_composite_keys
+from .matching import index_schema, find_related_sources
+from .profiling import TableProfile, profile_chunks
+from .sampling import DEFAULT_SAMPLE_ROWS, SampleSummary, sample_rows
+from .sniffing import CSVPlan, sniff_csv, sniff_encoding
+from .statistics import save_statistics
+
+
+# Rows per chunk when profiling CSV files; bounds the memory a job needs
+CSV_CHUNK_SIZE = 100000
+
+# Records per chunk when profiling JSON arrays and newline-delimited JSON
+JSON_CHUNK_SIZE = 20000
+
+FILE_EXTENSIONS = {
+    '.csv': 'csv',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.json': 'json',
+    '.jsonl': 'json',
+    '.ndjson': 'json',
+}
+
+# 'auto' delimiters and encodings are sniffed from the file; see sniffing.py
+DELIMITER_PRESETS = {
+    'auto': 'auto',
+    'comma': ',',
+    'tab': '\t',
+    'semicolon': ';',
+    'pipe': '|',
+}
+
+
+class IngestError(Exception):
+    """Raised when a file cannot be read or its schema cannot be detected"""
+
+
+class CustomJSONEncoder(DjangoJSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        elif isinstance(obj, datetime.datetime):
+            return obj.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(obj, datetime.date):
+            return obj.strftime('%Y-%m-%d')
+        return super().default(obj)
+
+
+def processing_options(data, file_type):
+    """
+    Build the options for processing a file from submitted form data.
+
+    Args:
+        data: The request's POST data
+        file_type: 'csv', 'excel', 'json' or 'other'
+
+    Returns:
+        Dictionary of options accepted by ingest_datasource
+    """
+    options = {'file_type': file_type}
+
+    if file_type == 'csv':
+        delimiter_preset = data.get('delimiter_preset') or 'auto'
+        delimiter = DELIMITER_PRESETS.get(delimiter_preset, ',')
+        if delimiter_preset == 'custom' and data.get('delimiter_custom'):
+            delimiter = data.get('delimiter_custom')
+        options['delimiter'] = delimiter
+        options['encoding'] = data.get('encoding') or 'auto'
+
+    elif file_type == 'excel':
+        sheet_name = data.get('sheet_name') or ''
+        # Sheets can be given by index or name; blank means the first sheet
+        if sheet_name.isdigit():
+            sheet_name = int(sheet_name)
+        elif not sheet_name:
+            sheet_name = 0
+        options['sheet_name'] = sheet_name
+
+    elif file_type == 'json':
+        options['encoding'] = data.get('encoding') or 'auto'
+
+    # Large CSV and JSON files can be profiled from a sample of their rows
+    if file_type in ('csv', 'json') and data.get('profile_mode') == 'sample':
+        try:
+            sample_size = int(data.get('sample_size') or DEFAULT_SAMPLE_ROWS)
+        except ValueError:
+            sample_size = DEFAULT_SAMPLE_ROWS
+        options['profile_mode'] = 'sample'
+        options['sample_size'] = max(sample_size, 1)
+        options['verify_sample'] = bool(data.get('verify_sample'))
+
+    return options
+
+
+def ingest_datasource(datasource, options=None, on_stage=None):
+    """
+    Read a data source's file and detect its schema, primary keys and
+    relationships to other sources.
+
+    A file already profiled with the same parse options, such as the same
+    bytes uploaded under another name, is not read again. When options
+    include 'append' (the content hash and size of the file the data
+    source held before, set on upload), only the rows after that many
+    bytes are profiled and merged into the existing schema's profile.
+    With profile_mode 'sample', only a random sample of rows is profiled
+    (see ingest_sample). Quality rules carried over from the schema's
+    earlier profile, or from the previous version of its lineage, are then
+    evaluated (see check_quality).
+
+    Args:
+        datasource: The DataSource to process
+        options: Processing options, as built by processing_options
+        on_stage: Optional callback, called with each stage name
+            ('parse', 'profile', 'pk_detection', 'relationships', 'validation')
+            as it starts; 'validation' only if the schema has quality rules
+
+    Returns:
+        The new SchemaDefinition
+
+    Raises:
+        IngestError: If the file cannot be read or processed
+    """
+    options = dict(options or {})
+    append = options.pop('append', None)
+    options['file_type'] = resolve_file_type(datasource, options)
+
+    if on_stage:
+        on_stage('parse')
+
+    profiled = profiled_schema(datasource, options)
+    if profiled is not None:
+        profile = TableProfile.from_state(profiled.profile.state)
+        composite_keys = [(key.column_names, key.uniqueness_ratio) for key in profiled.composite_keys.all()]
+        schema = create_schema_from_profile(profile, datasource, composite_keys=composite_keys,
+                                            options=options, on_stage=on_stage)
+        check_quality(schema, open_reader(datasource, options), on_stage=on_stage)
+        return schema
+
+    if options.get('profile_mode') == 'sample':
+        return ingest_sample(datasource, options, on_stage=on_stage)
+
+    previous = appended_state(datasource, options, append)
+    tail, earlier_rules = None, None
+    if previous is not None:
+        earlier_rules = snapshot_rules(datasource)
+        # Profile the appended rows only; later passes read the whole file
+        plan = csv_plan(datasource.file.path, options)
+        tail = CSVReader(datasource.file.path, delimiter=plan.delimiter, encoding=plan.encoding,
+                         read_options=plan.read_options(), start=append['size'],
+                         names=[column['name'] for column in previous['columns']])
+        profile, tail = profile_reader(tail, on_stage=on_stage, state=previous)
+        reader = open_reader(datasource, options)
+        if tail.engine == 'python':
+            reader = reader.fallback() or reader
+    else:
+        reader = open_reader(datasource, options)
+        # The file is cached as it is profiled; later passes, and later runs
+        # with the same options, read the cache
+        cache = cache_writer(datasource, options, reader)
+        profile, reader = profile_reader(reader, on_stage=on_stage, cache=cache)
+        if cache is not None:
+            reader = cache.finish(profile) or reader
+
+    profile.verify_distinct_counts(reader)
+
+    if on_stage:
+        on_stage('pk_detection')
+
+    try:
+        composite_keys = find_composite_keys(reader, profile)
+    except Exception as e:
+        raise IngestError(f'Error finding composite keys: {e}')
+
+    schema = create_schema_from_profile(profile, datasource, composite_keys=composite_keys,
+                                        options=options, on_stage=on_stage)
+    if previous is not None:
+        SchemaChange.objects.create(
+            source=datasource,
+            change_type='append_rows',
+            details={'rows': profile.row_count - previous['row_count'], 'previous_rows': previous['row_count']}
+        )
+    check_quality(schema, reader, on_stage=on_stage, tail=tail, earlier=earlier_rules,
+                  first_tail_row=previous['row_count'] if previous is not None else 0)
+    return schema
+
+
+def ingest_sample(datasource, options, on_stage=None):
+    """
+    Detect a schema from a random sample of a file's rows, gathered in one
+    pass over the file. With options['verify_sample'], a second pass
+    counts nulls and checks the sample's key candidates against every row.
+
+    Sampled profiles are not saved for reuse, as a later full profile of
+    the same file should not be answered with a sample.
+
+    Args:
+        datasource: The DataSource to process
+        options: Processing options, with 'sample_size' rows to sample
+        on_stage: Optional stage callback, as for ingest_datasource
+
+    Returns:
+        The new SchemaDefinition
+    """
+    reader = open_reader(datasource, options)
+    (rows, total_rows), reader = sample_reader(reader, options.get('sample_size', DEFAULT_SAMPLE_ROWS),
+                                               on_stage=on_stage)
+    profile = profile_chunks([rows])
+    sample = SampleSummary(total_rows, len(rows))
+
+    # The sample is in memory, so its distinct counts are cheap to make exact
+    rows_reader = FrameReader(rows)
+    profile.verify_distinct_counts(rows_reader)
+
+    if on_stage:
+        on_stage('pk_detection')
+
+    try:
+        composite_keys = find_composite_keys(rows_reader, profile)
+        if options.get('verify_sample'):
+            sample.verify(reader, profile.primary_key_candidates(), composite_keys)
+    except Exception as e:
+        raise IngestError(f'Error finding composite keys: {e}')
+
+    schema = create_schema_from_profile(profile, datasource, composite_keys=sample.composite_keys(composite_keys),
+                                        on_stage=on_stage, sample=sample)
+    # Rules are checked against every row, not the sample
+    check_quality(schema, reader, on_stage=on_stage)
+    return schema
+
+
+def check_quality(schema, reader, on_stage=None, **incremental):
+    """
+    Evaluate a newly profiled schema's quality rules, if it has any.
+
+    Args:
+        schema: The new SchemaDefinition
+        reader: Chunk reader for the schema's file
+        on_stage: Optional stage callback, as for ingest_datasource
+        **incremental: tail, earlier and first_tail_row for appended rows
+            (see quality.validate_schema)
+
+    Raises:
+        IngestError: If the rules cannot be evaluated
+    """
+    if not schema.quality_rules.exists():
+        return
+    if on_stage:
+        on_stage('validation')
+    try:
+        validate_schema(schema, source_reader, reader=reader, **incremental)
+    except Exception as e:
+        raise IngestError(f'Error checking data quality: {e}')
+
+
+def validate_datasource(datasource, options, on_stage=None):
+    """
+    Evaluate a data source's quality rules again, without profiling its
+    file. Run by a validation job (see jobs.enqueue_validation).
+
+    Args:
+        datasource: The DataSource whose rules to evaluate
+        options: The job's options: the parse options to read the file
+            with, and optionally the primary keys of the 'rules' to
+            evaluate instead of all of them
+        on_stage: Optional stage callback, called with 'validation'
+
+    Raises:
+        IngestError: If the data source has no schema, or the rules cannot
+            be evaluated
+    """
+    try:
+        schema = SchemaDefinition.objects.get(data_source=datasource)
+    except SchemaDefinition.DoesNotExist:
+        raise IngestError('The data source has no schema to check')
+    rules = schema.quality_rules.select_related('reference_source__schema')
+    if 'rules' in options:
+        rules = rules.filter(pk__in=options['rules'])
+    rules = list(rules)
+    if not rules:
+        return
+
+    if on_stage:
+        on_stage('validation')
+    try:
+        validate_schema(schema, source_reader, reader=open_reader(datasource, options), rules=rules)
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(f'Error checking data quality: {e}')
+
+
+def source_options(datasource):
+    """The parse options of a data source's last successful job"""
+    job = datasource.ingest_jobs.filter(status='succeeded').order_by('-finished_date', '-id').first()
+    return _parse_options(job.options) if job else {}
+
+
+def source_reader(datasource):
+    """
+    A chunk reader for a data source's file, parsed with the options of its
+    last successful ingest.
+    """
+    return open_reader(datasource, source_options(datasource))
+
+
+def _parse_options(options):
+    return {name: options[name] for name in PARSE_OPTIONS if name in options}
+
+
+def profiled_schema(datasource, options):
+    """
+    Another of the user's schemas profiled from identical file content with
+    the same parse options, whose profile can be reused, or None.
+    """
+    if not datasource.content_hash:
+        return None
+    return SchemaDefinition.objects.filter(
+        data_source__user_id=datasource.user_id,
+        profile__content_hash=datasource.content_hash,
+        profile__options=_parse_options(options),
+    ).exclude(data_source=datasource).select_related('profile').order_by('-detected_date').first()
+
+
+def appended_state(datasource, options, append):
+    """
+    The saved profile of the file a data source held before rows were
+    appended to it, or None if the whole file needs profiling.
+
+    Args:
+        datasource: The DataSource, now holding the longer file
+        options: Processing options
+        append: {'content_hash', 'size'} of the earlier file, or None
+    """
+    if not append or options['file_type'] != 'csv':
+        return None
+    profile = SchemaProfile.objects.filter(
+        schema__data_source=datasource,
+        content_hash=append['content_hash'],
+        options=_parse_options(options),
+    ).first()
+    return profile.state if profile else None
+
+
+class CSVReader:
+    """
+    Reads a CSV file in chunks of rows, so only one chunk is in memory at a
+    time. Uses pandas' C parser unless told otherwise; the python parser is
+    slower but copes with multi-character delimiters and some malformed files.
+
+    Given a byte offset and column names, reads only the rows from the
+    offset on, such as the rows appended to a file since it was profiled.
+    """
+
+    def __init__(self, path, delimiter=',', encoding='utf-8', engine='c', chunksize=CSV_CHUNK_SIZE,
+                 start=0, names=None, read_options=None):
+        self.path = path
+        self.delimiter = delimiter
+        self.encoding = encoding
+        # The C parser only handles single-character delimiters
+        self.engine = engine if len(delimiter) == 1 else 'python'
+        self.chunksize = chunksize
+        self.start = start
+        self.names = names
+        # Further pd.read_csv arguments, such as a sniffing.CSVPlan's
+        self.read_options = read_options or {}
+
+    def _options(self, usecols):
+        options = dict(self.read_options)
+        if usecols is not None:
+            options['usecols'] = usecols
+            # Type hints may only name columns that are read
+            if 'dtype' in options:
+                options['dtype'] = {name: dtype for name, dtype in options['dtype'].items() if name in usecols}
+            if 'parse_dates' in options:
+                options['parse_dates'] = [name for name in options['parse_dates'] if name in usecols]
+        if self.start:
+            options['header'] = None
+            options['names'] = self.names
+        return options
+
+    def chunks(self, usecols=None):
+        """Yield the file as DataFrames of up to chunksize rows"""
+        options = self._options(usecols)
+        if not self.start:
+            with pd.read_csv(self.path, delimiter=self.delimiter, encoding=self.encoding,
+                             engine=self.engine, chunksize=self.chunksize, **options) as reader:
+                yield from reader
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.start)
+            if not f.read(1):
+                return  # Nothing after the offset
+            f.seek(self.start)
+            with pd.read_csv(f, delimiter=self.delimiter, encoding=self.encoding, engine=self.engine,
+                             chunksize=self.chunksize, **options) as reader:
+                yield from reader
+
+    def fallback(self):
+        """A reader for the same file using the python parser, or None"""
+        if self.engine == 'python':
+            return None
+        return CSVReader(self.path, self.delimiter, self.encoding, engine='python', chunksize=self.chunksize,
+                         start=self.start, names=self.names, read_options=self.read_options)
+
+
+class JSONReader:
+    """
+    Reads the records of a JSON array or newline-delimited JSON file in
+    batches, so only one batch is in memory at a time. Nested objects are
+    flattened to dotted column names as each record is read.
+    """
+
+    def __init__(self, path, encoding='utf-8', json_format='array', chunksize=JSON_CHUNK_SIZE):
+        self.path = path
+        self.encoding = encoding
+        self.json_format = json_format
+        self.chunksize = chunksize
+
+    def records(self):
+        """Yield each record, flattened"""
+        with open(self.path, 'r', encoding=self.encoding) as f:
+            if self.json_format == 'ndjson':
+                values = iter_ndjson(f)
+            else:
+                values = JSONStream(f, max_item_size=MAX_RECORD_LINE)
+            for value in values:
+                yield flatten_record(value)
+
+    def chunks(self, usecols=None):
+        """Yield the records as DataFrames of up to chunksize rows"""
+        records = self.records()
+        while True:
+            batch = list(itertools.islice(records, self.chunksize))
+            if not batch:
+                return
+            chunk = pd.DataFrame.from_records(batch)
+            # Columns missing from every record in the batch read as empty
+            yield chunk if usecols is None else chunk.reindex(columns=usecols)
+
+    def fallback(self):
+        return None
+
+
+class FrameReader:
+    """Gives a DataFrame that is already in memory the same interface as CSVReader"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def chunks(self, usecols=None):
+        yield self.df if usecols is None else self.df[usecols]
+
+    def fallback(self):
+        return None
+
+
+def resolve_file_type(datasource, options):
+    """
+    The file type to read a data source as: the one chosen, or for 'other'
+    the one its file extension suggests.
+
+    Raises:
+        IngestError: If the file type is not supported
+    """
+    file_type = options.get('file_type') or datasource.source_type
+    if file_type not in ('csv', 'excel', 'json'):
+        # Choose by file extension
+        file_type = FILE_EXTENSIONS.get(os.path.splitext(datasource.file.path)[1].lower())
+        if file_type is None:
+            raise IngestError(f"Unsupported file type '{os.path.splitext(datasource.file.path)[1] or 'unknown'}'")
+    return file_type
+
+
+def csv_plan(path, options):
+    """
+    Plan how to read a CSV file: the chosen encoding and delimiter, or for
+    'auto' the ones sniffed from the start of the file, plus column hints.
+
+    Returns:
+        sniffing.CSVPlan
+
+    Raises:
+        IngestError: If the file cannot be read
+    """
+    encoding = options.get('encoding', 'utf-8')
+    delimiter = options.get('delimiter', ',')
+    encoding = None if encoding == 'auto' else encoding
+    delimiter = None if delimiter == 'auto' else delimiter
+    try:
+        return sniff_csv(path, encoding=encoding, delimiter=delimiter)
+    except OSError as e:
+        raise IngestError(f'Error reading CSV file: {e}')
+    except (csv.Error, LookupError, ValueError):
+        # Read the file as pandas would have without a plan
+        return CSVPlan(encoding or 'utf-8', delimiter or ',')
+
+
+def open_reader(datasource, options):
+    """
+    Create a chunk reader for a data source's file, reading the Parquet
+    cache if the file has already been parsed with the same options.
+
+    Args:
+        datasource: The DataSource to read
+        options: Processing options, as built by processing_options
+
+    Returns:
+        ParquetReader, CSVReader, JSONReader or FrameReader
+
+    Raises:
+        IngestError: If the file cannot be read
+    """
+    file_type = resolve_file_type(datasource, options)
+
+    cached = cached_reader(datasource, dict(options, file_type=file_type))
+    if cached is not None:
+        return cached
+
+    if file_type == 'csv':
+        plan = csv_plan(datasource.file.path, options)
+        return CSVReader(datasource.file.path, delimiter=plan.delimiter, encoding=plan.encoding,
+                         read_options=plan.read_options())
+    elif file_type == 'excel':
+        return FrameReader(read_excel_file(datasource, sheet_name=options.get('sheet_name', 0)))
+
+    try:
+        encoding = options.get('encoding', 'utf-8')
+        if encoding == 'auto':
+            encoding = sniff_encoding(datasource.file.path)
+        with open(datasource.file.path, 'r', encoding=encoding) as f:
+            json_format = detect_format(f)
+    except Exception as e:
+        raise IngestError(f'Error reading JSON file: {e}')
+    if json_format in ('array', 'ndjson'):
+        return JSONReader(datasource.file.path, encoding=encoding, json_format=json_format)
+    return FrameReader(read_json_file(datasource, encoding=encoding))
+
+
+def profile_reader(reader, on_stage=None, state=None, cache=None):
+    """
+    Profile every column of a file, one chunk at a time. If the C parser
+    fails part way through a CSV file the file is profiled again with the
+    python parser.
+
+    Args:
+        reader: Chunk reader for the file
+        on_stage: Optional stage callback, as for ingest_datasource
+        state: Optional saved TableProfile state of earlier rows, which
+            the profile continues from
+        cache: Optional cache.CacheWriter to write each chunk to as it is
+            profiled; discarded if the file cannot be parsed
+
+    Returns:
+        (TableProfile, reader) tuple; the reader is the one that succeeded,
+        for any further passes over the file
+
+    Raises:
+        IngestError: If the file cannot be parsed
+    """
+    def start():
+        return TableProfile.from_state(state) if state else None
+
+    try:
+        return _read_with_fallback(reader, lambda chunks: profile_chunks(chunks, start()), on_stage, cache=cache)
+    except Exception:
+        if cache is not None:
+            cache.discard()
+        raise
+
+
+def sample_reader(reader, size, on_stage=None):
+    """
+    Sample the rows of a file in one pass, falling back to the python
+    parser as profile_reader does.
+
+    Returns:
+        ((sampled rows DataFrame, rows in the file), reader) tuple
+
+    Raises:
+        IngestError: If the file cannot be parsed
+    """
+    return _read_with_fallback(reader, lambda chunks: sample_rows(chunks, size), on_stage)
+
+
+def _read_with_fallback(reader, consume, on_stage=None, cache=None):
+    """
+    Pass a reader's chunks to consume, and to the cache writer if given,
+    reading again with the reader's fallback if that fails part way.
+    Returns (result, reader used).
+    """
+    def chunks(reader):
+        if cache is not None:
+            # Chunks written by a reader that failed are not kept
+            cache.restart()
+        for index, chunk in enumerate(reader.chunks()):
+            if index == 0 and on_stage:
+                # The first chunk parsed; from here on parsing and profiling interleave
+                on_stage('profile')
+            if cache is not None:
+                cache.write(chunk)
+            yield chunk
+
+    try:
+        result = consume(chunks(reader))
+    except Exception as e:
+        fallback = reader.fallback()
+        if fallback is None:
+            raise IngestError(f'Error reading file: {e}')
+        try:
+            result = consume(chunks(fallback))
+        except Exception:
+            raise IngestError(f'Error reading CSV file: {e}')
+        reader = fallback
+
+    return result, reader
+
+
+def read_excel_file(datasource, sheet_name=0):
+    """Read an Excel file with specific sheet"""
+    try:
+        return pd.read_excel(datasource.file.path, sheet_name=sheet_name)
+    except Exception as e:
+        raise IngestError(f'Error reading Excel file: {e}')
+
+
+def read_json_file(datasource, encoding='utf-8'):
+    """Read a JSON file"""
+    try:
+        with open(datasource.file.path, 'r', encoding=encoding) as f:
+            data = json.load(f)
+    except Exception as e:
+        raise IngestError(f'Error reading JSON file: {e}')
+
+    # Convert to dataframe - this handles different JSON structures
+    try:
+        if isinstance(data, list):
+            # List of records
+            return pd.DataFrame(data)
+        elif isinstance(data, dict):
+            # Try to convert dictionary to dataframe
+            if all(isinstance(data[key], (list, dict)) for key in data):
+                # Nested structure - flatten first level
+                flattened = {}
+                for key, value in data.items():
+                    if isinstance(value, list):
+                        flattened[key] = value
+                    elif isinstance(value, dict):
+                        for subkey, subvalue in value.items():
+                            flattened[f"{key}_{subkey}"] = subvalue
+                return pd.DataFrame(flattened)
+            # Simple dict
+            return pd.DataFrame([flatten_record(data)])
+    except Exception as e:
+        raise IngestError(f'Error converting JSON to a table: {e}')
+
+    raise IngestError('Unsupported JSON structure')
+
+
+def create_schema_from_profile(profile, datasource, composite_keys=(), options=None, on_stage=None, sample=None):
+    """
+    Save the schema found by profiling a file, replacing any existing schema
+    for the data source in one transaction so a failure leaves the previous
+    schema in place.
+
+    Args:
+        profile: TableProfile of the data source's file
+        datasource: The DataSource the profile describes
+        composite_keys: (column names, uniqueness ratio) for each
+            multi-column key found in the file
+        options: Processing options the file was parsed with; when given,
+            the profile is saved for reuse
+        on_stage: Optional stage callback, as for ingest_datasource
+        sample: Optional sampling.SampleSummary, when the profile is of a
+            sample of the file's rows
+
+    Returns:
+        The new SchemaDefinition
+    """
+    try:
+        column_definitions = profile.column_definitions()
+
+        # Identify potential primary keys: columns without nulls and with
+        # high uniqueness
+        primary_keys = profile.primary_key_candidates()
+        if sample is not None:
+            primary_keys = sample.primary_keys(primary_keys)
+
+        profile_state = None
+        if options is not None:
+            profile_state = json.loads(json.dumps(profile.to_state(), cls=CustomJSONEncoder))
+
+        if on_stage:
+            on_stage('relationships')
+
+        with transaction.atomic():
+            # Quality rules outlive the schema they were set on
+            carried_rules = snapshot_rules(datasource)
+
+            # Remove any existing schema (in case this is a retry)
+            SchemaDefinition.objects.filter(data_source=datasource).delete()
+
+            # Create schema definition
+            schema = SchemaDefinition.objects.create(
+                data_source=datasource,
+                column_definitions=json.loads(json.dumps(column_definitions, cls=CustomJSONEncoder)),
+                row_count=profile.row_count if sample is None else sample.total_rows,
+                profile_mode='full' if sample is None else 'sample',
+                sample_size=None if sample is None else sample.sample_rows,
+                sample_verified=sample is not None and sample.verified
+            )
+
+            if profile_state is not None:
+                SchemaProfile.objects.create(
+                    schema=schema,
+                    content_hash=content_hash(datasource),
+                    options=_parse_options(options),
+                    state=profile_state
+                )
+
+            PrimaryKeyCandidate.objects.bulk_create([
+                PrimaryKeyCandidate(
+                    schema=schema,
+                    column_name=column,
+                    uniqueness_ratio=uniqueness,
+                    is_confirmed=False  # Needs user confirmation
+                )
+                for column, uniqueness in primary_keys
+            ])
+            CompositeKeyCandidate.objects.bulk_create([
+                CompositeKeyCandidate(
+                    schema=schema,
+                    column_names=column_names,
+                    uniqueness_ratio=uniqueness
+                )
+                for column_names, uniqueness in composite_keys
+            ])
+
+            # Check for relationships with existing sources
+            index_schema(schema)
+            invalidate_catalog(datasource.user_id)
+            find_related_sources(datasource)
+            save_fingerprints(schema, profile)
+            save_statistics(schema, profile, sample=sample)
+            find_inclusion_dependencies(schema)
+
+            # Place it among the versions of its canonical name
+            record_lineage(datasource)
+            attach_rules(schema, carried_rules)
+    except Exception as e:
+        raise IngestError(f'Error creating schema: {e}')
+
+    return schema
@@ -0,0 +1,208 @@
+# schemascope/jobs.py
+import datetime
+import logging
+import os
+import threading
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import IngestJob
+from .ingest import IngestError, ingest_datasource, source_options, validate_datasource
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the heartbeats of a running job
+HEARTBEAT_INTERVAL = 30
+
+# Running jobs whose heartbeat has stopped for this long are assumed to
+# belong to a worker that died, and are queued again
+STALE_JOB_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def enqueue_ingest(datasource, options, user=None):
+    """
+    Queue schema detection for a data source.
+
+    Args:
+        datasource: The DataSource to process
+        options: Processing options, as built by ingest.processing_options
+        user: The user who requested the job
+
+    Returns:
+        The new IngestJob
+    """
+    return IngestJob.objects.create(
+        data_source=datasource,
+        user=user or datasource.user,
+        options=options,
+    )
+
+
+def enqueue_validation(datasource, rules=None, user=None):
+    """
+    Queue a check of a data source's quality rules, which reads the file
+    with the parse options of its last successful job.
+
+    Args:
+        datasource: The DataSource whose rules to evaluate
+        rules: Optional QualityRules to evaluate; by default all of them
+        user: The user who requested the job
+
+    Returns:
+        The new IngestJob
+    """
+    options = dict(source_options(datasource), validate_only=True)
+    if rules is not None:
+        options['rules'] = [rule.pk for rule in rules]
+    return enqueue_ingest(datasource, options, user=user)
+
+
+def retry_job(job):
+    """
+    Queue a failed job to run again with the same options.
+
+    Returns:
+        True if the job was queued, False if it had not failed
+    """
+    queued = IngestJob.objects.filter(pk=job.pk, status='failed').update(
+        status='queued', stage='', error='', started_date=None, finished_date=None
+    )
+    if queued:
+        job.refresh_from_db()
+    return bool(queued)
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job as running and return it.
+
+    The status check in the update makes the claim atomic, so several
+    workers can poll the same table without picking up the same job.
+
+    Returns:
+        The claimed IngestJob, or None if the queue is empty
+    """
+    while True:
+        job_id = (
+            IngestJob.objects.filter(status='queued')
+            .order_by('created_date', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        claimed = IngestJob.objects.filter(pk=job_id, status='queued').update(
+            status='running',
+            stage='',
+            started_date=timezone.now(),
+            heartbeat_date=timezone.now(),
+            worker_pid=None,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return IngestJob.objects.get(pk=job_id)
+
+
+def release_job(job_id, attempt):
+    """
+    Queue a claimed job again without counting the attempt, when its run
+    was interrupted through no fault of its own.
+
+    Returns:
+        True if the job was queued, False if it was no longer that run
+    """
+    return bool(IngestJob.objects.filter(pk=job_id, status='running', attempts=attempt).update(
+        status='queued', stage='', worker_pid=None, attempts=F('attempts') - 1
+    ))
+
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """
+    Queue running jobs again when their heartbeat has stopped for longer
+    than the timeout. Jobs claimed before heartbeats were recorded go by
+    when they started.
+
+    Returns:
+        Number of jobs queued
+    """
+    cutoff = timezone.now() - timeout
+    return IngestJob.objects.filter(
+        Q(heartbeat_date__lt=cutoff) | Q(heartbeat_date__isnull=True, started_date__lt=cutoff),
+        status='running',
+    ).update(status='queued', stage='', worker_pid=None)
+
+
+def _heartbeat(claimed, stopped):
+    """Touch a running job's heartbeat until stopped, from its own thread"""
+    try:
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            claimed.update(heartbeat_date=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_job(job_id, attempt=None):
+    """
+    Run a claimed job, recording each stage as it starts and the outcome
+    when it finishes. Errors are stored on the job rather than raised.
+
+    The job's heartbeat is touched at each stage and every
+    HEARTBEAT_INTERVAL seconds between them. Every update is limited to
+    the run that was claimed, so if the job was queued again and picked up
+    by another worker meanwhile, this run's outcome is discarded.
+
+    Args:
+        job_id: Primary key of a running IngestJob
+        attempt: The attempt number it was claimed with; by default its
+            current one
+
+    Returns:
+        The job's final status, or None if the outcome was discarded
+    """
+    # A pool process runs many jobs; drop connections the database has
+    # closed or that are past CONN_MAX_AGE, as Django does per request
+    close_old_connections()
+    try:
+        return _run_job(job_id, attempt)
+    finally:
+        close_old_connections()
+
+
+def _run_job(job_id, attempt):
+    job = IngestJob.objects.select_related('data_source').get(pk=job_id)
+    if attempt is None:
+        attempt = job.attempts
+    claimed = IngestJob.objects.filter(pk=job.pk, status='running', attempts=attempt)
+    if not claimed.update(worker_pid=os.getpid(), heartbeat_date=timezone.now()):
+        logger.warning('Ingest job %s attempt %s is no longer running; skipped', job.pk, attempt)
+        return None
+
+    def on_stage(stage):
+        claimed.update(stage=stage, heartbeat_date=timezone.now())
+
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(claimed, stopped), daemon=True)
+    heartbeat.start()
+    try:
+        if job.is_validation:
+            validate_datasource(job.data_source, job.options, on_stage=on_stage)
+        else:
+            ingest_datasource(job.data_source, job.options, on_stage=on_stage)
+    except IngestError as e:
+        logger.warning('Ingest job %s failed: %s', job.pk, e)
+        status, error = 'failed', str(e)
+    except Exception as e:
+        logger.exception('Ingest job %s failed', job.pk)
+        status, error = 'failed', str(e) or e.__class__.__name__
+    else:
+        status, error = 'succeeded', ''
+    finally:
+        stopped.set()
+        heartbeat.join()
+
+    if not claimed.update(status=status, error=error, finished_date=timezone.now()):
+        logger.warning('Ingest job %s attempt %s was queued again while running; outcome discarded',
+                       job.pk, attempt)
+        return None
+    return status
@@ -0,0 +1,207 @@
+# schemascope/jsonstream.py
+import json
+
+
+# Characters read from the file at a time
+READ_SIZE = 64 * 1024
+
+# Longest line read when checking for newline-delimited JSON, and the
+# longest item decoded from a streamed array
+MAX_RECORD_LINE = 16 * 1024 * 1024
+
+# Characters an incomplete token can leave before the end of what has been
+# read, such as '-Infinit' or a cut-off '\u12' escape. A decoding error
+# further back is in the document itself, not caused by where a read ended.
+_TRUNCATION_MARGIN = 16
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamError(ValueError):
+    """Raised when a JSON document is malformed, or an item is over the size limit"""
+
+
+class JSONStream:
+    """
+    Reads the top-level items of a JSON document from a text file without
+    loading the whole document: the elements of a top-level array, the
+    (key, value) pairs of a top-level object, or the document itself for
+    any other value. Only the item being decoded is held in memory.
+
+    After the first item has been read, kind is 'array', 'object' or
+    'value'.
+
+    Args:
+        f: Text file opened for reading
+        max_item_size: Optional limit on the characters of one item;
+            a larger item raises JSONStreamError
+    """
+
+    def __init__(self, f, max_item_size=None):
+        self.file = f
+        self.max_item_size = max_item_size
+        self.kind = None
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read more of the file; False at the end of it"""
+        if self._eof:
+            return False
+        if self._pos > READ_SIZE:
+            # Drop what has been decoded already
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        if self.max_item_size is not None and len(self._buffer) - self._pos > self.max_item_size:
+            raise JSONStreamError(f'JSON item is larger than {self.max_item_size} characters')
+        data = self.file.read(READ_SIZE)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def _peek(self):
+        """The next character that is not whitespace, or None at the end"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character is None or character not in characters:
+            found = 'end of file' if character is None else repr(character)
+            raise JSONStreamError(f"Expected one of {characters!r} in JSON, found {found}")
+        self._pos += 1
+        return character
+
+    def _decode(self):
+        """Decode the next value, reading more of the file until it is complete"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer needs more
+                # of the file; a string is reported from where it starts
+                truncated = (e.msg.startswith('Unterminated string')
+                             or e.pos >= len(self._buffer) - _TRUNCATION_MARGIN)
+                if not truncated or not self._fill():
+                    raise JSONStreamError(f'Invalid JSON: {e}')
+                continue
+            # A number at the end of the buffer may continue in the next read
+            if end < len(self._buffer) or self._eof:
+                self._pos = end
+                return value
+            self._fill()
+
+    def __iter__(self):
+        start = self._peek()
+        if start == '[':
+            self.kind = 'array'
+            yield from self._array()
+        elif start == '{':
+            self.kind = 'object'
+            yield from self._object()
+        elif start is not None:
+            self.kind = 'value'
+            yield self._decode()
+
+    def _array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._expect(',]') == ']':
+                return
+
+    def _object(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise JSONStreamError('Expected a property name in JSON object')
+            key = self._decode()
+            self._expect(':')
+            yield key, self._decode()
+            if self._expect(',}') == '}':
+                return
+
+
+def detect_format(f):
+    """
+    Tell what a JSON file holds from its start: 'array' for a top-level
+    array, 'ndjson' for one object per line (newline-delimited JSON),
+    'object' for a single object and 'value' for anything else. Leaves the
+    file where it was.
+    """
+    start = f.tell()
+    try:
+        first = _first_character(f)
+        if first == '[':
+            return 'array'
+        if first != '{':
+            return 'value'
+
+        f.seek(start)
+        line = ''
+        for line in iter(lambda: f.readline(MAX_RECORD_LINE), ''):
+            if line.strip():
+                break
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A pretty-printed object starts with a line that is not JSON by itself
+            return 'object'
+        if isinstance(record, dict) and line.endswith('\n') and _first_character(f) == '{':
+            return 'ndjson'
+        return 'object'
+    finally:
+        f.seek(start)
+
+
+def _first_character(f):
+    """The next character of a file that is not whitespace, or None"""
+    for block in iter(lambda: f.read(4096), ''):
+        stripped = block.lstrip(_WHITESPACE)
+        if stripped:
+            return stripped[0]
+    return None
+
+
+def iter_ndjson(f):
+    """Yield the values of a newline-delimited JSON file, one per line"""
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise JSONStreamError(f'Invalid JSON on line {number}: {e}')
+
+
+def flatten_record(record, prefix=''):
+    """
+    Flatten nested objects in a record to dotted column names:
+    {"user": {"id": 1}} becomes {"user.id": 1}. Lists and empty objects are
+    kept as values. A record that is not an object becomes {"value": record}.
+    """
+    if not isinstance(record, dict):
+        return {'value': record}
+    flat = {}
+    for key, value in record.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict) and value:
+            flat.update(flatten_record(value, f'{name}.'))
+        else:
+            flat[name] = value
+    return flat
@@ -0,0 +1,190 @@
+# schemascope/keys.py
+import itertools
+import numpy as np
+import pandas as pd
+from .sketches import DistinctHashes, hash_values
+
+
+# Largest number of columns in a composite key
+MAX_KEY_SIZE = 3
+
+# Columns considered for composite keys, highest cardinality first. Keeps
+# the number of combinations tried small on wide files.
+MAX_KEY_COLUMNS = 20
+
+# Rows sampled to rule out combinations before checking the whole file
+KEY_SAMPLE_ROWS = 20000
+
+# Keys found on the sample that are checked against the whole file
+MAX_VERIFIED_KEYS = 10
+
+# Multiplier used to combine per-column hashes into one hash per row
+_HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def key_columns(profile):
+    """
+    Columns that can be part of a composite key: no nulls, more than one
+    distinct value, not unique on their own (a unique column is already a
+    key, so no combination including it is minimal) and not floating point
+    (measurements make spurious keys).
+    """
+    columns = [
+        (name, column.distinct_count) for name, column in profile.columns.items()
+        if column.count
+        and not column.null_count
+        and 1 < column.distinct_count < column.count
+        and column.dtype is not None
+        and column.dtype.kind != 'f'
+    ]
+    columns.sort(key=lambda item: -item[1])
+    return [name for name, distinct in columns[:MAX_KEY_COLUMNS]]
+
+
+def _sample(reader, columns, row_count):
+    """A random sample of about KEY_SAMPLE_ROWS rows of the given columns"""
+    fraction = min(1.0, KEY_SAMPLE_ROWS / row_count)
+    parts = []
+    for index, chunk in enumerate(reader.chunks(usecols=columns)):
+        parts.append(chunk if fraction == 1.0 else chunk.sample(frac=fraction, random_state=index))
+    return pd.concat(parts, ignore_index=True)[columns] if parts else pd.DataFrame(columns=columns)
+
+
+def _combine(codes, column_codes, column_cardinality):
+    """
+    Codes for a column combination from the codes of a smaller combination
+    and one more column. Re-factorizing keeps codes below the row count.
+    """
+    combined, uniques = pd.factorize(codes * column_cardinality + column_codes)
+    return combined, len(uniques)
+
+
+def search_lattice(sample, columns, max_size=MAX_KEY_SIZE):
+    """
+    Find the minimal column combinations that are unique on a sample.
+
+    Walks the lattice of combinations level by level, as in TANE: each
+    column is replaced by integer codes once, a combination's codes are
+    built from those of one of its subsets, and a combination is only
+    tried if none of its subsets is already unique. A combination whose
+    column cardinalities multiply to fewer than the row count cannot be
+    unique, so its codes are only built if it may be extended further.
+
+    The columns are known not to be unique in the whole file, so every
+    one is combined further, even one that happens to be unique on the
+    sample: a nearly unique column is often half of a real key.
+
+    Args:
+        sample: DataFrame of sample rows
+        columns: Names of the columns to combine, none unique in the file
+        max_size: Largest combination to try
+
+    Returns:
+        List of column name tuples, smallest combinations first
+    """
+    rows = len(sample)
+    if rows < 2:
+        return []
+
+    single = {}
+    for name in columns:
+        codes, uniques = pd.factorize(sample[name])
+        single[name] = (codes.astype(np.int64), len(uniques))
+
+    keys = []
+    # Combinations of the current size that are not keys, with their codes
+    level = {(name,): single[name] for name in columns}
+
+    for size in range(2, max_size + 1):
+        # Codes are only kept for combinations that can be extended further
+        extend = size < max_size
+        next_level = {}
+        for combination, (codes, cardinality) in level.items():
+            last = columns.index(combination[-1])
+            for name in columns[last + 1:]:
+                candidate = combination + (name,)
+                # Every subset must be non-unique, or the candidate is not minimal
+                if any(subset not in level for subset in itertools.combinations(candidate, size - 1)):
+                    continue
+                column_codes, column_cardinality = single[name]
+                if cardinality * column_cardinality < rows:
+                    # Too few possible value combinations to be unique
+                    if extend:
+                        next_level[candidate] = _combine(codes, column_codes, column_cardinality)
+                    continue
+                combined = _combine(codes, column_codes, column_cardinality)
+                if combined[1] == rows:
+                    keys.append(candidate)
+                elif extend:
+                    next_level[candidate] = combined
+        level = next_level
+        if not level:
+            break
+
+    return keys
+
+
+def row_hashes(chunk, columns):
+    """One 64-bit hash per row of a chunk, combining the values of the given columns"""
+    hashes = hash_values(chunk[columns[0]])
+    for name in columns[1:]:
+        hashes = hashes * _HASH_MIX ^ hash_values(chunk[name])
+    return hashes
+
+
+def verify_keys(reader, candidates, row_count):
+    """
+    Check which candidate keys are unique across the whole file, reading
+    only the columns involved. Each row is reduced to one 64-bit hash per
+    candidate.
+
+    Returns:
+        Dictionary of column name tuple to uniqueness ratio
+    """
+    columns = sorted({name for candidate in candidates for name in candidate})
+    seen = {candidate: DistinctHashes() for candidate in candidates}
+    for chunk in reader.chunks(usecols=columns):
+        for candidate in candidates:
+            seen[candidate].add(row_hashes(chunk, list(candidate)))
+    return {candidate: len(hashes) / row_count for candidate, hashes in seen.items()}
+
+
+def find_composite_keys(reader, profile):
+    """
+    Find minimal multi-column keys for a profiled file.
+
+    Combinations are ruled out on a random sample, then the survivors are
+    checked against every row, smallest first and then those whose
+    columns have the most distinct values in the whole file. A survivor
+    with too few distinct values in the file to be unique is dropped.
+
+    Args:
+        reader: Chunk reader for the file (see ingest.CSVReader)
+        profile: TableProfile of the file
+
+    Returns:
+        List of (column names, uniqueness ratio) for each verified key
+    """
+    columns = key_columns(profile)
+    if len(columns) < 2 or profile.row_count < 2:
+        return []
+
+    sample = _sample(reader, columns, profile.row_count)
+    cardinality = {
+        candidate: np.prod([float(profile.columns[name].distinct_count) for name in candidate])
+        for candidate in search_lattice(sample, columns)
+    }
+    candidates = sorted(
+        (candidate for candidate, product in cardinality.items() if product >= profile.row_count),
+        key=lambda candidate: (len(candidate), -cardinality[candidate])
+    )[:MAX_VERIFIED_KEYS]
+    if not candidates:
+        return []
+
+    verified = verify_keys(reader, candidates, profile.row_count)
+    # Report key columns in the order they appear in the file
+    order = list(profile.columns)
+    return [
+        (sorted(candidate, key=order.index), ratio)
+        for candidate, ratio in verified.items() if ratio == 1.0
+    ]
@@ -0,0 +1,273 @@
+# schemascope/lineage.py
+from django.db import transaction
+from fuzzywuzzy import fuzz
+from .models import DataSource, Lineage, LineageColumn, SchemaChange, SchemaDefinition, ColumnFingerprint
+from .matching import normalize_column_name
+from .inclusion import fingerprint_sketch
+from .sketches import estimate_jaccard
+
+
+# Share of distinct values two columns of consecutive versions must have in
+# common before their values count as evidence of a rename
+RENAME_VALUE_SIMILARITY = 0.8
+
+# Least combined name and value score for a rename backed by values
+RENAME_THRESHOLD = 0.6
+
+# Least name similarity for a rename of a column without a fingerprint;
+# the type must not change either
+RENAME_NAME_THRESHOLD = 0.85
+
+# Change types worked out from the lineage, replaced whenever it is rebuilt
+LINEAGE_CHANGE_TYPES = ['initial', 'add_column', 'remove_column', 'rename_column', 'type_change']
+
+
+def _columns(schema):
+    """(name, type) of each column of a schema, in file order"""
+    return [(name, schema.get_column_type(name)) for name in schema.get_columns()]
+
+
+def _fingerprints(schema):
+    return {fingerprint.column_name: fingerprint for fingerprint in ColumnFingerprint.objects.filter(schema=schema)}
+
+
+def match_columns(previous, current):
+    """
+    Match the columns of a version to those of the version before it.
+
+    Columns match by exact name first, then by normalized name. The columns
+    left over are paired as renames, best score first: a column whose
+    distinct values mostly match a column of the previous version scores by
+    name and value similarity together, and one without value evidence
+    needs a near-identical name and the same type.
+
+    Args:
+        previous: SchemaDefinition of the previous version
+        current: SchemaDefinition of the new version
+
+    Returns:
+        (matches, renames) tuple: a dictionary of current column name to
+        previous column name, and the renames among them as
+        {'from', 'to', 'score'} dictionaries
+    """
+    old_columns = dict(_columns(previous))
+    new_columns = dict(_columns(current))
+
+    matches = {name: name for name in new_columns if name in old_columns}
+    normalized = {}
+    for name in old_columns:
+        if name not in new_columns:
+            normalized.setdefault(normalize_column_name(name), name)
+    for name in new_columns:
+        if name not in matches:
+            old_name = normalized.pop(normalize_column_name(name), None)
+            if old_name is not None:
+                matches[name] = old_name
+
+    unmatched_old = [name for name in old_columns if name not in matches.values()]
+    unmatched_new = [name for name in new_columns if name not in matches]
+    renames = []
+    if not unmatched_old or not unmatched_new:
+        return matches, renames
+
+    old_fingerprints = _fingerprints(previous)
+    new_fingerprints = _fingerprints(current)
+    scored = []
+    for new_name in unmatched_new:
+        for old_name in unmatched_old:
+            name_similarity = fuzz.ratio(normalize_column_name(old_name), normalize_column_name(new_name)) / 100
+            old, new = old_fingerprints.get(old_name), new_fingerprints.get(new_name)
+            if old is not None and new is not None and old.value_kind == new.value_kind:
+                value_similarity = estimate_jaccard(fingerprint_sketch(old), fingerprint_sketch(new))
+                if value_similarity >= RENAME_VALUE_SIMILARITY:
+                    score = (name_similarity + value_similarity) / 2
+                    if score >= RENAME_THRESHOLD:
+                        scored.append((score, old_name, new_name))
+                    continue
+            if name_similarity >= RENAME_NAME_THRESHOLD and old_columns[old_name] == new_columns[new_name]:
+                scored.append((name_similarity, old_name, new_name))
+
+    for score, old_name, new_name in sorted(scored, key=lambda item: -item[0]):
+        if new_name in matches or old_name in matches.values():
+            continue
+        matches[new_name] = old_name
+        renames.append({'from': old_name, 'to': new_name, 'score': round(score, 3)})
+    return matches, renames
+
+
+def _record_version(lineage, datasource, schema, previous, previous_schema, previous_keys):
+    """
+    Key a version's columns against the version before it and record the
+    changes between them.
+
+    Returns:
+        Dictionary of column name to key for the version
+    """
+    columns = _columns(schema)
+    changes = []
+    if previous_schema is None:
+        keys = {}
+        matches, renames = {}, []
+        changes.append(SchemaChange(
+            source=datasource,
+            change_type='initial',
+            details={'columns': [name for name, column_type in columns]}
+        ))
+    else:
+        matches, renames = match_columns(previous_schema, schema)
+        keys = {name: previous_keys[old_name] for name, old_name in matches.items()}
+
+    for name, column_type in columns:
+        if name not in keys:
+            keys[name] = lineage.next_column_key
+            lineage.next_column_key += 1
+
+    LineageColumn.objects.filter(schema=schema).delete()
+    LineageColumn.objects.bulk_create([
+        LineageColumn(
+            schema=schema, lineage=lineage, key=keys[name],
+            name=name, column_type=column_type or '', position=position
+        )
+        for position, (name, column_type) in enumerate(columns)
+    ])
+
+    if previous_schema is not None:
+        old_types = dict(_columns(previous_schema))
+        added = [name for name, column_type in columns if name not in matches]
+        removed = [name for name in old_types if name not in matches.values()]
+        type_changes = [
+            {'column': name, 'from': old_types[old_name], 'to': schema.get_column_type(name)}
+            for name, old_name in matches.items()
+            if old_types[old_name] != schema.get_column_type(name)
+        ]
+        for change_type, details in [
+            ('add_column', {'columns': added}),
+            ('remove_column', {'columns': removed}),
+            ('rename_column', {'renames': renames}),
+            ('type_change', {'columns': type_changes}),
+        ]:
+            if any(details.values()):
+                changes.append(SchemaChange(
+                    source=datasource,
+                    previous_version=previous,
+                    change_type=change_type,
+                    details=details
+                ))
+
+    SchemaChange.objects.filter(source=datasource, change_type__in=LINEAGE_CHANGE_TYPES).delete()
+    SchemaChange.objects.bulk_create(changes)
+    return keys
+
+
+def rebuild_lineage(lineage, start=None):
+    """
+    Put a lineage's versions in upload order and key and diff each against
+    the one before it.
+
+    Versions before the start are left as they are, so adding the newest
+    version only matches its columns against its predecessor.
+
+    Args:
+        lineage: Lineage to rebuild
+        start: Optional DataSource to rebuild from; by default every version
+            is rebuilt
+    """
+    versions = list(lineage.versions.order_by('upload_date', 'pk'))
+    schemas = SchemaDefinition.objects.in_bulk(
+        [version.pk for version in versions], field_name='data_source_id'
+    )
+    versions = [version for version in versions if version.pk in schemas]
+
+    first = 0
+    if start is not None and start in versions:
+        first = versions.index(start)
+    previous_keys = {}
+    if first:
+        previous_keys = dict(
+            LineageColumn.objects.filter(schema=schemas[versions[first - 1].pk]).values_list('name', 'key')
+        )
+        if not previous_keys:
+            # Earlier versions were never keyed, so start from the first
+            first = 0
+    if first == 0:
+        lineage.next_column_key = 1
+
+    for position, version in enumerate(versions):
+        if version.lineage_position != position:
+            DataSource.objects.filter(pk=version.pk).update(lineage_position=position)
+            version.lineage_position = position
+        if position < first:
+            continue
+        previous = versions[position - 1] if position else None
+        previous_keys = _record_version(
+            lineage, version, schemas[version.pk],
+            previous, schemas[previous.pk] if previous else None, previous_keys
+        )
+    lineage.save(update_fields=['next_column_key'])
+
+
+def record_lineage(datasource):
+    """
+    Add a profiled data source to the lineage of its canonical name,
+    keying its columns and recording how its schema differs from the
+    version before it.
+
+    A source is normally the newest version, so only it is matched; one
+    older than the newest (a retry of an earlier upload) has the versions
+    after it matched again too.
+
+    Args:
+        datasource: DataSource whose schema has been saved
+    """
+    with transaction.atomic():
+        lineage, created = Lineage.objects.select_for_update().get_or_create(
+            user_id=datasource.user_id,
+            canonical_name=datasource.canonical_name,
+            source_type=datasource.source_type
+        )
+        if datasource.lineage_id != lineage.pk:
+            datasource.lineage = lineage
+            DataSource.objects.filter(pk=datasource.pk).update(lineage=lineage)
+        rebuild_lineage(lineage, start=datasource)
+
+
+def diff_versions(schema_a, schema_b):
+    """
+    Compare two versions of a lineage through their column keys, without
+    going through the versions between them.
+
+    Args:
+        schema_a: SchemaDefinition of the earlier version
+        schema_b: SchemaDefinition of the later version
+
+    Returns:
+        Dictionary with 'added' and 'removed' column names, 'renamed'
+        {'from', 'to'} and 'type_changes' {'column', 'from', 'to'}
+        dictionaries, and 'common' column names (under the later name),
+        or None if the schemas are not keyed in the same lineage
+    """
+    columns_a = {column.key: column for column in schema_a.lineage_columns.all()}
+    columns_b = {column.key: column for column in schema_b.lineage_columns.all()}
+    if not columns_a or not columns_b:
+        return None
+    if next(iter(columns_a.values())).lineage_id != next(iter(columns_b.values())).lineage_id:
+        return None
+
+    ordered_b = sorted(columns_b.values(), key=lambda column: column.position)
+    common = [column for column in ordered_b if column.key in columns_a]
+    return {
+        'added': [column.name for column in ordered_b if column.key not in columns_a],
+        'removed': [
+            column.name for column in sorted(columns_a.values(), key=lambda column: column.position)
+            if column.key not in columns_b
+        ],
+        'renamed': [
+            {'from': columns_a[column.key].name, 'to': column.name}
+            for column in common if columns_a[column.key].name != column.name
+        ],
+        'type_changes': [
+            {'column': column.name, 'from': columns_a[column.key].column_type, 'to': column.column_type}
+            for column in common if columns_a[column.key].column_type != column.column_type
+        ],
+        'common': [column.name for column in common],
+    }
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from schemascope.models import DataSource, Lineage
+from schemascope.lineage import rebuild_lineage
+
+class Command(BaseCommand):
+    help = 'Group data sources into version lineages and recompute the column keys and changes between versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild lineages for this username (default: all users)'
+        )
+
+    def handle(self, *args, **options):
+        sources = DataSource.objects.filter(schema__isnull=False)
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            sources = sources.filter(user=user)
+
+        lineages = {}
+        with transaction.atomic():
+            for datasource in sources.only('id', 'user_id', 'canonical_name', 'source_type', 'lineage_id'):
+                group = (datasource.user_id, datasource.canonical_name, datasource.source_type)
+                if group not in lineages:
+                    lineages[group], created = Lineage.objects.get_or_create(
+                        user_id=datasource.user_id,
+                        canonical_name=datasource.canonical_name,
+                        source_type=datasource.source_type
+                    )
+                if datasource.lineage_id != lineages[group].pk:
+                    DataSource.objects.filter(pk=datasource.pk).update(lineage=lineages[group])
+
+            for lineage in lineages.values():
+                rebuild_lineage(lineage)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(lineages)} lineages'))
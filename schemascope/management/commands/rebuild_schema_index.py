@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from schemascope.models import SchemaDefinition
+from schemascope.matching import index_schema
+
+class Command(BaseCommand):
+    help = 'Rebuild the column, LSH band and filename indexes used to find related schemas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild entries for this username (default: all users)'
+        )
+
+    def handle(self, *args, **options):
+        schemas = SchemaDefinition.objects.select_related('data_source')
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            schemas = schemas.filter(data_source__user=user)
+
+        indexed = 0
+        for schema in schemas.iterator(chunk_size=500):
+            index_schema(schema)
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} schemas'))
@@ -0,0 +1,148 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from schemascope.models import IngestJob
+from schemascope.jobs import HEARTBEAT_INTERVAL, claim_next_job, release_job, requeue_stale_jobs, run_job
+from schemascope.worker import setup_worker
+
+
+class Command(BaseCommand):
+    help = 'Process queued schemascope ingest jobs using a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=2,
+            help='Number of jobs to run at once (default: 2)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between checks of an empty queue (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1')
+
+        # Spawned rather than forked processes, so no database connection is
+        # shared between the pool and this process
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=setup_worker)
+        # Future of each job being run, to its (job id, attempt)
+        self.running = {}
+        # The pool's processes by pid, kept to read their exit codes once
+        # the pool has broken
+        self.workers = {}
+        next_stale_check = 0
+
+        try:
+            while True:
+                if time.monotonic() >= next_stale_check:
+                    requeued = requeue_stale_jobs()
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f'Re-queued {requeued} stale jobs'))
+                    next_stale_check = time.monotonic() + HEARTBEAT_INTERVAL
+
+                while len(self.running) < processes:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    try:
+                        future = pool.submit(run_job, job.pk, job.attempts)
+                    except BrokenProcessPool:
+                        release_job(job.pk, job.attempts)
+                        pool = self.restart_pool(pool, processes, context)
+                        continue
+                    self.stdout.write(f'Starting job {job.pk} for {job.data_source}')
+                    self.running[future] = (job.pk, job.attempts)
+                    self.workers.update((process.pid, process) for process in multiprocessing.active_children())
+
+                if not self.running:
+                    if options['once']:
+                        break
+                    connections.close_all()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(self.running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    pool = self.restart_pool(pool, processes, context)
+                    continue
+                for future in done:
+                    self.report(future)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; waiting for running jobs to finish')
+        finally:
+            pool.shutdown(wait=True)
+
+    def report(self, future):
+        """Record and print the outcome of a finished job"""
+        job_id, attempt = self.running.pop(future)
+        try:
+            status = future.result()
+        except Exception as e:
+            # The job could not be handed to or back from its process
+            IngestJob.objects.filter(pk=job_id, status='running', attempts=attempt).update(
+                status='failed', error=f'Worker crashed: {e}', finished_date=timezone.now()
+            )
+            self.stderr.write(f'Job {job_id} crashed: {e}')
+            return
+        if status is None:
+            self.stdout.write(self.style.WARNING(f'Job {job_id} was re-queued while running; outcome discarded'))
+            return
+        style = self.style.SUCCESS if status == 'succeeded' else self.style.ERROR
+        self.stdout.write(style(f'Job {job_id} {status}'))
+
+    def restart_pool(self, pool, processes, context):
+        """
+        Replace a pool broken by one of its processes dying, e.g. when
+        killed for running out of memory.
+
+        A broken pool terminates its other processes and fails every job it
+        was running. Only the job whose process died by itself is marked
+        failed; the jobs that were interrupted are queued again.
+
+        Returns:
+            The new pool
+        """
+        # The pool fails its futures together; wait for the last of them
+        wait(self.running)
+        pool.shutdown(wait=True)
+
+        broken = [future for future in self.running if isinstance(future.exception(), BrokenProcessPool)]
+        for future in list(self.running):
+            if future not in broken:
+                self.report(future)
+        pids = dict(IngestJob.objects.filter(pk__in=[self.running[future][0] for future in broken])
+                    .values_list('pk', 'worker_pid'))
+        for future in broken:
+            job_id, attempt = self.running.pop(future)
+            process = self.workers.get(pids.get(job_id))
+            exitcode = process.exitcode if process is not None else None
+            # The pool ends its other processes with SIGTERM
+            if exitcode is not None and exitcode != -signal.SIGTERM:
+                IngestJob.objects.filter(pk=job_id, status='running', attempts=attempt).update(
+                    status='failed', error=f'Worker crashed: its process exited with code {exitcode}',
+                    finished_date=timezone.now()
+                )
+                self.stderr.write(f'Job {job_id} crashed: its process exited with code {exitcode}')
+            elif release_job(job_id, attempt):
+                self.stdout.write(self.style.WARNING(f'Job {job_id} interrupted; re-queued'))
+
+        self.workers = {}
+        self.stderr.write('Worker pool broke; starting a new one')
+        return ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=setup_worker)
@@ -0,0 +1,228 @@
+# schemascope/matching.py
+import hashlib
+import math
+import re
+from collections import defaultdict
+import numpy as np
+from django.db.models import Count, Q
+from fuzzywuzzy import fuzz
+from .models import SchemaDefinition, SchemaRelationship, SchemaColumn, SchemaBand, FilenameTrigram
+
+
+# Weights and thresholds for scoring a pair of schemas
+NAME_WEIGHT = 0.4
+SCHEMA_WEIGHT = 0.6
+RELATED_THRESHOLD = 0.5
+VERSION_THRESHOLD = 0.8
+
+# A pair can only pass RELATED_THRESHOLD if this share of the larger schema's
+# columns are shared, even with identical filenames
+MIN_SCHEMA_SIMILARITY = (RELATED_THRESHOLD - NAME_WEIGHT) / SCHEMA_WEIGHT
+
+# MinHash signature length, split into LSH bands of BAND_ROWS values. Two
+# column sets share a band with probability 1 - (1 - J^4)^16 for Jaccard
+# similarity J: about 0.65 at J = 0.5 and over 0.99 at J = 0.8.
+SIGNATURE_SIZE = 64
+BAND_ROWS = 4
+
+# Filenames sharing at least this share of trigrams are candidates
+TRIGRAM_OVERLAP = 0.5
+
+# Most candidates taken from each index before exact scoring
+MAX_CANDIDATES = 200
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_PERMUTATIONS = np.random.default_rng(20240410).integers(1, (1 << 31) - 1, size=(2, SIGNATURE_SIZE), dtype=np.uint64)
+
+
+def normalize_column_name(name):
+    """Lowercase a column name and reduce punctuation and spacing to single underscores"""
+    return re.sub(r'[^0-9a-z]+', '_', str(name).lower()).strip('_')
+
+
+def _stable_hash(text, signed=False):
+    # Python's hash() changes between processes; stored hashes must not
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=signed)
+
+
+def minhash_signature(names):
+    """
+    MinHash signature of a set of normalized column names.
+
+    Returns:
+        numpy uint64 array of SIGNATURE_SIZE minimum hash values
+    """
+    values = np.array([_stable_hash(name) for name in names], dtype=np.uint64) % _MERSENNE_PRIME
+    a, b = _PERMUTATIONS
+    # (a * x + b) mod p for every permutation and value; fits in 64 bits
+    # because every term is below 2^31
+    permuted = (np.outer(a, values) + b[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def lsh_buckets(signature):
+    """One bucket hash per LSH band of a MinHash signature"""
+    return [
+        _stable_hash(','.join(str(value) for value in signature[start:start + BAND_ROWS]), signed=True)
+        for start in range(0, len(signature), BAND_ROWS)
+    ]
+
+
+def filename_trigrams(filename):
+    """The distinct three-character sequences of a lowercased filename"""
+    name = f'  {filename.lower()} '
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def index_schema(schema):
+    """
+    Add a schema's columns, LSH bands and filename trigrams to the
+    relationship indexes, replacing any existing entries.
+
+    Args:
+        schema: SchemaDefinition with its data_source
+    """
+    datasource = schema.data_source
+    user_id = datasource.user_id
+
+    SchemaColumn.objects.filter(schema=schema).delete()
+    SchemaBand.objects.filter(schema=schema).delete()
+    FilenameTrigram.objects.filter(data_source=datasource).delete()
+
+    names = schema.get_columns()
+    SchemaColumn.objects.bulk_create([
+        SchemaColumn(
+            schema=schema, user_id=user_id, position=position,
+            name=name, normalized_name=normalize_column_name(name),
+            column_type=schema.get_column_type(name) or ''
+        )
+        for position, name in enumerate(names)
+    ])
+
+    normalized = {normalize_column_name(name) for name in names}
+    if normalized:
+        SchemaBand.objects.bulk_create([
+            SchemaBand(schema=schema, user_id=user_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(lsh_buckets(minhash_signature(sorted(normalized))))
+        ])
+
+    FilenameTrigram.objects.bulk_create([
+        FilenameTrigram(data_source=datasource, user_id=user_id, trigram=trigram)
+        for trigram in filename_trigrams(datasource.original_filename)
+    ])
+
+
+def find_candidate_schemas(schema):
+    """
+    Find the schemas that could be related to a schema, using the indexes
+    rather than scanning every data source. Only the same user's schemas
+    are considered.
+
+    Candidates come from three indexes, each an indexed lookup:
+    schemas sharing enough normalized column names to pass the similarity
+    threshold, schemas sharing an LSH band (similar column sets), and
+    data sources whose filenames share most of their trigrams.
+
+    Returns:
+        Set of candidate SchemaDefinition ids
+    """
+    datasource = schema.data_source
+    user_id = datasource.user_id
+    names = {normalize_column_name(name) for name in schema.get_columns()}
+    candidates = set()
+
+    if names:
+        # Shared columns over the larger column count must exceed
+        # MIN_SCHEMA_SIMILARITY, so at least this many must be shared
+        min_shared = max(1, math.floor(len(names) * MIN_SCHEMA_SIMILARITY) + 1)
+        candidates.update(
+            SchemaColumn.objects.filter(user_id=user_id, normalized_name__in=names)
+            .exclude(schema=schema)
+            .values('schema_id')
+            .annotate(shared=Count('normalized_name', distinct=True))
+            .filter(shared__gte=min_shared)
+            .order_by('-shared')
+            .values_list('schema_id', flat=True)[:MAX_CANDIDATES]
+        )
+
+    buckets = Q()
+    for band, bucket in SchemaBand.objects.filter(schema=schema).values_list('band', 'bucket'):
+        buckets |= Q(band=band, bucket=bucket)
+    if buckets:
+        candidates.update(
+            SchemaBand.objects.filter(buckets, user_id=user_id)
+            .exclude(schema=schema)
+            .values_list('schema_id', flat=True)
+            .distinct()[:MAX_CANDIDATES]
+        )
+
+    trigrams = filename_trigrams(datasource.original_filename)
+    similar_names = (
+        FilenameTrigram.objects.filter(user_id=user_id, trigram__in=trigrams)
+        .exclude(data_source=datasource)
+        .values('data_source_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=math.ceil(len(trigrams) * TRIGRAM_OVERLAP))
+        .order_by('-shared')
+        .values_list('data_source_id', flat=True)[:MAX_CANDIDATES]
+    )
+    candidates.update(
+        SchemaDefinition.objects.filter(data_source_id__in=list(similar_names)).values_list('id', flat=True)
+    )
+
+    return candidates
+
+
+def find_related_sources(datasource):
+    """
+    Find potentially related sources based on filename similarity and schema.
+
+    Candidates are found through the relationship indexes; each is then
+    scored exactly: filename similarity weighted 0.4 and the share of
+    columns in common weighted 0.6. Changes between versions are recorded
+    by the lineage (see lineage.record_lineage), not here.
+    """
+    new_schema = SchemaDefinition.objects.get(data_source=datasource)
+    new_columns = set(new_schema.get_columns())
+
+    candidate_ids = find_candidate_schemas(new_schema)
+    if not candidate_ids:
+        return
+
+    existing_columns = defaultdict(set)
+    for schema_id, name in SchemaColumn.objects.filter(schema_id__in=candidate_ids).values_list('schema_id', 'name'):
+        existing_columns[schema_id].add(name)
+
+    relationships = []
+    candidates = SchemaDefinition.objects.filter(pk__in=candidate_ids).select_related('data_source').only(
+        'id', 'data_source__id', 'data_source__original_filename', 'data_source__upload_date'
+    )
+    for existing_schema in candidates:
+        existing = existing_schema.data_source
+        columns = existing_columns[existing_schema.pk]
+
+        # Calculate name similarity
+        name_similarity = fuzz.ratio(datasource.original_filename, existing.original_filename) / 100
+
+        # Calculate schema similarity
+        common_columns = new_columns.intersection(columns)
+        schema_similarity = len(common_columns) / max(len(new_columns), len(columns), 1)
+
+        # Overall similarity is a weighted combination
+        similarity = (name_similarity * NAME_WEIGHT) + (schema_similarity * SCHEMA_WEIGHT)
+        if similarity <= RELATED_THRESHOLD:
+            continue
+
+        relationship_type = 'version' if similarity > VERSION_THRESHOLD else 'related'
+
+        relationships.append(SchemaRelationship(
+            source_schema=existing_schema,
+            target_schema=new_schema,
+            relationship_type=relationship_type,
+            source_columns=list(common_columns),
+            target_columns=list(common_columns),
+            similarity_score=similarity
+        ))
+
+    SchemaRelationship.objects.bulk_create(relationships)
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0003_ingest_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompositeKeyCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column_names', models.JSONField()),
+                ('uniqueness_ratio', models.FloatField()),
+                ('is_confirmed', models.BooleanField(default=False)),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='composite_keys', to='schemascope.schemadefinition')),
+            ],
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_relationship_index(apps, schema_editor):
+    """
+    Index the existing schemas. New schemas are indexed by
+    schemascope.ingest from then on.
+    """
+    from schemascope.matching import normalize_column_name, minhash_signature, lsh_buckets, filename_trigrams
+
+    SchemaDefinition = apps.get_model('schemascope', 'SchemaDefinition')
+    SchemaColumn = apps.get_model('schemascope', 'SchemaColumn')
+    SchemaBand = apps.get_model('schemascope', 'SchemaBand')
+    FilenameTrigram = apps.get_model('schemascope', 'FilenameTrigram')
+
+    schemas = SchemaDefinition.objects.select_related('data_source').only(
+        'id', 'column_definitions', 'data_source__id', 'data_source__user_id', 'data_source__original_filename'
+    )
+    for schema in schemas.iterator(chunk_size=500):
+        datasource = schema.data_source
+        names = list(schema.column_definitions.keys())
+        SchemaColumn.objects.bulk_create([
+            SchemaColumn(
+                schema_id=schema.id, user_id=datasource.user_id, position=position,
+                name=name, normalized_name=normalize_column_name(name)
+            )
+            for position, name in enumerate(names)
+        ])
+        normalized = sorted({normalize_column_name(name) for name in names})
+        if normalized:
+            SchemaBand.objects.bulk_create([
+                SchemaBand(schema_id=schema.id, user_id=datasource.user_id, band=band, bucket=bucket)
+                for band, bucket in enumerate(lsh_buckets(minhash_signature(normalized)))
+            ])
+        FilenameTrigram.objects.bulk_create([
+            FilenameTrigram(data_source_id=datasource.id, user_id=datasource.user_id, trigram=trigram)
+            for trigram in filename_trigrams(datasource.original_filename)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schemascope', '0004_composite_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaColumn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('normalized_name', models.CharField(max_length=255)),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indexed_columns', to='schemascope.schemadefinition')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'normalized_name'], name='schemascope_user_id_247394_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SchemaBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='schemascope.schemadefinition')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'band', 'bucket'], name='schemascope_user_id_a56820_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FilenameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('data_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filename_trigrams', to='schemascope.datasource')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'trigram'], name='schemascope_user_id_e5cbf3_idx')],
+            },
+        ),
+        migrations.RunPython(build_relationship_index, migrations.RunPython.noop),
+    ]
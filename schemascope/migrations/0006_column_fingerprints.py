@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schemascope', '0005_relationship_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemarelationship',
+            name='containment_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='schemarelationship',
+            name='relationship_type',
+            field=models.CharField(choices=[('version', 'Version Change'), ('related', 'Related Data'), ('derived', 'Derived Data'), ('foreign_key', 'Foreign Key'), ('other', 'Other Relationship')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='ColumnFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column_name', models.CharField(max_length=255)),
+                ('value_kind', models.CharField(max_length=10)),
+                ('distinct_count', models.BigIntegerField()),
+                ('is_unique', models.BooleanField(default=False)),
+                ('hashes', models.BinaryField()),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='schemascope.schemadefinition')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'is_unique', 'value_kind'], name='schemascope_user_id_b0e303_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0006_column_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0007_datasource_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='content_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='schemachange',
+            name='change_type',
+            field=models.CharField(choices=[('initial', 'Initial Version'), ('add_column', 'Add Column'), ('remove_column', 'Remove Column'), ('rename_column', 'Rename Column'), ('type_change', 'Column Type Change'), ('append_rows', 'Rows Appended'), ('other', 'Other Change')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='SchemaProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('options', models.JSONField()),
+                ('state', models.JSONField()),
+                ('schema', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to='schemascope.schemadefinition')),
+            ],
+        ),
+    ]
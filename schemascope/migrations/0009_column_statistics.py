@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0008_content_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column_name', models.CharField(max_length=255)),
+                ('position', models.IntegerField()),
+                ('null_count', models.BigIntegerField()),
+                ('null_ratio', models.FloatField()),
+                ('distinct_count', models.BigIntegerField()),
+                ('min_value', models.JSONField(blank=True, null=True)),
+                ('max_value', models.JSONField(blank=True, null=True)),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('std', models.FloatField(blank=True, null=True)),
+                ('quantiles', models.JSONField(blank=True, null=True)),
+                ('histogram', models.JSONField(blank=True, null=True)),
+                ('top_values', models.JSONField(blank=True, default=list)),
+                ('min_length', models.IntegerField(blank=True, null=True)),
+                ('max_length', models.IntegerField(blank=True, null=True)),
+                ('mean_length', models.FloatField(blank=True, null=True)),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='schemascope.schemadefinition')),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0009_column_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnstatistics',
+            name='null_ratio_high',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='columnstatistics',
+            name='null_ratio_low',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='columnstatistics',
+            name='uniqueness_high',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='columnstatistics',
+            name='uniqueness_low',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='schemadefinition',
+            name='profile_mode',
+            field=models.CharField(choices=[('full', 'Every Row'), ('sample', 'Sampled Rows')], default='full', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='schemadefinition',
+            name='sample_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='schemadefinition',
+            name='sample_verified',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schemascope', '0010_sample_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lineage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canonical_name', models.CharField(max_length=255)),
+                ('source_type', models.CharField(max_length=20)),
+                ('next_column_key', models.IntegerField(default=1)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='lineage_position',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='lineage',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='versions', to='schemascope.lineage'),
+        ),
+        migrations.CreateModel(
+            name='LineageColumn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.IntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('column_type', models.CharField(max_length=50)),
+                ('position', models.IntegerField()),
+                ('lineage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='columns', to='schemascope.lineage')),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineage_columns', to='schemascope.schemadefinition')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lineage', 'key'], name='schemascope_lineage_1f614b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lineage',
+            constraint=models.UniqueConstraint(fields=('user', 'canonical_name', 'source_type'), name='unique_lineage'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+def fill_column_types(apps, schema_editor):
+    """
+    Copy each indexed column's type from its schema. New schemas are
+    indexed with types by schemascope.ingest from then on.
+    """
+    SchemaDefinition = apps.get_model('schemascope', 'SchemaDefinition')
+    SchemaColumn = apps.get_model('schemascope', 'SchemaColumn')
+
+    for schema in SchemaDefinition.objects.only('id', 'column_definitions').iterator(chunk_size=500):
+        columns = list(SchemaColumn.objects.filter(schema_id=schema.id))
+        for column in columns:
+            column.column_type = (schema.column_definitions.get(column.name) or {}).get('type') or ''
+        SchemaColumn.objects.bulk_update(columns, ['column_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0011_lineage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemacolumn',
+            name='column_type',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='schemacolumn',
+            index=models.Index(fields=['user', 'column_type'], name='schemascope_user_id_150e26_idx'),
+        ),
+        migrations.RunPython(fill_column_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0012_catalog_column_types'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestjob',
+            name='stage',
+            field=models.CharField(blank=True, choices=[('parse', 'Parsing File'), ('profile', 'Profiling Columns'), ('pk_detection', 'Detecting Primary Keys'), ('relationships', 'Discovering Relationships'), ('validation', 'Checking Data Quality')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='QualityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column_name', models.CharField(max_length=255)),
+                ('rule_type', models.CharField(choices=[('not_null', 'Not Null'), ('unique', 'Unique'), ('pattern', 'Matches Pattern'), ('range', 'Within Range'), ('allowed_values', 'Allowed Values'), ('reference', 'References Column')], max_length=20)),
+                ('parameters', models.JSONField(blank=True, default=dict)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('reference_source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='schemascope.datasource')),
+                ('schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quality_rules', to='schemascope.schemadefinition')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QualityResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluated_date', models.DateTimeField(auto_now=True)),
+                ('method', models.CharField(choices=[('scan', 'Every Row Checked'), ('incremental', 'Appended Rows Checked'), ('statistics', 'From Column Statistics')], default='scan', max_length=20)),
+                ('rows_checked', models.BigIntegerField(default=0)),
+                ('failed_count', models.BigIntegerField(default=0)),
+                ('violations', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('rule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='schemascope.qualityrule')),
+            ],
+        ),
+    ]
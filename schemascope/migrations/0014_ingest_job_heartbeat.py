@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemascope', '0013_quality_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='worker_pid',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -18,6 +18,11 @@ class DataSource(models.Model):
         ('other', 'Other')
     ], default='csv')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='data_sources', null=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the file
+    content_size = models.BigIntegerField(null=True, blank=True)  # Bytes in the file
+    # Version history this source belongs to, and its place in it; set at ingest
+    lineage = models.ForeignKey('Lineage', on_delete=models.SET_NULL, null=True, blank=True, related_name='versions')
+    lineage_position = models.IntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.canonical_name} v{self.schema_version} ({self.original_filename})"
@@ -30,6 +35,12 @@ class SchemaDefinition(models.Model):
     detected_date = models.DateTimeField(auto_now_add=True)
     column_definitions = models.JSONField()  # Stores column names, types, etc.
     row_count = models.IntegerField(default=0)
+    profile_mode = models.CharField(max_length=10, choices=[
+        ('full', 'Every Row'),
+        ('sample', 'Sampled Rows')
+    ], default='full')
+    sample_size = models.IntegerField(null=True, blank=True)  # Rows profiled, in sample mode
+    sample_verified = models.BooleanField(default=False)  # Null counts and keys checked against every row
 
     def __str__(self):
         return f"Schema for {self.data_source}"
@@ -54,6 +65,18 @@ class PrimaryKeyCandidate(models.Model):
     def __str__(self):
         return f"{self.column_name} ({self.uniqueness_ratio*100:.1f}% unique)"
 
+class CompositeKeyCandidate(models.Model):
+    """
+    Stores combinations of columns that together uniquely identify rows in a schema.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='composite_keys')
+    column_names = models.JSONField()  # Columns in the key, in file order
+    uniqueness_ratio = models.FloatField()  # 1.0 means completely unique
+    is_confirmed = models.BooleanField(default=False)  # User confirmed this is a PK
+
+    def __str__(self):
+        return f"({', '.join(self.column_names)}) ({self.uniqueness_ratio*100:.1f}% unique)"
+
 class SchemaChange(models.Model):
     """
     Records changes between schema versions.
@@ -67,6 +90,7 @@ class SchemaChange(models.Model):
         ('remove_column', 'Remove Column'),
         ('rename_column', 'Rename Column'),
         ('type_change', 'Column Type Change'),
+        ('append_rows', 'Rows Appended'),
         ('other', 'Other Change')
     ])
     details = models.JSONField()  # Details about what changed
@@ -86,11 +110,326 @@ class SchemaRelationship(models.Model):
         ('version', 'Version Change'),
         ('related', 'Related Data'),
         ('derived', 'Derived Data'),
+        ('foreign_key', 'Foreign Key'),
         ('other', 'Other Relationship')
     ])
     source_columns = models.JSONField(null=True, blank=True)  # Columns in source involved in relationship
     target_columns = models.JSONField(null=True, blank=True)  # Columns in target involved in relationship
     similarity_score = models.FloatField(default=0.0)  # How similar are the schemas (0.0-1.0)
+    # For foreign keys, the estimated share of source column values found in the target column
+    containment_ratio = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source_schema} -> {self.target_schema} ({self.relationship_type})"
+
+class IngestJob(models.Model):
+    """
+    A queued run of schema detection for a data source, processed by the
+    run_ingest_worker management command.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    # In the order they run
+    STAGE_CHOICES = [
+        ('parse', 'Parsing File'),
+        ('profile', 'Profiling Columns'),
+        ('pk_detection', 'Detecting Primary Keys'),
+        ('relationships', 'Discovering Relationships'),
+        ('validation', 'Checking Data Quality'),
+    ]
+
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name='ingest_jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ingest_jobs', null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, blank=True)
+    options = models.JSONField(default=dict, blank=True)  # file_type, delimiter, encoding, sheet_name
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_date = models.DateTimeField(null=True, blank=True)
+    heartbeat_date = models.DateTimeField(null=True, blank=True)  # Touched while the job runs
+    worker_pid = models.IntegerField(null=True, blank=True)  # Process running the job
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_date']),
+        ]
+
+    def __str__(self):
+        return f"Ingest job {self.pk} for {self.data_source} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    @property
+    def is_validation(self):
+        """Whether the job only checks quality rules, without profiling"""
+        return bool(self.options.get('validate_only'))
+
+    def get_stages(self):
+        """Returns the stages with whether each is done, running or pending"""
+        choices = self.STAGE_CHOICES[-1:] if self.is_validation else self.STAGE_CHOICES
+        keys = [key for key, label in choices]
+        current = keys.index(self.stage) if self.stage in keys else -1
+        stages = []
+        for index, (key, label) in enumerate(choices):
+            if self.status == 'succeeded' or index < current:
+                state = 'done'
+            elif index == current:
+                state = 'failed' if self.status == 'failed' else 'running'
+            else:
+                state = 'pending'
+            stages.append({'key': key, 'label': label, 'state': state})
+        return stages
+
+
+class SchemaColumn(models.Model):
+    """
+    One column of a schema, indexed by normalized name and type for finding
+    schemas that share columns and for searching the catalog.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='indexed_columns')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True)  # Owner of the data source
+    position = models.IntegerField()
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255)  # Lowercase, punctuation as underscores
+    column_type = models.CharField(max_length=50, blank=True)  # As detected, e.g. 'int64'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'normalized_name']),
+            models.Index(fields=['user', 'column_type']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} in {self.schema}"
+
+
+class SchemaBand(models.Model):
+    """
+    One locality-sensitive hashing band of a schema's column-set MinHash
+    signature. Schemas with similar column sets tend to share a bucket.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='bands')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True)
+    band = models.SmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'band', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"Band {self.band} of {self.schema}"
+
+
+class FilenameTrigram(models.Model):
+    """
+    A three-character sequence of a data source's filename, for finding
+    sources with similar names.
+    """
+    data_source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name='filename_trigrams')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'trigram']),
+        ]
+
+    def __str__(self):
+        return f"'{self.trigram}' in {self.data_source.original_filename}"
+
+
+class ColumnFingerprint(models.Model):
+    """
+    A compact sample of one column's values, kept so columns of different
+    data sources can be compared without reading their files again.
+
+    The sample is the column's K-minimum-values sketch: the smallest
+    64-bit hashes of its distinct values, stored sorted as raw bytes.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='fingerprints')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True)
+    column_name = models.CharField(max_length=255)
+    value_kind = models.CharField(max_length=10)  # 'number' or 'text'; values of different kinds never match
+    distinct_count = models.BigIntegerField()
+    is_unique = models.BooleanField(default=False)  # Every row has a distinct, non-null value
+    hashes = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_unique', 'value_kind']),
+        ]
 
     def __str__(self):
-        return f"{self.source_schema} -> {self.target_schema} ({self.relationship_type})"
\ No newline at end of file
+        return f"Fingerprint of {self.column_name} in {self.schema}"
+
+
+class SchemaProfile(models.Model):
+    """
+    The profiler state a schema was built from, so identical or appended
+    files need not be profiled again from the start.
+    """
+    schema = models.OneToOneField(SchemaDefinition, on_delete=models.CASCADE, related_name='profile')
+    content_hash = models.CharField(max_length=64, db_index=True)  # Of the file that was profiled
+    options = models.JSONField()  # Parse options the file was read with
+    state = models.JSONField()  # See profiling.TableProfile.to_state
+
+    def __str__(self):
+        return f"Profile of {self.schema}"
+
+
+class ColumnStatistics(models.Model):
+    """
+    A summary of one column's values, computed while the file was profiled
+    so it can be shown without reading the file again.
+
+    Quantiles and the histogram are estimated from a sample of the values
+    once a column has more than a few thousand; counts of frequent values
+    are lower bounds. For a schema profiled in sample mode, every figure
+    is of the sampled rows unless a verification pass made it exact.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='statistics')
+    column_name = models.CharField(max_length=255)
+    position = models.IntegerField()
+    null_count = models.BigIntegerField()
+    null_ratio = models.FloatField()
+    distinct_count = models.BigIntegerField()
+    # 95% confidence intervals, for schemas profiled from a sample of rows
+    null_ratio_low = models.FloatField(null=True, blank=True)
+    null_ratio_high = models.FloatField(null=True, blank=True)
+    uniqueness_low = models.FloatField(null=True, blank=True)
+    uniqueness_high = models.FloatField(null=True, blank=True)
+    min_value = models.JSONField(null=True, blank=True)
+    max_value = models.JSONField(null=True, blank=True)
+    mean = models.FloatField(null=True, blank=True)  # Numbers only
+    std = models.FloatField(null=True, blank=True)
+    quantiles = models.JSONField(null=True, blank=True)  # {'p5': ..., 'p50': ..., 'p95': ...} for numbers and dates
+    histogram = models.JSONField(null=True, blank=True)  # Equi-depth buckets: [{'low', 'high', 'count'}]
+    top_values = models.JSONField(default=list, blank=True)  # [[value, count], ...], most frequent first
+    min_length = models.IntegerField(null=True, blank=True)  # Of text values
+    max_length = models.IntegerField(null=True, blank=True)
+    mean_length = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Statistics of {self.column_name} in {self.schema}"
+
+    def histogram_bars(self):
+        """Returns the histogram buckets with their height as a percentage of the tallest"""
+        if not self.histogram:
+            return []
+        tallest = max(bucket['count'] for bucket in self.histogram) or 1
+        return [dict(bucket, height=round(bucket['count'] * 100 / tallest)) for bucket in self.histogram]
+
+
+class Lineage(models.Model):
+    """
+    The version history of one kind of data: a user's data sources with the
+    same canonical name and source type, in upload order.
+
+    Columns are identified by keys that stay the same across versions, so
+    a renamed column keeps its key and any two versions can be compared
+    without going through the versions in between.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lineages', null=True)
+    canonical_name = models.CharField(max_length=255)
+    source_type = models.CharField(max_length=20)
+    next_column_key = models.IntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'canonical_name', 'source_type'], name='unique_lineage'),
+        ]
+
+    def __str__(self):
+        return f"Lineage of {self.canonical_name} ({self.source_type})"
+
+
+class LineageColumn(models.Model):
+    """
+    A column of one version in a lineage, under its lineage-wide key.
+    """
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='lineage_columns')
+    lineage = models.ForeignKey(Lineage, on_delete=models.CASCADE, related_name='columns')
+    key = models.IntegerField()  # Same for the column in every version, whatever it is called
+    name = models.CharField(max_length=255)
+    column_type = models.CharField(max_length=50)
+    position = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lineage', 'key']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (#{self.key}) in {self.schema}"
+
+
+class QualityRule(models.Model):
+    """
+    A data quality check on one column of a schema. Rules are carried to
+    each new version of the schema's lineage, following renamed columns.
+    """
+    RULE_TYPES = [
+        ('not_null', 'Not Null'),
+        ('unique', 'Unique'),
+        ('pattern', 'Matches Pattern'),
+        ('range', 'Within Range'),
+        ('allowed_values', 'Allowed Values'),
+        ('reference', 'References Column'),
+    ]
+
+    schema = models.ForeignKey(SchemaDefinition, on_delete=models.CASCADE, related_name='quality_rules')
+    column_name = models.CharField(max_length=255)
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPES)
+    # 'pattern' for pattern, 'min' and/or 'max' for range, 'values' for
+    # allowed_values and 'column' (of the referenced source) for reference
+    parameters = models.JSONField(default=dict, blank=True)
+    reference_source = models.ForeignKey(DataSource, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_rule_type_display()} on {self.column_name}"
+
+    def definition(self):
+        """What the rule checks, for telling whether two rules are the same check"""
+        return (self.column_name, self.rule_type, json.dumps(self.parameters, sort_keys=True), self.reference_source_id)
+
+
+class QualityResult(models.Model):
+    """
+    The outcome of the last evaluation of a quality rule: how many rows
+    failed, and a few of them.
+    """
+    rule = models.OneToOneField(QualityRule, on_delete=models.CASCADE, related_name='result')
+    evaluated_date = models.DateTimeField(auto_now=True)
+    method = models.CharField(max_length=20, choices=[
+        ('scan', 'Every Row Checked'),
+        ('incremental', 'Appended Rows Checked'),
+        ('statistics', 'From Column Statistics'),
+    ], default='scan')
+    rows_checked = models.BigIntegerField(default=0)
+    failed_count = models.BigIntegerField(default=0)
+    violations = models.JSONField(default=list, blank=True)  # First failing rows, as {'row', 'value'}
+    error = models.TextField(blank=True)  # Why the rule could not be evaluated
+
+    def __str__(self):
+        return f"{self.rule}: {self.failed_count} of {self.rows_checked} rows failed"
+
+    @property
+    def passed(self):
+        return not self.error and not self.failed_count
+
+    @property
+    def pass_ratio(self):
+        if not self.rows_checked:
+            return 1.0
+        return 1 - self.failed_count / self.rows_checked
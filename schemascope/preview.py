@@ -0,0 +1,87 @@
+# schemascope/preview.py
+import json
+import itertools
+import pandas as pd
+from .jsonstream import JSONStream, JSONStreamError, detect_format, iter_ndjson
+
+
+# Lines of text, or records of JSON, shown in a preview
+PREVIEW_LINES = 10
+
+# Longest line read for a preview; a file without line breaks is cut here
+MAX_LINE_LENGTH = 4096
+
+# Characters of formatted JSON shown in a preview
+PREVIEW_CHARS = 2000
+
+# Largest JSON item decoded for a preview; bigger items are shown as raw text
+MAX_PREVIEW_ITEM = 1024 * 1024
+
+
+def head_lines(path, encoding='utf-8', lines=PREVIEW_LINES):
+    """
+    The first lines of a text file, reading no further than they end.
+    Each line is cut at MAX_LINE_LENGTH characters.
+    """
+    with open(path, 'r', encoding=encoding) as f:
+        read_line = lambda: f.readline(MAX_LINE_LENGTH)
+        return [line.strip() for line in itertools.islice(iter(read_line, ''), lines)]
+
+
+def _truncate(text):
+    if len(text) > PREVIEW_CHARS:
+        return text[:PREVIEW_CHARS] + "...\n[truncated]"
+    return text
+
+
+def json_preview(path, encoding='utf-8', records=PREVIEW_LINES):
+    """
+    Preview the start of a JSON file without parsing all of it: the first
+    records of a top-level array or newline-delimited JSON file, or the
+    first properties of a top-level object, formatted with indentation.
+
+    Returns:
+        (preview text, table_data dictionary or None) tuple; table data is
+        given for arrays of objects
+    """
+    with open(path, 'r', encoding=encoding) as f:
+        if detect_format(f) == 'ndjson':
+            kind = 'array'
+            stream = iter_ndjson(f)
+        else:
+            stream = JSONStream(f, max_item_size=MAX_PREVIEW_ITEM)
+        items = []
+        more = False
+        try:
+            for item in stream:
+                if len(items) == records:
+                    more = True
+                    break
+                items.append(item)
+        except JSONStreamError:
+            if not items:
+                # Too big, or not valid JSON: show the raw start of the file
+                f.seek(0)
+                return _truncate(f.read(PREVIEW_CHARS + 1)), None
+            more = True
+        if isinstance(stream, JSONStream):
+            kind = stream.kind
+
+    if kind == 'object':
+        preview_text = json.dumps(dict(items), indent=2)
+    elif kind == 'array':
+        preview_text = json.dumps(items, indent=2)
+    else:
+        preview_text = json.dumps(items[0] if items else None, indent=2)
+    if more:
+        preview_text += "\n...[more records not shown]"
+    preview_text = _truncate(preview_text)
+
+    table_data = None
+    if kind == 'array' and items and isinstance(items[0], dict):
+        df = pd.DataFrame(items)
+        table_data = {
+            'headers': df.columns.tolist(),
+            'rows': df.head(9).values.tolist()  # 9 data rows + header = 10 total rows
+        }
+    return preview_text, table_data
@@ -0,0 +1,473 @@
+# schemascope/profiling.py
+import base64
+import datetime
+import logging
+import numpy as np
+from .sketches import FrequentValues, KMVSketch, QuantileSample, exact_distinct_counts
+
+logger = logging.getLogger(__name__)
+
+
+SAMPLE_SIZE = 5
+
+# Text columns below this share of distinct values are categories
+CATEGORY_DISTINCT_RATIO = 0.5
+
+# Columns without nulls and above this share of distinct values are
+# primary key candidates
+PRIMARY_KEY_UNIQUENESS = 0.8
+
+
+def promote_dtype(current, new):
+    """
+    Combine the dtypes pandas inferred for the same column in two chunks
+    into the dtype it would infer for the column as a whole.
+
+    Integers and floats combine to float64 (a chunk with missing integers
+    already reads as float64, and so does a chunk of only missing values).
+    Any other mix, such as booleans with missing values, is object.
+    """
+    if current is None:
+        return new
+    if current == new:
+        return current
+    if current.kind in 'iuf' and new.kind in 'iuf':
+        return np.dtype('float64')
+    return np.dtype('object')
+
+
+def _native(value):
+    # numpy scalars to plain Python values, so profiles serialize cleanly
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _frequent_key(value):
+    # Dates are counted by their text, as they are saved that way, and so
+    # are nested JSON values, which cannot be dictionary keys
+    return str(value) if isinstance(value, (datetime.date, list, dict)) else value
+
+
+def _encode_array(array):
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def _decode_array(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+class ColumnProfile:
+    """
+    Statistics for one column, built up chunk by chunk: the inferred dtype,
+    null count, distinct count, min/max and the first few sample values.
+
+    Further statistics are kept where they apply: the mean and variance of
+    numbers, a sample of numbers and dates for quantiles, the most frequent
+    values and the lengths of text values. Each is None when it does not
+    apply to the column's dtype, or the profile was saved without it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.dtype = None
+        self.count = 0
+        self.null_count = 0
+        self.min = None
+        self.max = None
+        self.comparable = True
+        self.samples = []
+        self.sample_kinds = []  # dtype kind of the chunk each sample came from
+        self.distinct = KMVSketch()
+        self.exact_distinct = None  # Set when the distinct count has been verified
+        self.moments = (0, 0.0, 0.0)  # (count, mean, sum of squared deviations) of numbers
+        self.value_sample = QuantileSample()
+        self.frequent = FrequentValues()
+        self.lengths = None  # (count, min, max, total) lengths of text values
+
+    def update(self, series):
+        """Add the values in a chunk of this column"""
+        self.dtype = promote_dtype(self.dtype, series.dtype)
+        self._drop_inapplicable()
+        values = series.dropna()
+        self.count += len(series)
+        self.null_count += len(series) - len(values)
+        if not len(values):
+            return
+        # An exact count from earlier rows does not cover the new values
+        self.exact_distinct = None
+
+        if len(self.samples) < SAMPLE_SIZE:
+            samples = values.head(SAMPLE_SIZE - len(self.samples)).tolist()
+            self.samples.extend(samples)
+            self.sample_kinds.extend([series.dtype.kind] * len(samples))
+
+        self.distinct.update(values)
+
+        if self.comparable:
+            try:
+                self._update_range(_native(values.min()), _native(values.max()))
+            except TypeError:
+                # Mixed value types (strings and numbers, nested JSON) have no order
+                self.comparable = False
+                self.min = self.max = None
+
+        self._update_statistics(values)
+
+    def _drop_inapplicable(self):
+        """Drop the statistics that no longer apply once the dtype has widened"""
+        if self.dtype is None:
+            return
+        if self.dtype.kind not in 'iuf':
+            self.moments = None
+        if self.dtype.kind not in 'iufM':
+            self.value_sample = None
+
+    def _update_statistics(self, values):
+        """Add non-null values to the statistics that apply to them"""
+        kind = values.dtype.kind
+        if kind == 'O':
+            try:
+                counts = values.value_counts()
+            except TypeError:
+                counts = None  # Unhashable values, such as nested JSON
+            if counts is not None:
+                # Counted once for both the frequent values and the text lengths
+                if self.frequent is not None:
+                    self.frequent.add_counts(counts, key=_frequent_key)
+                self._update_lengths(counts)
+                return
+        if self.frequent is not None:
+            self.frequent.update(values, key=_frequent_key)
+
+        if kind in 'iuf':
+            numbers = values.to_numpy(dtype=np.float64)
+            if self.moments is not None:
+                mean = numbers.mean()
+                self._merge_moments((len(numbers), mean, float(((numbers - mean) ** 2).sum())))
+            if self.value_sample is not None:
+                self.value_sample.update(numbers[np.isfinite(numbers)])
+        elif kind == 'M' and self.value_sample is not None:
+            # Dates are sampled as nanoseconds since the epoch
+            self.value_sample.update(values.astype('int64').to_numpy(dtype=np.float64))
+
+    def _update_lengths(self, counts):
+        """Add the lengths of the text values in a value_counts Series"""
+        try:
+            lengths = counts.index.str.len().to_numpy(dtype=np.float64)
+        except AttributeError:
+            # No text values at all, such as a column of booleans
+            return
+        # .str.len() also measures lists and dictionaries from nested JSON
+        is_text = np.fromiter((isinstance(value, str) for value in counts.index), dtype=bool, count=len(counts))
+        lengths, weights = lengths[is_text], counts.to_numpy()[is_text]
+        if len(lengths):
+            self._merge_lengths((
+                int(weights.sum()), int(lengths.min()), int(lengths.max()), int((lengths * weights).sum())
+            ))
+
+    def _merge_moments(self, other):
+        if self.moments is None:
+            return
+        count, mean, squares = self.moments
+        other_count, other_mean, other_squares = other
+        total = count + other_count
+        if not total:
+            return
+        delta = other_mean - mean
+        self.moments = (
+            total,
+            mean + delta * other_count / total,
+            squares + other_squares + delta * delta * count * other_count / total,
+        )
+
+    def _merge_lengths(self, other):
+        if self.lengths is None:
+            self.lengths = other
+            return
+        self.lengths = (
+            self.lengths[0] + other[0],
+            min(self.lengths[1], other[1]),
+            max(self.lengths[2], other[2]),
+            self.lengths[3] + other[3],
+        )
+
+    def merge(self, other):
+        """Combine with the profile of the same column from a later chunk"""
+        self.dtype = promote_dtype(self.dtype, other.dtype)
+        self.count += other.count
+        self.null_count += other.null_count
+        wanted = SAMPLE_SIZE - len(self.samples)
+        self.samples.extend(other.samples[:wanted])
+        self.sample_kinds.extend(other.sample_kinds[:wanted])
+        self.distinct.merge(other.distinct)
+        self._drop_inapplicable()
+        if other.moments is None:
+            self.moments = None
+        else:
+            self._merge_moments(other.moments)
+        if self.value_sample is not None and other.value_sample is not None:
+            self.value_sample.merge(other.value_sample)
+        else:
+            self.value_sample = None
+        if self.frequent is not None and other.frequent is not None:
+            self.frequent.merge(other.frequent)
+        else:
+            self.frequent = None
+        if other.lengths is not None:
+            self._merge_lengths(other.lengths)
+        if not other.comparable:
+            self.comparable = False
+            self.min = self.max = None
+        elif self.comparable and other.min is not None:
+            try:
+                self._update_range(other.min, other.max)
+            except TypeError:
+                self.comparable = False
+                self.min = self.max = None
+
+    def to_state(self):
+        """
+        Everything needed to carry on profiling the column later, as plain
+        values. Samples and min/max still need a JSON encoder that handles
+        dates and decimals (see ingest.CustomJSONEncoder).
+        """
+        return {
+            'name': self.name,
+            'dtype': None if self.dtype is None else self.dtype.str,
+            'count': self.count,
+            'null_count': self.null_count,
+            'min': self.min,
+            'max': self.max,
+            'comparable': self.comparable,
+            'samples': [_native(value) for value in self.samples],
+            'sample_kinds': self.sample_kinds,
+            'sketch_size': self.distinct.size,
+            'sketch': _encode_array(self.distinct.hashes),
+            'exact_distinct': self.exact_distinct,
+            'moments': None if self.moments is None else list(self.moments),
+            'value_sample': None if self.value_sample is None else {
+                'size': self.value_sample.size,
+                'values': _encode_array(self.value_sample.values),
+                'priorities': _encode_array(self.value_sample.priorities),
+                'seen': self.value_sample.seen,
+            },
+            'frequent': None if self.frequent is None else {
+                'size': self.frequent.size,
+                'counts': [[_native(value), count] for value, count in self.frequent.counts.items()],
+                'error': self.frequent.error,
+            },
+            'lengths': None if self.lengths is None else list(self.lengths),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Rebuild a column profile saved with to_state. Statistics missing
+        from the state, as in profiles saved before they were kept, stay
+        unavailable.
+        """
+        column = cls(state['name'])
+        column.dtype = None if state['dtype'] is None else np.dtype(state['dtype'])
+        column.count = state['count']
+        column.null_count = state['null_count']
+        column.min = state['min']
+        column.max = state['max']
+        column.comparable = state['comparable']
+        column.samples = list(state['samples'])
+        column.sample_kinds = list(state['sample_kinds'])
+        column.distinct = KMVSketch(size=state['sketch_size'], hashes=_decode_array(state['sketch'], np.uint64))
+        column.exact_distinct = state['exact_distinct']
+
+        moments = state.get('moments')
+        column.moments = tuple(moments) if moments is not None else None
+        sample = state.get('value_sample')
+        column.value_sample = None if sample is None else QuantileSample(
+            size=sample['size'],
+            values=_decode_array(sample['values'], np.float64),
+            priorities=_decode_array(sample['priorities'], np.float64),
+            seen=sample['seen'],
+        )
+        frequent = state.get('frequent')
+        column.frequent = None if frequent is None else FrequentValues(
+            size=frequent['size'],
+            counts={value: count for value, count in frequent['counts']},
+            error=frequent['error'],
+        )
+        lengths = state.get('lengths')
+        column.lengths = tuple(lengths) if lengths is not None else None
+        return column
+
+    def _update_range(self, low, high):
+        self.min = low if self.min is None or low < self.min else self.min
+        self.max = high if self.max is None or high > self.max else self.max
+
+    def add_missing(self, rows):
+        """Count rows of a chunk that did not have this column at all"""
+        self.dtype = promote_dtype(self.dtype, np.dtype('float64'))
+        self._drop_inapplicable()
+        self.count += rows
+        self.null_count += rows
+
+    @property
+    def distinct_count(self):
+        if self.exact_distinct is not None:
+            return self.exact_distinct
+        return min(self.distinct.estimate(), self.count - self.null_count)
+
+    def near(self, distinct_count):
+        """
+        Whether the true distinct count could be on either side of the given
+        count, so a decision based on the estimate needs verifying.
+        """
+        if self.exact_distinct is not None or self.distinct.is_exact:
+            return False
+        low, high = self.distinct.bounds()
+        return low <= distinct_count <= high
+
+    @property
+    def is_category(self):
+        return self.dtype == object and self.distinct_count < self.count * CATEGORY_DISTINCT_RATIO
+
+    @property
+    def uniqueness(self):
+        """Share of rows with a distinct value"""
+        return self.distinct_count / self.count if self.count else 0.0
+
+    @property
+    def is_key_candidate(self):
+        return self.count > 0 and not self.null_count and self.uniqueness > PRIMARY_KEY_UNIQUENESS
+
+    @property
+    def column_type(self):
+        """The dtype name, or 'category' for repetitive text columns"""
+        if self.is_category:
+            return 'category'
+        return str(self.dtype if self.dtype is not None else np.dtype('float64'))
+
+    def sample_values(self):
+        """
+        The first sample values, converted to the column's final dtype so
+        they match what reading the whole column at once would give.
+        """
+        kind = self.dtype.kind if self.dtype is not None else 'f'
+        samples = []
+        for value, sample_kind in zip(self.samples, self.sample_kinds):
+            if sample_kind != kind and sample_kind in 'iuf':
+                # Numbers read from a chunk before the column turned out to
+                # hold text, or integers from before it turned out to be float.
+                # Booleans stay booleans in an object column.
+                value = float(value) if kind == 'f' else str(value)
+            samples.append(value)
+        return samples
+
+
+class TableProfile:
+    """Column profiles for a whole table, built up one chunk at a time"""
+
+    def __init__(self):
+        self.row_count = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        """Add a DataFrame chunk; columns keep the order they first appear in"""
+        for name, column in self.columns.items():
+            if name not in chunk.columns:
+                column.add_missing(len(chunk))
+        for name in chunk.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnProfile(name)
+                # A column first seen in a later chunk was missing before it
+                if self.row_count:
+                    self.columns[name].add_missing(self.row_count)
+            self.columns[name].update(chunk[name])
+        self.row_count += len(chunk)
+
+    def to_state(self):
+        """The profile as plain values, to continue with from_state"""
+        return {
+            'row_count': self.row_count,
+            'columns': [column.to_state() for column in self.columns.values()],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a table profile saved with to_state"""
+        profile = cls()
+        profile.row_count = state['row_count']
+        for column_state in state['columns']:
+            column = ColumnProfile.from_state(column_state)
+            profile.columns[column.name] = column
+        return profile
+
+    def uncertain_columns(self):
+        """
+        Columns whose category or primary key decision is too close to call
+        from their distinct count estimate. Key candidates that could be
+        fully unique are included too, so a true key reports 100% uniqueness.
+        """
+        uncertain = []
+        for name, column in self.columns.items():
+            if column.dtype == object and column.near(column.count * CATEGORY_DISTINCT_RATIO):
+                uncertain.append(name)
+            elif not column.null_count and column.count and (
+                column.near(column.count * PRIMARY_KEY_UNIQUENESS)
+                or column.near(column.count)
+            ):
+                uncertain.append(name)
+        return uncertain
+
+    def verify_distinct_counts(self, reader):
+        """
+        Replace the distinct count estimates of uncertain columns with exact
+        counts, reading only those columns again.
+
+        Args:
+            reader: Chunk reader for the profiled file (see ingest.CSVReader)
+
+        Returns:
+            Names of the columns verified
+        """
+        columns = self.uncertain_columns()
+        if not columns:
+            return []
+        try:
+            counts = exact_distinct_counts(reader.chunks(usecols=columns), columns)
+        except Exception:
+            # The estimates still stand; verification only sharpens them
+            logger.exception('Could not verify distinct counts for %s', columns)
+            return []
+        for name, count in counts.items():
+            self.columns[name].exact_distinct = count
+        return columns
+
+    def primary_key_candidates(self):
+        """(column name, uniqueness ratio) for each primary key candidate"""
+        return [(name, column.uniqueness) for name, column in self.columns.items() if column.is_key_candidate]
+
+    def column_definitions(self):
+        """Column types and sample values, keyed by column name"""
+        return {
+            name: {
+                'type': column.column_type,
+                'sample_values': column.sample_values(),
+            }
+            for name, column in self.columns.items()
+        }
+
+
+def profile_chunks(chunks, profile=None):
+    """
+    Profile a table read as a sequence of DataFrame chunks. Only one chunk
+    is held in memory at a time.
+
+    Args:
+        chunks: Iterable of DataFrames with the table's rows in order
+        profile: Optional TableProfile of earlier rows of the same table,
+            which is updated rather than starting afresh
+
+    Returns:
+        TableProfile for the whole table
+    """
+    profile = profile or TableProfile()
+    for chunk in chunks:
+        profile.update(chunk)
+    return profile
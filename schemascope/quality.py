@@ -0,0 +1,385 @@
+# schemascope/quality.py
+import re
+import numpy as np
+import pandas as pd
+from .models import DataSource, LineageColumn, QualityRule, QualityResult
+from .sketches import DistinctHashes, hash_values
+from .statistics import json_value
+
+
+# Failing rows kept per rule, to show what went wrong
+MAX_VIOLATION_SAMPLES = 10
+
+# Rules whose outcome for a row depends on that row alone, so the rows of
+# a file can be checked in parts and the counts added up
+ROW_RULES = ('not_null', 'pattern', 'range', 'allowed_values', 'reference')
+
+
+def rule_parameters(rule_type, data):
+    """
+    Build the parameters of a quality rule from form data.
+
+    Args:
+        rule_type: One of QualityRule.RULE_TYPES
+        data: Dictionary-like form data, e.g. request.POST
+
+    Returns:
+        Parameters dictionary
+
+    Raises:
+        ValueError: If the parameters are missing or invalid
+    """
+    if rule_type == 'pattern':
+        pattern = data.get('pattern', '')
+        if not pattern:
+            raise ValueError('A pattern is required')
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f'Invalid pattern: {e}')
+        return {'pattern': pattern}
+
+    if rule_type == 'range':
+        parameters = {}
+        for bound in ('min', 'max'):
+            value = data.get(bound, '').strip()
+            if value:
+                try:
+                    parameters[bound] = float(value)
+                except ValueError:
+                    # Dates, compared as timestamps
+                    pd.Timestamp(value)
+                    parameters[bound] = value
+        if not parameters:
+            raise ValueError('A minimum or maximum is required')
+        return parameters
+
+    if rule_type == 'allowed_values':
+        values = [value.strip() for value in data.get('values', '').split(',') if value.strip()]
+        if not values:
+            raise ValueError('At least one allowed value is required')
+        return {'values': values}
+
+    if rule_type == 'reference':
+        column = data.get('reference_column', '').strip()
+        if not column:
+            raise ValueError('A referenced column is required')
+        return {'column': column}
+
+    if rule_type not in dict(QualityRule.RULE_TYPES):
+        raise ValueError(f"Unknown rule type '{rule_type}'")
+    return {}
+
+
+def snapshot_rules(datasource):
+    """
+    The rules of a data source's current schema, with their results, as
+    dictionaries; taken before the schema is replaced by a new profile.
+    """
+    rules = QualityRule.objects.filter(schema__data_source=datasource).select_related('result')
+    snapshot = []
+    for rule in rules:
+        result = getattr(rule, 'result', None)
+        snapshot.append({
+            'column_name': rule.column_name,
+            'rule_type': rule.rule_type,
+            'parameters': rule.parameters,
+            'reference_source_id': rule.reference_source_id,
+            'definition': rule.definition(),
+            'result': None if result is None or result.error else {
+                'rows_checked': result.rows_checked,
+                'failed_count': result.failed_count,
+                'violations': result.violations,
+            },
+        })
+    return snapshot
+
+
+def attach_rules(schema, carried=None):
+    """
+    Give a newly profiled schema the rules it inherits: those of the
+    schema it replaces, or else those of the previous version in its
+    lineage. Rules follow renamed columns and are dropped with removed
+    ones.
+
+    Args:
+        schema: New SchemaDefinition, already keyed in its lineage
+        carried: Optional snapshot_rules() of the schema it replaces
+    """
+    columns = set(schema.get_columns())
+    if carried:
+        renamed = {name: name for name in columns}
+    else:
+        # The position is set when the lineage is rebuilt, on another instance
+        lineage_id, position = DataSource.objects.filter(pk=schema.data_source_id).values_list(
+            'lineage_id', 'lineage_position'
+        ).get()
+        if not lineage_id or not position:
+            return
+        previous = DataSource.objects.filter(lineage_id=lineage_id, lineage_position=position - 1).first()
+        if previous is None:
+            return
+        carried = snapshot_rules(previous)
+        if not carried:
+            return
+        keys = dict(LineageColumn.objects.filter(schema=schema).values_list('key', 'name'))
+        renamed = {
+            name: keys[key]
+            for name, key in LineageColumn.objects.filter(schema__data_source=previous).values_list('name', 'key')
+            if key in keys
+        }
+
+    QualityRule.objects.bulk_create([
+        QualityRule(
+            schema=schema,
+            column_name=renamed[rule['column_name']],
+            rule_type=rule['rule_type'],
+            parameters=rule['parameters'],
+            reference_source_id=rule['reference_source_id'],
+        )
+        for rule in carried if renamed.get(rule['column_name']) in columns
+    ])
+
+
+def reference_hashes(reader, column):
+    """DistinctHashes of the non-null values of a column, read a chunk at a time"""
+    hashes = DistinctHashes()
+    for chunk in reader.chunks(usecols=[column]):
+        values = chunk[column].dropna()
+        if len(values):
+            hashes.add(hash_values(values))
+    return hashes
+
+
+def _violation_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return json_value(value)
+
+
+class RuleCheck:
+    """
+    Evaluates one quality rule over a table a chunk at a time. Each chunk's
+    column is checked in a few vectorized operations, giving a mask of its
+    failing rows; failures are counted and the first few kept.
+    """
+
+    def __init__(self, rule, open_reader=None):
+        self.rule = rule
+        self.rows_checked = 0
+        self.failed_count = 0
+        self.violations = []
+        self.error = ''
+        self.seen = DistinctHashes()  # Hashes of earlier values, for unique
+        self.allowed = None  # Hashes of referenced values, for reference
+        if rule.rule_type == 'reference':
+            self._load_reference(open_reader)
+
+    def _load_reference(self, open_reader):
+        source = self.rule.reference_source
+        column = self.rule.parameters.get('column')
+        if source is None or not hasattr(source, 'schema'):
+            self.error = 'The referenced data source no longer exists'
+        elif column not in source.schema.get_columns():
+            self.error = f"The referenced data source has no column '{column}'"
+        else:
+            try:
+                self.allowed = reference_hashes(open_reader(source), column)
+            except Exception as e:
+                self.error = f'Error reading the referenced data source: {e}'
+
+    def failures(self, column):
+        """Boolean mask of the rows of a column Series that fail the rule"""
+        rule_type = self.rule.rule_type
+        parameters = self.rule.parameters
+        present = column.notna()
+        if rule_type == 'not_null':
+            return ~present.to_numpy()
+
+        failed = np.zeros(len(column), dtype=bool)
+        values = column[present]
+        if not len(values):
+            return failed
+
+        if rule_type == 'unique':
+            hashes = hash_values(values)
+            repeated = pd.Series(hashes).duplicated().to_numpy() | self.seen.contains(hashes)
+            self.seen.add(hashes)
+            failed[present.to_numpy()] = repeated
+        elif rule_type == 'pattern':
+            matches = values.astype(str).str.fullmatch(parameters['pattern'])
+            failed[present.to_numpy()] = ~matches.to_numpy(dtype=bool)
+        elif rule_type == 'range':
+            failed[present.to_numpy()] = self._out_of_range(values)
+        elif rule_type == 'allowed_values':
+            allowed = parameters['values']
+            if values.dtype.kind in 'iuf':
+                allowed = pd.to_numeric(pd.Series(allowed), errors='coerce').dropna()
+            else:
+                values = values.astype(str)
+            failed[present.to_numpy()] = ~values.isin(allowed).to_numpy()
+        elif rule_type == 'reference':
+            failed[present.to_numpy()] = ~self.allowed.contains(hash_values(values))
+        return failed
+
+    def _out_of_range(self, values):
+        parameters = self.rule.parameters
+        if values.dtype.kind == 'M':
+            numbers = values
+            convert = pd.Timestamp
+        else:
+            numbers = pd.to_numeric(values, errors='coerce')
+            convert = float
+        # Values that are not numbers (or dates) are out of any range
+        outside = numbers.isna().to_numpy()
+        if 'min' in parameters:
+            outside |= (numbers < convert(parameters['min'])).to_numpy()
+        if 'max' in parameters:
+            outside |= (numbers > convert(parameters['max'])).to_numpy()
+        return outside
+
+    def update(self, chunk, first_row):
+        """
+        Check a chunk of rows.
+
+        Args:
+            chunk: DataFrame including the rule's column
+            first_row: Row number of the chunk's first row in the file
+        """
+        if self.error:
+            return
+        name = self.rule.column_name
+        column = chunk[name] if name in chunk.columns else pd.Series(np.nan, index=chunk.index)
+        try:
+            failed = self.failures(column)
+        except (TypeError, ValueError, re.error) as e:
+            self.error = f'Error evaluating rule: {e}'
+            return
+        self.rows_checked += len(chunk)
+        self.failed_count += int(failed.sum())
+        if len(self.violations) < MAX_VIOLATION_SAMPLES and failed.any():
+            rows = np.flatnonzero(failed)[:MAX_VIOLATION_SAMPLES - len(self.violations)]
+            self.violations.extend(
+                {'row': first_row + int(row), 'value': _violation_value(column.iloc[row])} for row in rows
+            )
+
+    def result(self, method='scan'):
+        """QualityResult field values for what has been checked"""
+        return {
+            'method': method,
+            'rows_checked': self.rows_checked,
+            'failed_count': self.failed_count,
+            'violations': self.violations,
+            'error': self.error,
+        }
+
+
+def evaluate_rules(rules, reader, open_reader, first_row=0):
+    """
+    Evaluate quality rules together in one pass over a table, reading only
+    the columns they check.
+
+    Args:
+        rules: QualityRules of the table's schema
+        reader: Chunk reader for the table (see ingest.CSVReader)
+        open_reader: Function giving a chunk reader for a DataSource, for
+            rules referencing another source
+        first_row: Row number of the reader's first row in the file
+
+    Returns:
+        Dictionary of rule id to RuleCheck
+    """
+    checks = {rule.pk: RuleCheck(rule, open_reader) for rule in rules}
+    columns = list(dict.fromkeys(rule.column_name for rule in rules))
+    if not columns:
+        return checks
+    for chunk in reader.chunks(usecols=columns):
+        for check in checks.values():
+            check.update(chunk, first_row)
+        first_row += len(chunk)
+    return checks
+
+
+def decided_by_statistics(rule, schema, statistics):
+    """
+    Result field values for a rule that the column's exact statistics
+    show every row passes, or None if the rows must be checked.
+    """
+    stats = statistics.get(rule.column_name)
+    if stats is None or schema.profile_mode != 'full':
+        return None
+    passes = False
+    if rule.rule_type == 'not_null':
+        passes = stats.null_count == 0
+    elif rule.rule_type == 'range' and stats.min_value is not None and stats.max_value is not None:
+        low, high = rule.parameters.get('min'), rule.parameters.get('max')
+        try:
+            if isinstance(stats.min_value, str):
+                low = pd.Timestamp(low) if low is not None else None
+                high = pd.Timestamp(high) if high is not None else None
+                minimum, maximum = pd.Timestamp(stats.min_value), pd.Timestamp(stats.max_value)
+            else:
+                minimum, maximum = stats.min_value, stats.max_value
+                low = float(low) if low is not None else None
+                high = float(high) if high is not None else None
+            passes = (low is None or minimum >= low) and (high is None or maximum <= high)
+        except (TypeError, ValueError):
+            passes = False
+    if not passes:
+        return None
+    return {'method': 'statistics', 'rows_checked': schema.row_count, 'failed_count': 0, 'violations': [], 'error': ''}
+
+
+def validate_schema(schema, open_reader, reader=None, rules=None, tail=None, earlier=None, first_tail_row=0):
+    """
+    Evaluate a schema's quality rules and store their results.
+
+    Rules the column statistics settle are not checked row by row, and the
+    rest are checked together in one pass. When rows have been appended to
+    the file, rules that look at each row alone are only checked against
+    the new rows, and their counts added to the earlier result.
+
+    Args:
+        schema: SchemaDefinition whose rules to evaluate
+        open_reader: Function giving a chunk reader for a DataSource
+        reader: Optional chunk reader for the schema's file; opened with
+            open_reader if any rule needs it
+        rules: Optional rules to evaluate; by default all of the schema's
+        tail: Optional chunk reader for just the appended rows
+        earlier: snapshot_rules() of the schema before the rows were appended
+        first_tail_row: Row number of the first appended row
+    """
+    if rules is None:
+        rules = list(schema.quality_rules.select_related('reference_source__schema'))
+    if not rules:
+        return
+    statistics = {stats.column_name: stats for stats in schema.statistics.all()}
+    earlier = {rule['definition']: rule['result'] for rule in earlier or [] if rule['result']}
+
+    results = {}
+    scan, scan_tail = [], []
+    for rule in rules:
+        decided = decided_by_statistics(rule, schema, statistics)
+        if decided is not None:
+            results[rule.pk] = decided
+        elif tail is not None and rule.rule_type in ROW_RULES and rule.definition() in earlier:
+            scan_tail.append(rule)
+        else:
+            scan.append(rule)
+
+    if scan:
+        reader = reader or open_reader(schema.data_source)
+        for pk, check in evaluate_rules(scan, reader, open_reader).items():
+            results[pk] = check.result()
+    if scan_tail:
+        rules_by_pk = {rule.pk: rule for rule in scan_tail}
+        for pk, check in evaluate_rules(scan_tail, tail, open_reader, first_tail_row).items():
+            before = earlier[rules_by_pk[pk].definition()]
+            result = check.result('incremental')
+            result['rows_checked'] += before['rows_checked']
+            result['failed_count'] += before['failed_count']
+            result['violations'] = (before['violations'] + result['violations'])[:MAX_VIOLATION_SAMPLES]
+            results[pk] = result
+
+    QualityResult.objects.filter(rule__in=rules).delete()
+    QualityResult.objects.bulk_create([QualityResult(rule_id=pk, **fields) for pk, fields in results.items()])
@@ -0,0 +1,203 @@
+# schemascope/sampling.py
+import math
+import numpy as np
+import pandas as pd
+from .keys import row_hashes
+from .profiling import PRIMARY_KEY_UNIQUENESS
+from .sketches import DistinctHashes, hash_values
+
+
+# Rows profiled in sample mode unless another size is asked for
+DEFAULT_SAMPLE_ROWS = 100000
+
+# Standard errors either side of a sample estimate in its confidence
+# interval: 1.96 for 95% confidence
+CONFIDENCE_Z = 1.96
+
+
+class RowReservoir:
+    """
+    A uniform random sample of a table's rows, gathered one chunk at a time.
+
+    Each row is given a random priority and the rows with the smallest
+    priorities are kept. Once the reservoir is full only rows with a
+    priority below the largest kept can get in, so later chunks are mostly
+    skipped without copying. Priorities are drawn from a generator seeded
+    by the number of rows seen, so sampling the same file twice gives the
+    same rows.
+    """
+
+    def __init__(self, size=DEFAULT_SAMPLE_ROWS):
+        self.size = size
+        self.rows_seen = 0
+        self.frame = None
+        self.priorities = np.empty(0, dtype=np.float64)
+
+    def update(self, chunk):
+        """Add a DataFrame chunk of the table's next rows"""
+        priorities = np.random.default_rng(self.rows_seen).random(len(chunk))
+        # Row numbers in the file, so the sample can be put back in file order
+        chunk = chunk.set_axis(pd.RangeIndex(self.rows_seen, self.rows_seen + len(chunk)))
+        self.rows_seen += len(chunk)
+        if len(self.priorities) == self.size:
+            keep = priorities < self.priorities.max()
+            chunk, priorities = chunk[keep], priorities[keep]
+        if not len(chunk):
+            return
+
+        frame = chunk if self.frame is None else pd.concat([self.frame, chunk])
+        priorities = np.concatenate([self.priorities, priorities])
+        if len(frame) > self.size:
+            smallest = np.argpartition(priorities, self.size)[:self.size]
+            frame, priorities = frame.iloc[smallest], priorities[smallest]
+        self.frame, self.priorities = frame, priorities
+
+    def sample(self):
+        """The sampled rows, in the order they appear in the file"""
+        if self.frame is None:
+            return pd.DataFrame()
+        return self.frame.sort_index().reset_index(drop=True)
+
+
+def sample_rows(chunks, size=DEFAULT_SAMPLE_ROWS):
+    """
+    Sample the rows of a table read as a sequence of DataFrame chunks, in
+    one pass holding one chunk and the sample in memory.
+
+    Returns:
+        (sampled rows DataFrame, number of rows in the table) tuple
+    """
+    reservoir = RowReservoir(size)
+    for chunk in chunks:
+        reservoir.update(chunk)
+    return reservoir.sample(), reservoir.rows_seen
+
+
+def wilson_interval(successes, trials, z=CONFIDENCE_Z):
+    """
+    Wilson score confidence interval for a proportion estimated from a
+    sample. Unlike the normal approximation it stays within [0, 1] and is
+    not empty when the sample proportion is 0 or 1.
+
+    Returns:
+        (low, high) tuple
+    """
+    if not trials:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+class SampleSummary:
+    """
+    How a profile was sampled, and what a verification pass over the whole
+    file found.
+
+    Without verification, null ratios and uniqueness ratios are sample
+    estimates reported with Wilson confidence intervals. Uniqueness is the
+    share of sampled rows with a distinct value; a sample can only
+    overstate it, so the interval is a guide to whether a column may be a
+    key rather than a bound on its true uniqueness. Verification replaces
+    the null counts of every column, and the uniqueness of key candidates,
+    with exact figures.
+    """
+
+    def __init__(self, total_rows, sample_rows):
+        self.total_rows = total_rows
+        self.sample_rows = sample_rows
+        self.verified = False
+        self.null_counts = {}  # Exact, by column, once verified
+        self.distinct_counts = {}  # Exact, for single-column key candidates
+        self.key_uniqueness = {}  # Exact, by column name tuple of composite key candidates
+
+    def verify(self, reader, primary_keys, composite_keys):
+        """
+        Count nulls and check key candidates against every row of the file,
+        in one pass holding one 64-bit hash per distinct key value.
+
+        Args:
+            reader: Chunk reader for the whole file (see ingest.CSVReader)
+            primary_keys: (column name, uniqueness) of the sample's key candidates
+            composite_keys: (column names, uniqueness) of the sample's composite keys
+        """
+        candidates = [name for name, uniqueness in primary_keys]
+        combinations = [tuple(names) for names, uniqueness in composite_keys]
+        # Non-null values are counted, as rows of a chunk without a column are nulls too
+        present = {}
+        seen = {name: DistinctHashes() for name in candidates}
+        seen.update({names: DistinctHashes() for names in combinations})
+        for chunk in reader.chunks():
+            for name, count in chunk.notna().sum().items():
+                present[name] = present.get(name, 0) + int(count)
+            for name in candidates:
+                if name in chunk.columns:
+                    seen[name].add(hash_values(chunk[name].dropna()))
+            for names in combinations:
+                if all(name in chunk.columns for name in names):
+                    seen[names].add(row_hashes(chunk, list(names)))
+
+        self.null_counts = {name: self.total_rows - count for name, count in present.items()}
+        self.distinct_counts = {name: len(seen[name]) for name in candidates}
+        self.key_uniqueness = {
+            names: len(seen[names]) / self.total_rows if self.total_rows else 0.0
+            for names in combinations
+        }
+        self.verified = True
+
+    def primary_keys(self, candidates):
+        """
+        Primary key candidates found on the sample, less those a
+        verification pass ruled out, with exact uniqueness once verified.
+        """
+        if not self.verified:
+            return candidates
+        keys = []
+        for name, uniqueness in candidates:
+            if self.null_counts.get(name) or not self.total_rows:
+                continue
+            uniqueness = self.distinct_counts[name] / self.total_rows
+            if uniqueness > PRIMARY_KEY_UNIQUENESS:
+                keys.append((name, uniqueness))
+        return keys
+
+    def composite_keys(self, candidates):
+        """Composite keys found on the sample, less those a verification pass ruled out"""
+        if not self.verified:
+            return candidates
+        return [
+            (names, self.key_uniqueness[tuple(names)])
+            for names, uniqueness in candidates if self.key_uniqueness[tuple(names)] == 1.0
+        ]
+
+    def column_statistics(self, name, column):
+        """
+        ColumnStatistics field values for a sampled column: confidence
+        intervals for its null and uniqueness ratios, or exact figures
+        where verification gave them.
+
+        Args:
+            name: Column name
+            column: profiling.ColumnProfile of the column in the sample
+        """
+        statistics = {}
+        if self.verified and name in self.null_counts:
+            null_count = self.null_counts[name]
+            statistics.update(
+                null_count=null_count,
+                null_ratio=null_count / self.total_rows if self.total_rows else 0.0,
+            )
+        else:
+            statistics['null_ratio_low'], statistics['null_ratio_high'] = wilson_interval(
+                column.null_count, column.count
+            )
+
+        if self.verified and name in self.distinct_counts:
+            statistics['distinct_count'] = self.distinct_counts[name]
+        else:
+            statistics['uniqueness_low'], statistics['uniqueness_high'] = wilson_interval(
+                column.distinct_count, column.count
+            )
+        return statistics
@@ -0,0 +1,314 @@
+# schemascope/sketches.py
+import math
+import numpy as np
+import pandas as pd
+
+
+# Number of smallest hashes kept by default. Estimates are exact below this
+# many distinct values, with about 3% relative standard error above it.
+DEFAULT_SKETCH_SIZE = 1024
+
+# Values are hashed to 64 bits; dividing by this maps a hash into (0, 1]
+HASH_SPACE = float(2 ** 64)
+
+# Standard errors either side of an estimate treated as possible
+CONFIDENCE_Z = 3
+
+# Values tracked by a frequent values summary. A count is short by at most
+# the number of values summarized divided by one more than this.
+FREQUENT_VALUES_SIZE = 256
+
+# Values kept by a quantile sample. Quantiles are exact up to this many
+# values; above it a median's rank has a standard error of about 1%.
+QUANTILE_SAMPLE_SIZE = 2048
+
+
+def hash_values(series):
+    """
+    Hash the non-null values of a Series to 64-bit integers in one
+    vectorized pass.
+
+    Numbers are hashed by value, so 1 read in an integer chunk and 1.0 read
+    in a float chunk hash the same. Unhashable values, such as nested JSON
+    objects, are hashed by their text.
+
+    Returns:
+        numpy uint64 array, one hash per value
+    """
+    if series.dtype.kind in 'iufb':
+        series = series.astype('float64')
+    try:
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+    except TypeError:
+        return pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy()
+
+
+class KMVSketch:
+    """
+    K-minimum-values distinct count sketch.
+
+    Keeps the k smallest distinct hashes seen. If fewer than k distinct
+    values have been seen the count is exact; otherwise the k-th smallest
+    hash shows how densely the hash space is filled. Sketches of the same
+    size merge by keeping the k smallest of both sets of hashes, so chunks
+    (or files) can be sketched separately and combined.
+    """
+
+    def __init__(self, size=DEFAULT_SKETCH_SIZE, hashes=None):
+        self.size = size
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else np.asarray(hashes, dtype=np.uint64)
+
+    def update(self, series):
+        """Add the (non-null) values of a Series"""
+        self.add_hashes(hash_values(series))
+
+    def add_hashes(self, hashes):
+        if len(self.hashes) == self.size:
+            # Only hashes below the current k-th smallest can change the sketch
+            hashes = hashes[hashes < self.hashes[-1]]
+        if len(hashes):
+            self.hashes = np.union1d(self.hashes, hashes)[:self.size]
+
+    def merge(self, other):
+        """Add the values seen by another sketch of the same size"""
+        self.add_hashes(other.hashes)
+
+    @property
+    def is_exact(self):
+        return len(self.hashes) < self.size
+
+    def estimate(self):
+        """Estimated number of distinct values"""
+        if self.is_exact:
+            return len(self.hashes)
+        kth = (float(self.hashes[-1]) + 1) / HASH_SPACE
+        return int(round((self.size - 1) / kth))
+
+    def bounds(self, z=CONFIDENCE_Z):
+        """
+        Range the true distinct count very likely falls in.
+
+        Returns:
+            (low, high) tuple; both equal the estimate when it is exact
+        """
+        estimate = self.estimate()
+        if self.is_exact:
+            return estimate, estimate
+        error = z / math.sqrt(self.size - 2)
+        return int(estimate * (1 - error)), int(math.ceil(estimate * (1 + error)))
+
+
+# Least number of pending hashes before DistinctHashes merges them
+DISTINCT_MERGE_SIZE = 1 << 20
+
+
+def _sorted_contains(sorted_hashes, hashes):
+    """Mask of the hashes found in a sorted array of distinct hashes"""
+    if not len(sorted_hashes):
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.searchsorted(sorted_hashes, hashes)
+    positions[positions == len(sorted_hashes)] = 0
+    return sorted_hashes[positions] == hashes
+
+
+class DistinctHashes:
+    """
+    The distinct 64-bit hashes of values seen a chunk at a time, for exact
+    distinct counts and membership tests.
+
+    Merging each chunk into a sorted set as it arrives re-sorts the whole
+    set every time. Instead each chunk's distinct hashes are kept
+    separately and merged in one sort once they outnumber the merged set,
+    so every hash is sorted a logarithmic number of times and memory stays
+    within about twice the distinct count.
+    """
+
+    def __init__(self):
+        self._merged = np.empty(0, dtype=np.uint64)
+        self._pending = []
+        self._pending_size = 0
+
+    def add(self, hashes):
+        """Add a numpy array of hashes"""
+        hashes = np.unique(hashes)
+        if not len(hashes):
+            return
+        self._pending.append(hashes)
+        self._pending_size += len(hashes)
+        if self._pending_size > max(len(self._merged), DISTINCT_MERGE_SIZE):
+            self._merge()
+
+    def _merge(self):
+        if self._pending:
+            self._merged = np.unique(np.concatenate([self._merged, *self._pending]))
+            self._pending = []
+            self._pending_size = 0
+
+    def contains(self, hashes):
+        """Boolean mask of the given hashes that have been added"""
+        found = _sorted_contains(self._merged, hashes)
+        for pending in self._pending:
+            found |= _sorted_contains(pending, hashes)
+        return found
+
+    def values(self):
+        """Sorted numpy array of the distinct hashes"""
+        self._merge()
+        return self._merged
+
+    def __len__(self):
+        return len(self.values())
+
+
+def exact_distinct_counts(chunks, columns):
+    """
+    Count the distinct non-null values of some columns exactly.
+
+    Holds one 64-bit hash per distinct value, rather than the values
+    themselves, so memory is bounded by cardinality and not by row width.
+
+    Args:
+        chunks: Iterable of DataFrames containing at least the given columns
+        columns: Names of the columns to count
+
+    Returns:
+        Dictionary of column name to distinct count
+    """
+    seen = {column: DistinctHashes() for column in columns}
+    for chunk in chunks:
+        for column in columns:
+            values = chunk[column].dropna()
+            if len(values):
+                seen[column].add(hash_values(values))
+    return {column: len(hashes) for column, hashes in seen.items()}
+
+
+def estimate_jaccard(a, b):
+    """
+    Estimated Jaccard similarity of the distinct values of two columns from
+    their KMV sketches of the same size: the share of the k smallest hashes
+    of the union that are in both sketches. Exact when both sketches are.
+    """
+    union = np.union1d(a.hashes, b.hashes)[:min(a.size, b.size)]
+    if not len(union):
+        return 0.0
+    both = np.isin(union, a.hashes, assume_unique=True) & np.isin(union, b.hashes, assume_unique=True)
+    return int(both.sum()) / len(union)
+
+
+class FrequentValues:
+    """
+    Misra-Gries summary of the most frequent values of a column.
+
+    Tracks at most size values with a lower bound on the count of each.
+    Every value occurring more than n / (size + 1) times in n values is
+    tracked, and each count is short by at most error. Summaries merge by
+    adding counts and trimming back to size, so chunks can be summarized
+    separately and combined.
+    """
+
+    def __init__(self, size=FREQUENT_VALUES_SIZE, counts=None, error=0):
+        self.size = size
+        self.counts = dict(counts or {})
+        self.error = error
+
+    def update(self, series, key=None):
+        """
+        Add the (non-null) values of a Series.
+
+        Args:
+            series: The values
+            key: Optional function applied to each tracked value, such as
+                one that converts values to a form that serializes
+        """
+        try:
+            counts = series.value_counts()
+        except TypeError:
+            # Unhashable values, such as nested JSON, are counted by their text
+            counts = series.astype(str).value_counts()
+        self.add_counts(counts, key=key)
+
+    def add_counts(self, counts, key=None):
+        """Add values already counted, as a value_counts Series, most frequent first"""
+        # The chunk's own summary: the most frequent values, less the count
+        # of the first value left out
+        cut = int(counts.iloc[self.size]) if len(counts) > self.size else 0
+        top = counts.iloc[:self.size]
+        top = top[top > cut]
+        key = key or (lambda value: value)
+        chunk = {}
+        for value, count in zip(top.index, top.to_numpy()):
+            value = key(value.item() if isinstance(value, np.generic) else value)
+            chunk[value] = chunk.get(value, 0) + int(count) - cut
+        self.error += cut
+        self.merge(FrequentValues(self.size, chunk))
+
+    def merge(self, other):
+        """Add the values counted by another summary"""
+        counts = dict(self.counts)
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        cut = 0
+        if len(counts) > self.size:
+            cut = sorted(counts.values(), reverse=True)[self.size]
+            counts = {value: count - cut for value, count in counts.items() if count > cut}
+        self.counts = counts
+        self.error += other.error + cut
+
+    def most_common(self, count=None):
+        """(value, count) pairs, most frequent first"""
+        ordered = sorted(self.counts.items(), key=lambda item: -item[1])
+        return ordered[:count] if count is not None else ordered
+
+
+class QuantileSample:
+    """
+    A uniform random sample of a numeric column's values, for estimating
+    quantiles and histograms.
+
+    Each value is given a random priority and the values with the smallest
+    priorities are kept, which is a uniform sample however the values
+    arrive. Samples merge by keeping the smallest priorities of both.
+    Priorities are drawn from a generator seeded by the number of values
+    seen, so profiling the same file twice keeps the same sample.
+    """
+
+    def __init__(self, size=QUANTILE_SAMPLE_SIZE, values=None, priorities=None, seen=0):
+        self.size = size
+        self.values = np.empty(0, dtype=np.float64) if values is None else np.asarray(values, dtype=np.float64)
+        self.priorities = (np.empty(0, dtype=np.float64) if priorities is None
+                           else np.asarray(priorities, dtype=np.float64))
+        self.seen = seen
+
+    def update(self, values):
+        """Add a numpy array of values, which must not contain NaN"""
+        priorities = np.random.default_rng(self.seen).random(len(values))
+        self.seen += len(values)
+        self._add(np.asarray(values, dtype=np.float64), priorities)
+
+    def merge(self, other):
+        self.seen += other.seen
+        self._add(other.values, other.priorities)
+
+    def _add(self, values, priorities):
+        if len(self.priorities) == self.size:
+            # Only priorities below the current largest can change the sample
+            keep = priorities < self.priorities.max()
+            values, priorities = values[keep], priorities[keep]
+        if not len(values):
+            return
+        values = np.concatenate([self.values, values])
+        priorities = np.concatenate([self.priorities, priorities])
+        if len(values) > self.size:
+            smallest = np.argpartition(priorities, self.size)[:self.size]
+            values, priorities = values[smallest], priorities[smallest]
+        self.values, self.priorities = values, priorities
+
+    @property
+    def is_exact(self):
+        """Whether the sample holds every value seen"""
+        return len(self.values) == self.seen
+
+    def quantiles(self, probabilities):
+        """Estimated quantiles for a sequence of probabilities in [0, 1]"""
+        return np.quantile(self.values, probabilities)
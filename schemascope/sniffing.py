@@ -0,0 +1,274 @@
+# schemascope/sniffing.py
+import re
+import csv
+import codecs
+
+
+# Bytes examined at the start of a file
+SNIFF_BYTES = 64 * 1024
+
+# Delimiters tried, in order of preference when equally likely
+DELIMITERS = [',', '\t', ';', '|']
+
+# Byte order marks; UTF-32 first, as its little-endian mark starts with UTF-16's
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Tried in order when there is no byte order mark; latin-1 decodes anything
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+# Values read as dates: ISO 8601 dates, optionally with a time
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+INTEGER = re.compile(r'^[+-]?\d+$')
+NUMBER = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+
+# A number written with a decimal comma, as in many European exports
+COMMA_DECIMAL = re.compile(r'^[+-]?\d+,\d+$')
+
+
+def detect_encoding(sample, complete=False):
+    """
+    Guess the encoding of a file from its first bytes: a byte order mark if
+    there is one, otherwise the first of ENCODINGS that decodes the sample.
+
+    Args:
+        sample: The first bytes of the file
+        complete: Whether the sample is the whole file; if not, a multibyte
+            character cut off at its end is not an error
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def sniff_encoding(path):
+    """The encoding of a file, guessed from its first SNIFF_BYTES bytes"""
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES + 1)
+    return detect_encoding(sample[:SNIFF_BYTES], complete=len(sample) <= SNIFF_BYTES)
+
+
+def _rows(lines, delimiter, quotechar):
+    return list(csv.reader(lines, delimiter=delimiter, quotechar=quotechar))
+
+
+def _field_count_consistency(rows):
+    """(share of rows with the most common field count, that count)"""
+    counts = {}
+    for row in rows:
+        counts[len(row)] = counts.get(len(row), 0) + 1
+    fields, rows_with = max(counts.items(), key=lambda item: (item[1], item[0]))
+    return rows_with / len(rows), fields
+
+
+def detect_delimiter(lines, quotechar='"'):
+    """
+    The delimiter that splits the sample lines into the most consistent
+    number of fields, preferring more fields when equally consistent.
+    Falls back to a comma when no candidate splits the lines at all.
+    """
+    best, best_score = ',', (0, 0, 0)
+    for preference, delimiter in enumerate(DELIMITERS):
+        consistency, fields = _field_count_consistency(_rows(lines, delimiter, quotechar))
+        if fields < 2:
+            continue
+        score = (consistency, fields, -preference)
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def detect_quotechar(text, delimiter):
+    """
+    A single quote if whole fields are quoted with it and never with double
+    quotes; otherwise the usual double quote. An apostrophe at the start of
+    a field, as in '90s, does not count.
+    """
+    def quoted(quote):
+        d = re.escape(delimiter)
+        return re.search(rf'(^|{d})\s*{quote}[^{quote}\n]*{quote}\s*({d}|$)', text, re.MULTILINE)
+
+    if not quoted('"') and quoted("'"):
+        return "'"
+    return '"'
+
+
+def _kind(value):
+    if INTEGER.match(value):
+        return 'integer'
+    if NUMBER.match(value):
+        return 'number'
+    if ISO_DATE.match(value):
+        return 'date'
+    return 'text'
+
+
+def detect_header(rows):
+    """
+    Whether the first row is a header. Columns vote: a text first value
+    over numbers below is a header, a number over numbers is data, and
+    otherwise the column has no say. Without a clear vote against, the
+    first row is taken to be a header, as pandas does.
+    """
+    if len(rows) < 2:
+        return True
+    votes = 0
+    for index, first in enumerate(rows[0]):
+        values = [row[index].strip() for row in rows[1:] if index < len(row) and row[index].strip()]
+        if not values:
+            continue
+        numeric = all(_kind(value) in ('integer', 'number') for value in values)
+        if not numeric:
+            continue
+        votes += -1 if _kind(first.strip()) in ('integer', 'number') else 1
+    return votes >= 0
+
+
+class CSVPlan:
+    """
+    How to read a CSV file, worked out from a sample of its start: the
+    encoding, delimiter and quote character, whether there is a header,
+    and per-column hints that spare pandas inferring types chunk by chunk.
+
+    Text columns are read as strings, ISO 8601 date columns are parsed as
+    dates and wholly empty, unnamed trailing columns (from a delimiter at
+    the end of every line) are skipped. Numeric columns are left to pandas,
+    as a later row may widen an integer to a float. Files not delimited by
+    commas may use a decimal comma, which is passed on to pandas.
+    """
+
+    def __init__(self, encoding, delimiter, quotechar='"', header=True, columns=(),
+                 text_columns=(), date_columns=(), skipped_columns=(), decimal='.'):
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.header = header
+        self.columns = list(columns)
+        self.text_columns = list(text_columns)
+        self.date_columns = list(date_columns)
+        self.skipped_columns = list(skipped_columns)
+        self.decimal = decimal
+
+    def read_options(self):
+        """Keyword arguments for pd.read_csv, beyond delimiter and encoding"""
+        options = {}
+        if self.quotechar != '"':
+            options['quotechar'] = self.quotechar
+        if self.decimal != '.':
+            options['decimal'] = self.decimal
+        if not self.header:
+            options['header'] = None
+            options['names'] = self.columns
+        if self.text_columns:
+            options['dtype'] = {name: str for name in self.text_columns}
+        if self.date_columns:
+            options['parse_dates'] = self.date_columns
+        if self.skipped_columns:
+            options['usecols'] = [name for name in self.columns if name not in self.skipped_columns]
+        return options
+
+
+def sniff_csv(path, encoding=None, delimiter=None):
+    """
+    Plan how to read a CSV file from its first SNIFF_BYTES bytes.
+
+    Args:
+        path: Path of the file
+        encoding: The encoding, if known; otherwise it is detected
+        delimiter: The delimiter, if known; otherwise it is detected
+
+    Returns:
+        CSVPlan
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES + 1)
+    complete = len(sample) <= SNIFF_BYTES
+    sample = sample[:SNIFF_BYTES]
+
+    encoding = encoding or detect_encoding(sample, complete=complete)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=complete)
+    lines = text.splitlines()
+    if not complete and len(lines) > 1:
+        lines = lines[:-1]  # Probably cut off part way
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return CSVPlan(encoding, delimiter or ',')
+
+    delimiter = delimiter or detect_delimiter(lines)
+    quotechar = detect_quotechar(text, delimiter)
+    rows = _rows(lines, delimiter, quotechar)
+    if not complete and len(rows) > 1:
+        rows = rows[:-1]  # A quoted field may span the cut
+
+    header = detect_header(rows)
+    width = len(rows[0])
+    if header:
+        columns = _header_names(rows[0])
+        data = rows[1:]
+    else:
+        columns = [f'column_{index + 1}' for index in range(width)]
+        data = rows
+
+    column_values = {}
+    skipped_columns = []
+    for index, name in enumerate(columns):
+        values = [row[index].strip() for row in data if index < len(row) and row[index].strip()]
+        if values:
+            column_values[name] = values
+        elif header and not rows[0][index].strip() and index == len(columns) - 1:
+            skipped_columns.append(name)
+
+    decimal = '.'
+    if delimiter != ',':
+        kinds = {_kind(value) for values in column_values.values() for value in values}
+        comma_numbers = any(
+            _comma_numbers(values) and any(COMMA_DECIMAL.match(value) for value in values)
+            for values in column_values.values()
+        )
+        if comma_numbers and 'number' not in kinds:
+            decimal = ','
+
+    text_columns, date_columns = [], []
+    for name, values in column_values.items():
+        kinds = {_kind(value) for value in values}
+        if kinds == {'date'}:
+            date_columns.append(name)
+        elif 'text' in kinds and not (decimal == ',' and _comma_numbers(values)):
+            text_columns.append(name)
+
+    return CSVPlan(encoding, delimiter, quotechar=quotechar, header=header, columns=columns,
+                   text_columns=text_columns, date_columns=date_columns, skipped_columns=skipped_columns,
+                   decimal=decimal)
+
+
+def _comma_numbers(values):
+    """Whether all the values are integers or numbers with a decimal comma"""
+    return all(COMMA_DECIMAL.match(value) or INTEGER.match(value) for value in values)
+
+
+def _header_names(row):
+    """Column names as pandas gives them, so hints match the columns read"""
+    names = []
+    seen = {}
+    for index, name in enumerate(row):
+        name = name if name.strip() else f'Unnamed: {index}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
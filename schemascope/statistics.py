@@ -0,0 +1,141 @@
+# schemascope/statistics.py
+import math
+import datetime
+import numpy as np
+import pandas as pd
+from .models import ColumnStatistics
+
+
+# Quantiles saved for numbers and dates, as probabilities
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Buckets of an equi-depth histogram; buckets with equal bounds are combined
+HISTOGRAM_BUCKETS = 10
+
+# Most frequent values saved per column
+TOP_VALUES = 10
+
+
+def json_value(value):
+    """A value as it can be stored in a JSONField"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, datetime.date):
+        return str(value)
+    if isinstance(value, (list, dict, str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _from_sample(value, is_date):
+    # Dates are sampled as nanoseconds since the epoch
+    return str(pd.Timestamp(int(value))) if is_date else json_value(float(value))
+
+
+def _to_sample(value, is_date):
+    return float(pd.Timestamp(value).value) if is_date else float(value)
+
+
+def histogram(column, buckets=HISTOGRAM_BUCKETS):
+    """
+    Equi-depth histogram of a column's numbers or dates: bucket bounds are
+    quantiles, so each bucket holds about the same number of values. Counts
+    are scaled up from the sample to the column's non-null values.
+
+    Returns:
+        List of {'low', 'high', 'count'} dictionaries, or None
+    """
+    sample = column.value_sample
+    if sample is None or not len(sample.values):
+        return None
+    is_date = column.dtype.kind == 'M'
+    edges = sample.quantiles(np.linspace(0, 1, buckets + 1))
+    if column.comparable and column.min is not None:
+        # The sample may miss the extremes, which are known exactly
+        edges[0], edges[-1] = _to_sample(column.min, is_date), _to_sample(column.max, is_date)
+    edges = np.unique(edges)
+    non_null = column.count - column.null_count
+    if len(edges) == 1:
+        value = _from_sample(edges[0], is_date)
+        return [{'low': value, 'high': value, 'count': non_null}]
+
+    counts, edges = np.histogram(sample.values, bins=edges)
+    scale = non_null / len(sample.values)
+    return [
+        {
+            'low': _from_sample(low, is_date),
+            'high': _from_sample(high, is_date),
+            'count': int(round(count * scale)),
+        }
+        for low, high, count in zip(edges[:-1], edges[1:], counts)
+    ]
+
+
+def column_statistics(column):
+    """
+    Summarize a profiled column.
+
+    Args:
+        column: profiling.ColumnProfile
+
+    Returns:
+        Dictionary of ColumnStatistics field values
+    """
+    non_null = column.count - column.null_count
+    statistics = {
+        'null_count': column.null_count,
+        'null_ratio': column.null_count / column.count if column.count else 0.0,
+        'distinct_count': column.distinct_count,
+        'min_value': json_value(column.min),
+        'max_value': json_value(column.max),
+        'top_values': [],
+    }
+
+    if column.moments is not None and column.moments[0]:
+        count, mean, squares = column.moments
+        statistics['mean'] = json_value(float(mean))
+        statistics['std'] = json_value(math.sqrt(squares / (count - 1)) if count > 1 else 0.0)
+
+    sample = column.value_sample
+    if sample is not None and len(sample.values):
+        is_date = column.dtype.kind == 'M'
+        statistics['quantiles'] = {
+            f'p{round(probability * 100)}': _from_sample(value, is_date)
+            for probability, value in zip(QUANTILES, sample.quantiles(QUANTILES))
+        }
+        statistics['histogram'] = histogram(column)
+
+    if column.frequent is not None and non_null:
+        # Counts are lower bounds; a value is only listed if it is known to be
+        # more than half as frequent as its count, and seen more than once
+        error = column.frequent.error
+        statistics['top_values'] = [
+            [json_value(value), count]
+            for value, count in column.frequent.most_common(TOP_VALUES)
+            if count > 1 and count > error
+        ]
+
+    if column.lengths is not None:
+        count, shortest, longest, total = column.lengths
+        statistics.update(min_length=shortest, max_length=longest, mean_length=total / count)
+
+    return statistics
+
+
+def save_statistics(schema, profile, sample=None):
+    """
+    Store the statistics of each column of a profiled file.
+
+    Args:
+        schema: SchemaDefinition the profile was saved as
+        profile: TableProfile of the schema's file
+        sample: Optional sampling.SampleSummary, when the profile is of a
+            sample of the file's rows
+    """
+    statistics = []
+    for position, (name, column) in enumerate(profile.columns.items()):
+        values = column_statistics(column)
+        if sample is not None:
+            values.update(sample.column_statistics(name, column))
+        statistics.append(ColumnStatistics(schema=schema, column_name=name, position=position, **values))
+    ColumnStatistics.objects.bulk_create(statistics)
@@ -1,3 +1,552 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from . import cache, keys, sketches, sniffing
+from .cache import CacheWriter
+from .ingest import CustomJSONEncoder, FrameReader, IngestError, profile_reader
+from .jobs import claim_next_job, enqueue_ingest, run_job
+from .jsonstream import READ_SIZE, JSONStream, JSONStreamError
+from .keys import find_composite_keys, search_lattice
+from .lineage import diff_versions, record_lineage
+from .models import DataSource, IngestJob, LineageColumn, QualityRule, SchemaChange, SchemaDefinition
+from .profiling import ColumnProfile, TableProfile, profile_chunks, promote_dtype
+from .sketches import (
+    DistinctHashes, FrequentValues, KMVSketch, QuantileSample, estimate_jaccard, exact_distinct_counts, hash_values
+)
+from .sniffing import CSVPlan, detect_delimiter, detect_header, detect_quotechar, sniff_csv
 
-# Create your tests here.
+
+def profiled(df):
+    """A reader for a DataFrame and its profile, with exact distinct counts where they matter"""
+    reader = FrameReader(df)
+    profile = profile_chunks(reader.chunks())
+    profile.verify_distinct_counts(reader)
+    return reader, profile
+
+
+class CompositeKeyTests(SimpleTestCase):
+    def test_finds_two_column_key(self):
+        df = pd.DataFrame({
+            'order_id': np.repeat(np.arange(500), 4),
+            'line': np.tile(np.arange(4), 500),
+            'product': np.arange(2000) // 2 % 5,
+        })
+        reader, profile = profiled(df)
+        self.assertEqual(find_composite_keys(reader, profile), [(['order_id', 'line'], 1.0)])
+
+    def test_no_key_when_rows_repeat(self):
+        df = pd.DataFrame({'a': [1, 1, 2, 2, 1], 'b': [1, 2, 1, 2, 1]})
+        reader, profile = profiled(df)
+        self.assertEqual(find_composite_keys(reader, profile), [])
+
+    def test_lattice_keeps_minimal_keys_only(self):
+        sample = pd.DataFrame({'a': [1, 1, 2, 2], 'b': [1, 2, 1, 2], 'c': [1, 1, 1, 2]})
+        self.assertEqual(search_lattice(sample, ['a', 'b', 'c']), [('a', 'b')])
+
+    @mock.patch.object(keys, 'KEY_SAMPLE_ROWS', 2000)
+    def test_column_unique_on_sample_still_combined(self):
+        # A timestamp that repeats only for a few rows, which the sample
+        # misses, and is a key together with the device
+        rows = 100000
+        ts = np.arange(rows)
+        repeated = np.arange(1000, rows, 10000)
+        ts[repeated] = ts[repeated - 1]
+        device = np.arange(rows) % 3
+        device[repeated] = (device[repeated - 1] + 1) % 3
+        df = pd.DataFrame({'ts': ts, 'device': device})
+        reader, profile = profiled(df)
+
+        self.assertEqual(profile.columns['ts'].distinct_count, rows - len(repeated))
+        sample = keys._sample(reader, ['ts', 'device'], rows)
+        self.assertTrue(sample['ts'].is_unique)
+        self.assertEqual(find_composite_keys(reader, profile), [(['ts', 'device'], 1.0)])
+
+
+class KMVSketchTests(SimpleTestCase):
+    def test_exact_below_size(self):
+        sketch = KMVSketch(size=64)
+        sketch.update(pd.Series(np.arange(50).repeat(3)))
+        self.assertTrue(sketch.is_exact)
+        self.assertEqual(sketch.estimate(), 50)
+        self.assertEqual(sketch.bounds(), (50, 50))
+
+    def test_estimate_within_bounds_above_size(self):
+        for distinct in (1000, 20000, 200000):
+            sketch = KMVSketch(size=256)
+            sketch.update(pd.Series(np.arange(distinct)))
+            self.assertFalse(sketch.is_exact)
+            low, high = sketch.bounds()
+            self.assertLessEqual(low, distinct)
+            self.assertGreaterEqual(high, distinct)
+            self.assertLess(abs(sketch.estimate() - distinct) / distinct, 0.2)
+
+    def test_merged_chunks_match_whole_column(self):
+        values = pd.Series(np.random.default_rng(1).integers(0, 5000, 20000))
+        whole = KMVSketch(size=128)
+        whole.update(values)
+        merged = KMVSketch(size=128)
+        for start in range(0, len(values), 3000):
+            chunk = KMVSketch(size=128)
+            chunk.update(values[start:start + 3000])
+            merged.merge(chunk)
+        np.testing.assert_array_equal(merged.hashes, whole.hashes)
+
+    def test_numbers_hash_by_value(self):
+        np.testing.assert_array_equal(hash_values(pd.Series([1, 2])), hash_values(pd.Series([1.0, 2.0])))
+
+    def test_jaccard(self):
+        a, b = KMVSketch(size=512), KMVSketch(size=512)
+        a.update(pd.Series(np.arange(0, 100)))
+        b.update(pd.Series(np.arange(50, 150)))
+        self.assertAlmostEqual(estimate_jaccard(a, b), 50 / 150)
+
+
+
+class DistinctHashesTests(SimpleTestCase):
+    @mock.patch.object(sketches, 'DISTINCT_MERGE_SIZE', 100)
+    def test_matches_set_across_merges(self):
+        rng = np.random.default_rng(5)
+        hashes = DistinctHashes()
+        seen = set()
+        for part in range(30):
+            chunk = rng.integers(0, 5000, 300).astype(np.uint64)
+            expected = np.fromiter((value in seen for value in chunk.tolist()), dtype=bool, count=len(chunk))
+            np.testing.assert_array_equal(hashes.contains(chunk), expected)
+            hashes.add(chunk)
+            seen.update(chunk.tolist())
+        self.assertEqual(len(hashes), len(seen))
+        np.testing.assert_array_equal(hashes.values(), np.array(sorted(seen), dtype=np.uint64))
+
+    def test_exact_distinct_counts(self):
+        chunks = [pd.DataFrame({'a': [1, 2, None], 'b': ['x', 'x', 'y']}), pd.DataFrame({'a': [2, 3], 'b': ['z', 'x']})]
+        self.assertEqual(exact_distinct_counts(chunks, ['a', 'b']), {'a': 3, 'b': 3})
+
+
+class JSONStreamTests(SimpleTestCase):
+    def test_values_split_across_reads(self):
+        records = [{'n': index, 'text': 'x' * (index % 50), 'value': -1.5e-3 * index} for index in range(20000)]
+        stream = JSONStream(io.StringIO(json.dumps(records)))
+        self.assertEqual(list(stream), records)
+        self.assertEqual(stream.kind, 'array')
+
+    def test_stops_at_invalid_item(self):
+        f = io.StringIO('[{"a": 1}, {bad}, ' + '{"b": 2}, ' * 100000 + '{"b": 2}]')
+        stream = JSONStream(f)
+        with self.assertRaises(JSONStreamError):
+            list(stream)
+        # Only the first read, not the rest of the file
+        self.assertEqual(f.tell(), READ_SIZE)
+
+    def test_item_size_limit(self):
+        stream = JSONStream(io.StringIO('[{"a": "' + 'x' * (4 * READ_SIZE) + '"}]'), max_item_size=READ_SIZE)
+        with self.assertRaisesMessage(JSONStreamError, 'larger than'):
+            list(stream)
+
+
+class ChunkListReader:
+    """Chunk reader over prepared DataFrames, optionally failing part way"""
+
+    def __init__(self, chunks, error=None):
+        self._chunks = chunks
+        self.error = error
+
+    def chunks(self, usecols=None):
+        for chunk in self._chunks:
+            yield chunk if usecols is None else chunk[usecols]
+        if self.error is not None:
+            raise self.error
+
+    def fallback(self):
+        return None
+
+
+class CacheWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.writer = CacheWriter(mock.Mock(), os.path.join(self.directory, 'cache.parquet'))
+
+    def cache(self, chunks):
+        profile, reader = profile_reader(ChunkListReader(chunks), cache=self.writer)
+        cached = self.writer.finish(profile)
+        self.assertEqual(os.listdir(self.directory), ['cache.parquet'])
+        return pd.concat(list(cached.chunks()), ignore_index=True)
+
+    def test_written_while_profiling(self):
+        chunks = [pd.DataFrame({'n': [1, 2], 'label': ['a', 'b']}), pd.DataFrame({'n': [3], 'label': ['c']})]
+        with mock.patch.object(self.writer, '_rewrite') as rewrite:
+            cached = self.cache(chunks)
+        rewrite.assert_not_called()
+        pd.testing.assert_frame_equal(cached, pd.concat(chunks, ignore_index=True))
+
+    def test_widened_columns_rewritten(self):
+        cached = self.cache([
+            pd.DataFrame({'n': [1, 2], 'code': [10, 20]}),
+            pd.DataFrame({'n': [np.nan, 4.0], 'code': ['x', None]}),
+            # A column the earlier chunks did not have
+            pd.DataFrame({'n': [5], 'code': [30], 'extra': ['y']}),
+        ])
+        self.assertEqual(cached['n'].tolist()[3:], [4.0, 5.0])
+        self.assertTrue(np.isnan(cached['n'][2]))
+        self.assertEqual(cached['code'].tolist(), ['10', '20', 'x', None, '30'])
+        self.assertEqual(cached['extra'].tolist()[4], 'y')
+        self.assertEqual(cached['extra'].isna().sum(), 4)
+
+    def test_discarded_when_parsing_fails(self):
+        reader = ChunkListReader([pd.DataFrame({'n': [1, 2]})], error=ValueError('bad row'))
+        with self.assertRaises(IngestError):
+            profile_reader(reader, cache=self.writer)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertIsNone(self.writer.finish(profile_chunks([pd.DataFrame({'n': [1, 2]})])))
+
+
+class SniffingTests(SimpleTestCase):
+    def sniff(self, data):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+        return f.name, sniff_csv(f.name)
+
+    def read(self, path, plan):
+        return pd.read_csv(path, delimiter=plan.delimiter, encoding=plan.encoding, **plan.read_options())
+
+    def test_detect_delimiter(self):
+        self.assertEqual(detect_delimiter(['a;b;c', '1;2,5;3', '4;5;6']), ';')
+        self.assertEqual(detect_delimiter(['a\tb', '1\t2']), '\t')
+        self.assertEqual(detect_delimiter(['a|b,c', '1|2,3', '4|5,6']), ',')
+        # Nothing splits the lines
+        self.assertEqual(detect_delimiter(['value', '1', '2']), ',')
+
+    def test_detect_header(self):
+        self.assertTrue(detect_header([['id', 'price'], ['1', '2.5'], ['2', '3']]))
+        self.assertFalse(detect_header([['1', '2.5'], ['2', '3'], ['3', '4']]))
+        # Text columns have no say, so the first row is taken as a header
+        self.assertTrue(detect_header([['a', 'b'], ['c', 'd']]))
+
+    def test_detect_quotechar(self):
+        self.assertEqual(detect_quotechar("id,name\n1,'Smith, J'\n", ','), "'")
+        self.assertEqual(detect_quotechar('id,name\n1,"Smith, J"\n', ','), '"')
+        self.assertEqual(detect_quotechar("id,decade\n1,'90s\n", ','), '"')
+
+    def test_read_options(self):
+        self.assertEqual(CSVPlan('utf-8', ',').read_options(), {})
+        plan = CSVPlan('utf-8', ';', quotechar="'", header=False, columns=['a', 'b', 'c'],
+                       text_columns=['a'], date_columns=['b'], skipped_columns=['c'], decimal=',')
+        self.assertEqual(plan.read_options(), {
+            'quotechar': "'", 'decimal': ',', 'header': None, 'names': ['a', 'b', 'c'],
+            'dtype': {'a': str}, 'parse_dates': ['b'], 'usecols': ['a', 'b'],
+        })
+
+    def test_semicolon_with_decimal_comma(self):
+        path, plan = self.sniff(b'id;price;name\n1;2,50;apple\n2;10;pear\n3;0,75;plum\n')
+        self.assertEqual((plan.delimiter, plan.decimal, plan.text_columns), (';', ',', ['name']))
+        df = self.read(path, plan)
+        self.assertEqual(df['price'].tolist(), [2.5, 10.0, 0.75])
+
+    def test_decimal_point_wins(self):
+        path, plan = self.sniff(b'id;a;b\n1;2,5;1.5\n2;3,5;2.5\n')
+        self.assertEqual(plan.decimal, '.')
+        self.assertEqual(plan.text_columns, ['a'])
+
+    def test_headerless_numbers(self):
+        path, plan = self.sniff(b'1,2.5,3\n4,5.5,6\n7,8.5,9\n')
+        self.assertFalse(plan.header)
+        self.assertEqual(plan.columns, ['column_1', 'column_2', 'column_3'])
+        df = self.read(path, plan)
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df['column_2'].tolist(), [2.5, 5.5, 8.5])
+
+    def test_trailing_delimiter(self):
+        path, plan = self.sniff(b'id,name,\n1,a,\n2,b,\n')
+        self.assertEqual(plan.skipped_columns, ['Unnamed: 2'])
+        self.assertEqual(list(self.read(path, plan).columns), ['id', 'name'])
+
+    def test_single_quoted_fields(self):
+        path, plan = self.sniff(b"id,name\n1,'Smith, J'\n2,'Jones, K'\n")
+        self.assertEqual(plan.quotechar, "'")
+        self.assertEqual(self.read(path, plan)['name'].tolist(), ['Smith, J', 'Jones, K'])
+
+    def test_byte_order_mark(self):
+        path, plan = self.sniff(b'\xef\xbb\xbfid,when\n1,2024-01-02\n2,2024-03-04\n')
+        self.assertEqual(plan.encoding, 'utf-8-sig')
+        self.assertEqual((plan.columns, plan.date_columns), (['id', 'when'], ['when']))
+        self.assertEqual(self.read(path, plan)['when'].dt.month.tolist(), [1, 3])
+
+    @mock.patch.object(sniffing, 'SNIFF_BYTES', 64)
+    def test_sample_cut_mid_line(self):
+        data = b'id,when\n' + b''.join(b'%d,2024-01-%02d\n' % (day, day + 1) for day in range(9))
+        # The sample ends part way through a date, which alone would read as text
+        self.assertTrue(data[:64].endswith(b'\n4,20'))
+        path, plan = self.sniff(data)
+        self.assertEqual((plan.delimiter, plan.header, plan.columns), (',', True, ['id', 'when']))
+        self.assertEqual((plan.date_columns, plan.text_columns), (['when'], []))
+        self.assertEqual(len(self.read(path, plan)), 9)
+
+
+class FrequentValuesTests(SimpleTestCase):
+    def test_exact_with_few_values(self):
+        summary = FrequentValues(size=8)
+        summary.update(pd.Series(['a'] * 5 + ['b'] * 3 + ['c']))
+        self.assertEqual(summary.most_common(), [('a', 5), ('b', 3), ('c', 1)])
+        self.assertEqual(summary.error, 0)
+
+    def test_counts_within_error_across_chunks(self):
+        rng = np.random.default_rng(2)
+        # Three frequent values among many rare ones
+        values = np.concatenate([np.repeat([1, 2, 3], [3000, 2000, 1000]), rng.integers(100, 5000, 6000)])
+        rng.shuffle(values)
+        true_counts = pd.Series(values).value_counts()
+
+        summary = FrequentValues(size=16)
+        for start in range(0, len(values), 1000):
+            chunk = FrequentValues(size=16)
+            chunk.update(pd.Series(values[start:start + 1000]))
+            summary.merge(chunk)
+
+        self.assertLessEqual(summary.error, len(values) / 17)
+        self.assertEqual([value for value, count in summary.most_common(3)], [1, 2, 3])
+        for value, count in summary.most_common():
+            self.assertLessEqual(count, true_counts[value])
+            self.assertGreaterEqual(count, true_counts[value] - summary.error)
+
+
+class QuantileSampleTests(SimpleTestCase):
+    def test_exact_up_to_size(self):
+        sample = QuantileSample(size=100)
+        sample.update(np.arange(60, dtype=float))
+        sample.update(np.arange(60, 100, dtype=float))
+        self.assertTrue(sample.is_exact)
+        self.assertEqual(sample.quantiles([0.5])[0], np.median(np.arange(100)))
+
+    def test_bounded_and_repeatable(self):
+        values = np.random.default_rng(3).normal(size=50000)
+        samples = []
+        for repeat in range(2):
+            sample = QuantileSample(size=500)
+            for start in range(0, len(values), 7000):
+                sample.update(values[start:start + 7000])
+            samples.append(sample)
+        self.assertEqual(len(samples[0].values), 500)
+        self.assertFalse(samples[0].is_exact)
+        np.testing.assert_array_equal(samples[0].values, samples[1].values)
+        self.assertLess(abs(samples[0].quantiles([0.5])[0]), 0.15)
+
+    def test_merge_keeps_smallest_priorities(self):
+        a, b = QuantileSample(size=50), QuantileSample(size=50)
+        a.update(np.arange(100, dtype=float))
+        b.update(np.arange(100, 200, dtype=float))
+        priorities = np.concatenate([a.priorities, b.priorities])
+        a.merge(b)
+        self.assertEqual(a.seen, 200)
+        np.testing.assert_array_equal(np.sort(a.priorities), np.sort(priorities)[:50])
+
+
+class ChunkedProfileTests(SimpleTestCase):
+    def chunks(self):
+        rng = np.random.default_rng(4)
+        return [
+            pd.DataFrame({'n': rng.integers(0, 100, 500), 'x': rng.normal(size=500), 'label': 'a'}),
+            pd.DataFrame({'n': [np.nan] * 10 + list(range(490)), 'x': rng.normal(size=500), 'label': 'b'}),
+            pd.DataFrame({'n': rng.integers(0, 100, 500), 'x': rng.normal(size=500), 'label': 7}),
+        ]
+
+    def test_dtype_promotion(self):
+        self.assertEqual(promote_dtype(np.dtype('int64'), np.dtype('float64')), np.dtype('float64'))
+        self.assertEqual(promote_dtype(np.dtype('int64'), np.dtype('object')), np.dtype('object'))
+        self.assertEqual(promote_dtype(np.dtype('bool'), np.dtype('float64')), np.dtype('object'))
+        self.assertEqual(promote_dtype(None, np.dtype('int64')), np.dtype('int64'))
+
+    def test_chunks_match_whole_table(self):
+        chunks = self.chunks()
+        profile = profile_chunks(chunks)
+        whole = pd.concat(chunks, ignore_index=True)
+
+        self.assertEqual(profile.row_count, 1500)
+        self.assertEqual(profile.columns['n'].dtype, np.dtype('float64'))
+        self.assertEqual(profile.columns['n'].null_count, 10)
+        self.assertEqual(profile.columns['label'].dtype, np.dtype('object'))
+        self.assertEqual(profile.columns['n'].distinct_count, whole['n'].nunique())
+
+        count, mean, squares = profile.columns['x'].moments
+        self.assertEqual(count, 1500)
+        self.assertAlmostEqual(mean, whole['x'].mean())
+        self.assertAlmostEqual(squares / count, whole['x'].var(ddof=0))
+
+    def test_merged_column_profiles_match(self):
+        chunks = self.chunks()
+        merged = ColumnProfile('x')
+        for chunk in chunks:
+            part = ColumnProfile('x')
+            part.update(chunk['x'])
+            merged.merge(part)
+        whole = profile_chunks(chunks).columns['x']
+        self.assertEqual((merged.count, merged.min, merged.max), (whole.count, whole.min, whole.max))
+        for merged_moment, whole_moment in zip(merged.moments, whole.moments):
+            self.assertAlmostEqual(merged_moment, whole_moment)
+        np.testing.assert_array_equal(merged.distinct.hashes, whole.distinct.hashes)
+
+    def test_state_round_trip_then_append(self):
+        chunks = self.chunks()
+        saved = json.loads(json.dumps(profile_chunks(chunks[:2]).to_state(), cls=CustomJSONEncoder))
+        appended = profile_chunks(chunks[2:], TableProfile.from_state(saved))
+        self.assertEqual(appended.to_state(), profile_chunks(chunks).to_state())
+
+
+class IngestedSourceTestCase(TestCase):
+    """A small CSV data source, uploaded and run through schema detection"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patched = mock.patch.object(cache, 'CACHE_DIR', media)
+        patched.start()
+        self.addCleanup(patched.stop)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        data = b'id;code\n1;a\n2;b\n2;c\n'
+        self.datasource = DataSource.objects.create(
+            original_filename='orders.csv', canonical_name='orders', user=self.user,
+            file=SimpleUploadedFile('orders.csv', data), content_size=len(data),
+        )
+        enqueue_ingest(self.datasource, {'file_type': 'csv', 'delimiter': ';', 'encoding': 'utf-8'})
+        self.assertEqual(self.run_next(), 'succeeded')
+        self.client.force_login(self.user)
+
+    def run_next(self):
+        job = claim_next_job()
+        return run_job(job.pk, job.attempts)
+
+
+class ValidationJobTests(IngestedSourceTestCase):
+    """Quality rules are checked by a queued job rather than in the request"""
+
+    def test_added_rule_checked_by_job(self):
+        response = self.client.post(reverse('schemascope:add_quality_rule', args=[self.datasource.pk]),
+                                    {'column_name': 'id', 'rule_type': 'unique'})
+        job = IngestJob.objects.latest('id')
+        self.assertRedirects(response, reverse('schemascope:job_detail', args=[job.pk]),
+                             fetch_redirect_response=False)
+        self.assertTrue(job.is_validation)
+        self.assertEqual(job.options['delimiter'], ';')
+        rule = QualityRule.objects.get()
+        self.assertFalse(hasattr(rule, 'result'))
+
+        self.assertEqual(self.run_next(), 'succeeded')
+        rule = QualityRule.objects.select_related('result').get()
+        self.assertEqual((rule.result.rows_checked, rule.result.failed_count), (3, 1))
+        job.refresh_from_db()
+        self.assertEqual([stage['key'] for stage in job.get_stages()], ['validation'])
+
+    def test_nothing_queued_without_rules(self):
+        response = self.client.post(reverse('schemascope:run_quality_checks', args=[self.datasource.pk]))
+        self.assertRedirects(response, reverse('schemascope:datasource_detail', args=[self.datasource.pk]),
+                             fetch_redirect_response=False)
+        self.assertFalse(IngestJob.objects.filter(options__validate_only=True).exists())
+
+
+class ReprocessTests(IngestedSourceTestCase):
+    def test_new_version_keeps_content_hash(self):
+        self.datasource.refresh_from_db()
+        self.assertTrue(self.datasource.content_hash)
+        self.client.post(reverse('schemascope:reprocess_file', args=[self.datasource.pk]),
+                         {'file_type': 'csv', 'create_new_version': 'on', 'delimiter_preset': 'auto'})
+        version = DataSource.objects.get(schema_version=2)
+        self.assertEqual((version.content_hash, version.content_size),
+                         (self.datasource.content_hash, self.datasource.content_size))
+
+
+class LineageTests(TestCase):
+    """Versions of one canonical name keyed and diffed against each other"""
+
+    VERSIONS = [
+        {'id': 'int64', 'customer_name': 'object', 'amount': 'float64'},
+        # customer_name renamed and region added
+        {'id': 'int64', 'customer_nm': 'object', 'amount': 'float64', 'region': 'object'},
+        # amount removed
+        {'id': 'int64', 'customer_nm': 'object', 'region': 'object'},
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        start = timezone.now() - timedelta(days=3)
+        self.versions = []
+        for number, columns in enumerate(self.VERSIONS, 1):
+            datasource = DataSource.objects.create(original_filename=f'orders_v{number}.csv', canonical_name='orders',
+                                                   schema_version=number, user=self.user)
+            DataSource.objects.filter(pk=datasource.pk).update(upload_date=start + timedelta(days=number))
+            SchemaDefinition.objects.create(data_source=datasource, column_definitions={
+                name: {'type': column_type} for name, column_type in columns.items()
+            })
+            self.versions.append(DataSource.objects.get(pk=datasource.pk))
+
+    def changes(self, datasource):
+        return {
+            change.change_type: (change.details, change.previous_version_id)
+            for change in SchemaChange.objects.filter(source=datasource)
+        }
+
+    def keys(self, datasource):
+        return dict(LineageColumn.objects.filter(schema__data_source=datasource).values_list('name', 'key'))
+
+    def assertLineage(self):
+        v1, v2, v3 = self.versions
+        self.assertEqual(list(self.changes(v1)), ['initial'])
+        self.assertEqual(self.changes(v2), {
+            'add_column': ({'columns': ['region']}, v1.pk),
+            'rename_column': ({'renames': [{'from': 'customer_name', 'to': 'customer_nm', 'score': mock.ANY}]}, v1.pk),
+        })
+        self.assertEqual(self.changes(v3), {'remove_column': ({'columns': ['amount']}, v2.pk)})
+
+        keys = [self.keys(version) for version in self.versions]
+        self.assertEqual(keys[0]['customer_name'], keys[2]['customer_nm'])
+        self.assertEqual(keys[1]['region'], keys[2]['region'])
+        self.assertEqual(len({key for version in keys for key in version.values()}), 4)
+
+        diff = diff_versions(v1.schema, v3.schema)
+        self.assertEqual(diff, {
+            'added': ['region'],
+            'removed': ['amount'],
+            'renamed': [{'from': 'customer_name', 'to': 'customer_nm'}],
+            'type_changes': [],
+            'common': ['id', 'customer_nm'],
+        })
+
+    def test_versions_in_order(self):
+        for version in self.versions:
+            record_lineage(version)
+        self.assertLineage()
+        self.assertEqual(
+            list(DataSource.objects.order_by('lineage_position').values_list('schema_version', flat=True)), [1, 2, 3]
+        )
+
+    def test_older_version_recorded_last(self):
+        # A retry of the second upload finishing after the third
+        v1, v2, v3 = self.versions
+        record_lineage(v1)
+        record_lineage(v3)
+        self.assertEqual(set(self.changes(v3)), {'add_column', 'rename_column', 'remove_column'})
+        record_lineage(v2)
+        self.assertLineage()
+
+    def test_type_change_between_ends(self):
+        SchemaDefinition.objects.filter(data_source=self.versions[2]).update(column_definitions={
+            'id': {'type': 'object'}, 'customer_nm': {'type': 'object'}, 'region': {'type': 'object'},
+        })
+        for version in self.versions:
+            record_lineage(version)
+        self.assertEqual(diff_versions(self.versions[0].schema, self.versions[2].schema)['type_changes'],
+                         [{'column': 'id', 'from': 'int64', 'to': 'object'}])
@@ -0,0 +1,83 @@
+# schemascope/uploads.py
+import os
+import hashlib
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+from .cache import HASH_BLOCK_SIZE
+
+
+# Uploads are stored under their content hash, so identical files are stored once
+CONTENT_STORE = 'uploads/content'
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of each uploaded file as its chunks arrive and
+    passes the chunks on to Django's usual handlers, so duplicates can be
+    found without reading the file again. The hex digests are left in
+    request.upload_hashes, keyed by form field name.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digest = None
+        request.upload_hashes = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_hashes[self.field_name] = self.digest.hexdigest()
+        # The next handler builds the file object
+        return None
+
+
+def store_upload(uploaded_file, content_hash):
+    """
+    Save an uploaded file to the content-addressed store, unless the same
+    bytes are already there.
+
+    Args:
+        uploaded_file: The UploadedFile
+        content_hash: SHA-256 hex digest of its content
+
+    Returns:
+        Storage name of the stored file
+    """
+    # The extension is kept, as file types can be detected from it
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    name = f'{CONTENT_STORE}/{content_hash[:2]}/{content_hash}{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, uploaded_file)
+    return name
+
+
+def is_appended(datasource, uploaded_file):
+    """
+    Whether an uploaded file is the data source's file with more lines
+    added to the end: it starts with exactly the same bytes, ending at a
+    line break. Only that many bytes of the upload are read.
+    """
+    size = datasource.content_size
+    if not size or not datasource.content_hash or size >= uploaded_file.size:
+        return False
+
+    digest = hashlib.sha256()
+    remaining = size
+    last = b''
+    uploaded_file.seek(0)
+    while remaining:
+        block = uploaded_file.read(min(HASH_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+        last = block[-1:]
+    uploaded_file.seek(0)
+
+    return not remaining and last == b'\n' and digest.hexdigest() == datasource.content_hash
@@ -8,10 +8,18 @@ urlpatterns = [
     path('upload/', views.upload, name='upload'),
     path('datasource/<int:pk>/', views.datasource_detail, name='datasource_detail'),
     path('schemas/', views.schema_list, name='schema_list'),
+    path('schemas/api/', views.catalog_api, name='catalog_api'),
     path('compare/<int:pk1>/<int:pk2>/', views.compare_schemas, name='compare_schemas'),
+    path('lineage/<int:pk>/', views.lineage_detail, name='lineage_detail'),
     path('datasource/<int:pk>/retry/', views.retry_detection, name='retry_detection'),
     path('datasource/<int:pk>/reprocess/', views.reprocess_file, name='reprocess_file'),
     path('datasource/<int:pk>/delete/', views.delete_datasource, name='delete_datasource'),
     path('datasource/<int:pk>/preview/', views.file_preview, name='file_preview'),
     path('datasource/<int:pk>/reanalyze/', views.reanalyze_file, name='reanalyze_file'),
+    path('datasource/<int:pk>/rules/add/', views.add_quality_rule, name='add_quality_rule'),
+    path('datasource/<int:pk>/rules/<int:rule_pk>/delete/', views.delete_quality_rule, name='delete_quality_rule'),
+    path('datasource/<int:pk>/rules/check/', views.run_quality_checks, name='run_quality_checks'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/retry/', views.retry_ingest_job, name='retry_ingest_job'),
 ]
\ No newline at end of file
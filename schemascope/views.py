@@ -7,11 +7,18 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.urls import reverse
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from .models import DataSource, SchemaDefinition, PrimaryKeyCandidate, SchemaChange, SchemaRelationship
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .models import DataSource, SchemaDefinition, PrimaryKeyCandidate, SchemaChange, SchemaRelationship, IngestJob, Lineage, QualityRule
 from .forms import DataSourceUploadForm
-from fuzzywuzzy import fuzz
-from django.core.serializers.json import DjangoJSONEncoder
+from .cache import cached_reader, remove_cache
+from .catalog import catalog_page, catalog_column_types, decode_catalog_cursor, invalidate_catalog
+from .ingest import processing_options, csv_plan
+from .jobs import enqueue_ingest, enqueue_validation, retry_job
+from .lineage import diff_versions, rebuild_lineage
+from .preview import head_lines, json_preview
+from .quality import rule_parameters
+from .sniffing import sniff_encoding
+from .uploads import HashingUploadHandler, store_upload, is_appended
 
 def get_schemascope_nav_context(active_tab='Home'):
     """Return navigation context for SchemaScope templates"""
@@ -40,83 +47,64 @@ def home(request):
 
     return render(request, 'schemascope/home.html', context)
 
+@csrf_exempt
 def upload(request):
+    # Uploads are hashed as they stream in, so the handler has to be in
+    # place before the request body is read, which CSRF checking does
+    request.upload_handlers.insert(0, HashingUploadHandler(request))
+    return _upload(request)
+
+
+@csrf_protect
+def _upload(request):
     if request.method == 'POST':
         form = DataSourceUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            # Save the uploaded file
+            uploaded_file = request.FILES['file']
+            content_hash = request.upload_hashes['file']
             datasource = form.save(commit=False)
-            datasource.original_filename = request.FILES['file'].name
+            datasource.original_filename = uploaded_file.name
             datasource.user = request.user
-            datasource.save()
 
-            # Check for similar existing files to avoid duplication
-            similar_sources = DataSource.objects.filter(
-                original_filename=datasource.original_filename,
+            sources = DataSource.objects.filter(
+                user=request.user,
                 canonical_name=datasource.canonical_name,
                 source_type=datasource.source_type
-            ).exclude(pk=datasource.pk)
+            ).order_by('-upload_date')
 
-            if similar_sources.exists():
-                # Use the most recent similar source
-                similar_source = similar_sources.order_by('-upload_date').first()
+            # The same bytes already uploaded as this data, under any filename
+            similar_source = sources.filter(content_hash=content_hash).first()
+            if similar_source:
                 messages.info(request, f'Using existing source "{similar_source.original_filename}" '
                                        f'(v{similar_source.schema_version}) instead of creating a duplicate')
-
-                # Delete the new datasource since we're using an existing one
-                datasource.delete()
                 return redirect('schemascope:datasource_detail', pk=similar_source.pk)
 
-            # Get additional processing options
-            file_type = datasource.source_type
-
-            # Process the file based on the type and options
-            success = False
-
-            if file_type == 'csv':
-                delimiter_preset = request.POST.get('delimiter_preset', 'comma')
-                delimiter = ','  # Default
-
-                if delimiter_preset == 'tab':
-                    delimiter = '\t'
-                elif delimiter_preset == 'semicolon':
-                    delimiter = ';'
-                elif delimiter_preset == 'pipe':
-                    delimiter = '|'
-                elif delimiter_preset == 'custom':
-                    custom_delimiter = request.POST.get('delimiter_custom', '')
-                    if custom_delimiter:
-                        delimiter = custom_delimiter
-
-                encoding = request.POST.get('encoding', 'utf-8')
-                success = process_csv_file(datasource, delimiter=delimiter, encoding=encoding)
-
-            elif file_type == 'excel':
-                sheet_name = request.POST.get('sheet_name', '')
-                # If sheet_name is a number, convert to int
-                if sheet_name and sheet_name.isdigit():
-                    sheet_name = int(sheet_name)
-                # If empty, set to 0 (first sheet)
-                elif not sheet_name:
-                    sheet_name = 0
-
-                success = process_excel_file(datasource, sheet_name=sheet_name)
-
-            elif file_type == 'json':
-                encoding = request.POST.get('encoding', 'utf-8')
-                success = process_json_file(datasource, encoding=encoding)
-
-            else:
-                # Default processing
-                success = process_file(datasource)
+            options = processing_options(request.POST, datasource.source_type)
+
+            # Rows appended to the latest upload: only the new rows are profiled
+            latest_source = sources.first()
+            if datasource.source_type == 'csv' and latest_source and is_appended(latest_source, uploaded_file):
+                appended = {'content_hash': latest_source.content_hash, 'size': latest_source.content_size}
+                latest_source.file = store_upload(uploaded_file, content_hash)
+                latest_source.original_filename = uploaded_file.name
+                latest_source.content_hash = content_hash
+                latest_source.content_size = uploaded_file.size
+                latest_source.save()
+
+                job = enqueue_ingest(latest_source, dict(options, append=appended), user=request.user)
+                messages.success(request, f'File "{uploaded_file.name}" adds rows to '
+                                          f'"{latest_source.canonical_name}"; profiling of the new rows has been queued')
+                return redirect('schemascope:job_detail', pk=job.pk)
+
+            datasource.file = store_upload(uploaded_file, content_hash)
+            datasource.content_hash = content_hash
+            datasource.content_size = uploaded_file.size
+            datasource.save()
 
-            if success:
-                messages.success(request, f'File "{datasource.original_filename}" successfully uploaded and schema detected!')
-                return redirect('schemascope:datasource_detail', pk=datasource.pk)
-            else:
-                messages.error(request, f'Error processing file "{datasource.original_filename}"')
-                # Clean up the datasource since we couldn't process it
-                datasource.delete()
+            # Detection runs in the background; see run_ingest_worker
+            job = enqueue_ingest(datasource, options, user=request.user)
+            messages.success(request, f'File "{datasource.original_filename}" uploaded; schema detection has been queued')
+            return redirect('schemascope:job_detail', pk=job.pk)
     else:
         form = DataSourceUploadForm()
 
@@ -133,106 +121,16 @@ def upload(request):
 
 
 
-def process_file(datasource):
-    """
-    Process the uploaded file, detect schema, and identify primary keys
-    """
-    file_path = datasource.file.path
-    _, file_extension = os.path.splitext(file_path)
-
-    # Read the file based on its type
-    try:
-        if file_extension.lower() in ['.xlsx', '.xls']:
-            return process_excel_file(datasource)
-        elif file_extension.lower() == '.csv':
-            return process_csv_file(datasource)
-        elif file_extension.lower() == '.json':
-            return process_json_file(datasource)
-        else:
-            # Unsupported file type
-            return False
-    except Exception as e:
-        # Log the error and continue
-        print(f"Error processing file: {e}")
-        return False
-
-
-def find_related_sources(datasource):
-    """
-    Find potentially related sources based on filename similarity and schema
-    """
-    # Skip if this is the first source
-    if DataSource.objects.count() <= 1:
-        return
-
-    # Get the new source's schema
-    new_schema = SchemaDefinition.objects.get(data_source=datasource)
-    new_columns = set(new_schema.get_columns())
-
-    # Look for existing sources with similar names or schemas
-    existing_sources = DataSource.objects.exclude(pk=datasource.pk)
-
-    for existing in existing_sources:
-        try:
-            existing_schema = SchemaDefinition.objects.get(data_source=existing)
-            existing_columns = set(existing_schema.get_columns())
-
-            # Calculate name similarity
-            name_similarity = fuzz.ratio(datasource.original_filename, existing.original_filename) / 100
-
-            # Calculate schema similarity
-            common_columns = new_columns.intersection(existing_columns)
-            schema_similarity = len(common_columns) / max(len(new_columns), len(existing_columns))
-
-            # Overall similarity is a weighted combination
-            similarity = (name_similarity * 0.4) + (schema_similarity * 0.6)
-
-            # If similarity is above threshold, create a relationship
-            if similarity > 0.5:
-                relationship_type = 'version' if similarity > 0.8 else 'related'
-
-                # Check if this might be a newer version
-                if name_similarity > 0.7 and datasource.upload_date > existing.upload_date:
-                    # Record changes between versions
-                    added_columns = new_columns - existing_columns
-                    removed_columns = existing_columns - new_columns
-
-                    if added_columns:
-                        SchemaChange.objects.create(
-                            source=datasource,
-                            previous_version=existing,
-                            change_type='add_column',
-                            details={'columns': list(added_columns)}
-                        )
-
-                    if removed_columns:
-                        SchemaChange.objects.create(
-                            source=datasource,
-                            previous_version=existing,
-                            change_type='remove_column',
-                            details={'columns': list(removed_columns)}
-                        )
-
-                # Create relationship record
-                SchemaRelationship.objects.create(
-                    source_schema=existing_schema,
-                    target_schema=new_schema,
-                    relationship_type=relationship_type,
-                    source_columns=list(common_columns),
-                    target_columns=list(common_columns),
-                    similarity_score=similarity
-                )
-        except SchemaDefinition.DoesNotExist:
-            continue
-
-
 def datasource_detail(request, pk):
     datasource = get_object_or_404(DataSource, pk=pk, user=request.user)
 
     try:
         schema = SchemaDefinition.objects.get(data_source=datasource)
         primary_keys = PrimaryKeyCandidate.objects.filter(schema=schema)
+        composite_keys = schema.composite_keys.all()
         changes = SchemaChange.objects.filter(source=datasource)
+        statistics = {stats.column_name: stats for stats in schema.statistics.all()}
+        quality_rules = schema.quality_rules.select_related('result', 'reference_source').order_by('column_name', 'pk')
 
         # Get relationships
         outgoing = SchemaRelationship.objects.filter(source_schema=schema)
@@ -242,9 +140,20 @@ def datasource_detail(request, pk):
     except SchemaDefinition.DoesNotExist:
         schema = None
         primary_keys = []
+        composite_keys = []
         changes = []
+        statistics = {}
+        quality_rules = []
         relationships = []
 
+    latest_job = datasource.ingest_jobs.order_by('-created_date', '-id').first()
+
+    # Sources a reference rule can point at
+    reference_sources = (
+        DataSource.objects.filter(user=request.user, schema__isnull=False)
+        .exclude(pk=datasource.pk).only('id', 'original_filename')
+    )
+
     context = get_schemascope_nav_context(active_tab='All Schemas')  # or appropriate tab
     
     # Add view-specific context
@@ -252,8 +161,14 @@ def datasource_detail(request, pk):
         'datasource': datasource,
         'schema': schema,
         'primary_keys': primary_keys,
+        'composite_keys': composite_keys,
         'changes': changes,
+        'statistics': statistics,
+        'quality_rules': quality_rules,
+        'rule_types': QualityRule.RULE_TYPES,
+        'reference_sources': reference_sources,
         'relationships': relationships,
+        'latest_job': latest_job,
         'title': f'Data Source: {datasource.original_filename}'
     })
 
@@ -261,58 +176,146 @@ def datasource_detail(request, pk):
 
 
 def schema_list(request):
-    schemas = SchemaDefinition.objects.all().order_by('-detected_date')
-    
+    """List the user's schemas a page at a time, optionally searching by column name or type"""
+    column = request.GET.get('column', '').strip()
+    column_type = request.GET.get('type', '').strip()
+    cursor = decode_catalog_cursor(request.GET.get('after'))
+
+    schemas, next_cursor = [], None
+    column_types = []
+    if request.user.is_authenticated:
+        schemas, next_cursor = catalog_page(request.user, cursor=cursor, column=column, column_type=column_type)
+        column_types = catalog_column_types(request.user)
+
+    # Query string for the next page link, keeping the current search
+    next_page_query = None
+    if next_cursor:
+        next_params = request.GET.copy()
+        next_params['after'] = next_cursor
+        next_page_query = next_params.urlencode()
+
     # Get navigation context
     context = get_schemascope_nav_context(active_tab='All Schemas')
     
     # Add view-specific context
     context.update({
         'schemas': schemas,
+        'column': column,
+        'column_type': column_type,
+        'column_types': column_types,
+        'is_first_page': cursor is None,
+        'next_page_query': next_page_query,
         'title': 'All Schemas'
     })
     
     return render(request, 'schemascope/schema_list.html', context)
 
+
+def catalog_api(request):
+    """
+    Return a page of the user's schemas as JSON. Takes the same column,
+    type and after parameters as the schema list; 'next' is the after
+    value for the following page.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    schemas, next_cursor = catalog_page(
+        request.user,
+        cursor=decode_catalog_cursor(request.GET.get('after')),
+        column=request.GET.get('column', '').strip(),
+        column_type=request.GET.get('type', '').strip()
+    )
+    for schema in schemas:
+        schema['url'] = reverse('schemascope:datasource_detail', args=[schema['data_source_id']])
+
+    return JsonResponse({'results': schemas, 'next': next_cursor})
+
+
 def compare_schemas(request, pk1, pk2):
     schema1 = get_object_or_404(SchemaDefinition, pk=pk1)
     schema2 = get_object_or_404(SchemaDefinition, pk=pk2)
 
-    # Get column sets
-    columns1 = set(schema1.get_columns())
-    columns2 = set(schema2.get_columns())
-
-    # Find common and different columns
-    common_columns = columns1.intersection(columns2)
-    only_in_schema1 = columns1 - columns2
-    only_in_schema2 = columns2 - columns1
-
-    # Find type differences in common columns
-    type_differences = {}
-    for column in common_columns:
-        type1 = schema1.get_column_type(column)
-        type2 = schema2.get_column_type(column)
-        if type1 != type2:
-            type_differences[column] = {
-                'schema1_type': type1,
-                'schema2_type': type2
-            }
+    # Versions of the same lineage are compared through their column keys,
+    # which follow renamed columns
+    renamed_columns = []
+    diff = diff_versions(schema1, schema2)
+    if diff is not None:
+        renamed_columns = diff['renamed']
+        renamed = {rename['to'] for rename in renamed_columns}
+        common_columns = [column for column in diff['common'] if column not in renamed]
+        only_in_schema1 = diff['removed']
+        only_in_schema2 = diff['added']
+        type_differences = {
+            change['column']: {'schema1_type': change['from'], 'schema2_type': change['to']}
+            for change in diff['type_changes'] if change['column'] not in renamed
+        }
+    else:
+        # Get column sets
+        columns1 = set(schema1.get_columns())
+        columns2 = set(schema2.get_columns())
+
+        # Find common and different columns
+        common_columns = columns1.intersection(columns2)
+        only_in_schema1 = columns1 - columns2
+        only_in_schema2 = columns2 - columns1
+
+        # Find type differences in common columns
+        type_differences = {}
+        for column in common_columns:
+            type1 = schema1.get_column_type(column)
+            type2 = schema2.get_column_type(column)
+            if type1 != type2:
+                type_differences[column] = {
+                    'schema1_type': type1,
+                    'schema2_type': type2
+                }
+
+    # Column statistics, where the schemas were profiled with them
+    statistics1 = {stats.column_name: stats for stats in schema1.statistics.all()}
+    statistics2 = {stats.column_name: stats for stats in schema2.statistics.all()}
 
     context = get_schemascope_nav_context(active_tab='Compare Schemas')
 
     context.update({
         'schema1': schema1,
         'schema2': schema2,
+        'statistics1': statistics1,
+        'statistics2': statistics2,
         'common_columns': common_columns,
         'only_in_schema1': only_in_schema1,
         'only_in_schema2': only_in_schema2,
         'type_differences': type_differences,
+        'renamed_columns': renamed_columns,
         'title': 'Compare Schemas'
     })
 
     return render(request, 'schemascope/compare_schemas.html', context)
 
 
+def lineage_detail(request, pk):
+    """Show the versions of a lineage in order, with the changes each made"""
+    lineage = get_object_or_404(Lineage, pk=pk, user=request.user)
+    versions = list(
+        lineage.versions.filter(lineage_position__isnull=False)
+        .select_related('schema')
+        .prefetch_related('changes')
+        .order_by('lineage_position')
+    )
+    for previous, version in zip(versions, versions[1:]):
+        version.previous = previous
+
+    context = get_schemascope_nav_context(active_tab='All Schemas')
+
+    context.update({
+        'lineage': lineage,
+        'versions': versions,
+        'title': f'Lineage: {lineage.canonical_name}'
+    })
+
+    return render(request, 'schemascope/lineage_detail.html', context)
+
+
 def retry_detection(request, pk):
     datasource = get_object_or_404(DataSource, pk=pk)
 
@@ -323,195 +326,56 @@ def retry_detection(request, pk):
         datasource.source_type = file_type
         datasource.save()
 
-        # Process based on file type
-        if file_type == 'csv':
-            # Get delimiter
-            delimiter_preset = request.POST.get('delimiter_preset')
-            delimiter = ','  # Default
-
-            if delimiter_preset == 'tab':
-                delimiter = '\t'
-            elif delimiter_preset == 'semicolon':
-                delimiter = ';'
-            elif delimiter_preset == 'pipe':
-                delimiter = '|'
-            elif delimiter_preset == 'custom':
-                custom_delimiter = request.POST.get('delimiter_custom')
-                if custom_delimiter:
-                    delimiter = custom_delimiter
-
-            encoding = request.POST.get('encoding', 'utf-8')
-
-            # Call function to process CSV with specific delimiter
-            success = process_csv_file(datasource, delimiter=delimiter, encoding=encoding)
-
-        elif file_type == 'excel':
-            sheet_name = request.POST.get('sheet_name')
-            # If sheet_name is a number, convert to int
-            if sheet_name and sheet_name.isdigit():
-                sheet_name = int(sheet_name)
-            # If empty, set to 0 (first sheet)
-            elif not sheet_name:
-                sheet_name = 0
-
-            success = process_excel_file(datasource, sheet_name=sheet_name)
-
-        elif file_type == 'json':
-            encoding = request.POST.get('encoding', 'utf-8')
-            success = process_json_file(datasource, encoding=encoding)
-
-        else:
-            # Generic processing
-            success = process_file(datasource)
-
-        if success:
-            messages.success(request, f'Successfully detected schema for {datasource.original_filename}')
-        else:
-            messages.error(request, f'Failed to detect schema for {datasource.original_filename}')
+        job = enqueue_ingest(datasource, processing_options(request.POST, file_type), user=request.user)
+        messages.success(request, f'Schema detection for {datasource.original_filename} has been queued')
+        return redirect('schemascope:job_detail', pk=job.pk)
 
     return redirect('schemascope:datasource_detail', pk=datasource.pk)
 
 
-def process_csv_file(datasource, delimiter=',', encoding='utf-8'):
-    """Process a CSV file with specific delimiter and encoding"""
-    try:
-        file_path = datasource.file.path
-        print(f"Processing CSV file: {file_path}")
-        print(f"Using delimiter: '{delimiter}' and encoding: {encoding}")
+def job_detail(request, pk):
+    """Show the progress of an ingest job"""
+    job = get_object_or_404(IngestJob.objects.select_related('data_source'), pk=pk, user=request.user)
 
-        # Try to read with pandas
-        df = pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, engine='python')
-        print(f"CSV read successful. Columns: {df.columns.tolist()}")
-        print(f"Found {len(df)} rows")
+    context = get_schemascope_nav_context(active_tab='Upload')
 
-        return create_schema_from_dataframe(df, datasource)
-    except Exception as e:
-        print(f"Error processing CSV file: {e}")
-        # Try with different engine as fallback
-        try:
-            print("Trying with C engine instead...")
-            df = pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, engine='c')
-            return create_schema_from_dataframe(df, datasource)
-        except Exception as e2:
-            print(f"Second attempt failed: {e2}")
-            return False
+    context.update({
+        'job': job,
+        'datasource': job.data_source,
+        'title': f'Processing: {job.data_source.original_filename}'
+    })
 
+    return render(request, 'schemascope/job_detail.html', context)
 
-def process_excel_file(datasource, sheet_name=0):
-    """Process an Excel file with specific sheet"""
-    try:
-        file_path = datasource.file.path
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
-        return create_schema_from_dataframe(df, datasource)
-    except Exception as e:
-        print(f"Error processing Excel file: {e}")
-        return False
 
+def job_status(request, pk):
+    """Return the status and stages of an ingest job as JSON, for polling"""
+    job = get_object_or_404(IngestJob, pk=pk, user=request.user)
 
-def process_json_file(datasource, encoding='utf-8'):
-    """Process a JSON file"""
-    try:
-        file_path = datasource.file.path
-        with open(file_path, 'r', encoding=encoding) as f:
-            data = json.load(f)
-
-        # Convert to dataframe - this handles different JSON structures
-        if isinstance(data, list):
-            # List of records
-            df = pd.DataFrame(data)
-        elif isinstance(data, dict):
-            # Try to convert dictionary to dataframe
-            if all(isinstance(data[key], (list, dict)) for key in data):
-                # Nested structure - flatten first level
-                flattened = {}
-                for key, value in data.items():
-                    if isinstance(value, list):
-                        flattened[key] = value
-                    elif isinstance(value, dict):
-                        for subkey, subvalue in value.items():
-                            flattened[f"{key}_{subkey}"] = subvalue
-                df = pd.DataFrame(flattened)
-            else:
-                # Simple dict
-                df = pd.DataFrame([data])
-        else:
-            # Unsupported JSON structure
-            return False
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'stage': job.stage,
+        'stages': job.get_stages(),
+        'error': job.error,
+        'attempts': job.attempts,
+        'finished': job.is_finished,
+        'datasource_url': reverse('schemascope:datasource_detail', args=[job.data_source_id]),
+    })
 
-        return create_schema_from_dataframe(df, datasource)
-    except Exception as e:
-        print(f"Error processing JSON file: {e}")
-        return False
 
+def retry_ingest_job(request, pk):
+    """Queue a failed ingest job again, without re-uploading the file"""
+    job = get_object_or_404(IngestJob, pk=pk, user=request.user)
 
-def create_schema_from_dataframe(df, datasource):
-    """Create schema definition from a pandas DataFrame"""
-    try:
-        # Remove any existing schema (in case this is a retry)
-        try:
-            old_schema = SchemaDefinition.objects.get(data_source=datasource)
-
-            # Remove related primary key candidates
-            PrimaryKeyCandidate.objects.filter(schema=old_schema).delete()
-
-            # Remove the schema itself
-            old_schema.delete()
-        except SchemaDefinition.DoesNotExist:
-            pass
-
-        # Detect schema
-        column_definitions = {}
-        for column in df.columns:
-            column_type = str(df[column].dtype)
-
-            # Check for categorical data
-            if column_type == 'object' and df[column].nunique() < len(df) * 0.5:
-                column_type = 'category'
-
-            column_definitions[column] = {
-                'type': column_type,
-                'sample_values': df[column].dropna().head(5).tolist()
-            }
-
-        # Create schema definition
-        schema = SchemaDefinition.objects.create(
-            data_source=datasource,
-            column_definitions=json.loads(json.dumps(column_definitions, cls=CustomJSONEncoder)),
-            row_count=len(df)
-        )
-
-        # Identify potential primary keys
-        for column in df.columns:
-            # Skip columns with NaN values
-            if df[column].isna().any():
-                continue
-
-            # Calculate uniqueness ratio
-            uniqueness = df[column].nunique() / len(df)
-
-            # Only consider columns with high uniqueness (>80%)
-            if uniqueness > 0.8:
-                PrimaryKeyCandidate.objects.create(
-                    schema=schema,
-                    column_name=column,
-                    uniqueness_ratio=uniqueness,
-                    is_confirmed=False  # Needs user confirmation
-                )
-
-        # Check for relationships with existing sources
-        find_related_sources(datasource)
-
-        # Record this as the initial version
-        SchemaChange.objects.create(
-            source=datasource,
-            change_type='initial',
-            details={'columns': list(column_definitions.keys())}
-        )
+    if request.method == 'POST':
+        if retry_job(job):
+            messages.success(request, 'Schema detection has been queued again')
+        else:
+            messages.error(request, 'Only failed jobs can be retried')
 
-        return True
-    except Exception as e:
-        print(f"Error creating schema from DataFrame: {e}")
-        return False
+    return redirect('schemascope:job_detail', pk=job.pk)
 
 
 def file_preview(request, pk):
@@ -535,17 +399,24 @@ def file_preview(request, pk):
         file_path = datasource.file.path
 
         if file_type == 'csv':
+            # 'auto' options are sniffed from the start of the file
+            plan = csv_plan(file_path, {'delimiter': delimiter, 'encoding': encoding})
+
             # Read as text file for preview
-            with open(file_path, 'r', encoding=encoding) as f:
-                lines = [line.strip() for line in f.readlines()[:10]]
-                preview_text = '\n'.join(lines)
+            preview_text = '\n'.join(head_lines(file_path, encoding=plan.encoding))
 
             # Also provide the delimiter used for the client-side parser
-            response_data['delimiter'] = delimiter
+            response_data['delimiter'] = plan.delimiter
+            response_data['encoding'] = plan.encoding
 
             # Try to also parse as a DataFrame for table data
             try:
-                df = pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, nrows=10, engine='python')
+                cached = cached_reader(datasource, {'file_type': 'csv', 'delimiter': delimiter, 'encoding': encoding})
+                if cached is not None:
+                    df = cached.head(10)
+                else:
+                    df = pd.read_csv(file_path, delimiter=plan.delimiter, encoding=plan.encoding, nrows=10,
+                                     engine='python', **plan.read_options())
                 # Convert DataFrame to a simple format for the table view
                 response_data['table_data'] = {
                     'headers': df.columns.tolist(),
@@ -565,7 +436,12 @@ def file_preview(request, pk):
                 elif not sheet_name:
                     sheet_name = 0
 
-                df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=10)
+                # Parsing a workbook is slow; use the cached parse if there is one
+                cached = cached_reader(datasource, {'file_type': 'excel', 'sheet_name': sheet_name})
+                if cached is not None:
+                    df = cached.head(10)
+                else:
+                    df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=10)
                 preview_text = df.to_string(index=False)
 
                 # Also provide table data - strictly limit to 10 rows total (including header)
@@ -577,34 +453,21 @@ def file_preview(request, pk):
                 preview_text = f"Error reading Excel file: {str(e)}"
 
         elif file_type == 'json':
-            # Read JSON and format nicely
+            # Parse only the first records and format them nicely
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    data = json.load(f)
-                    # Format JSON with indentation for readability
-                    preview_text = json.dumps(data, indent=2)
-                    # Limit to reasonable size for preview
-                    if len(preview_text) > 2000:
-                        preview_text = preview_text[:2000] + "...\n[truncated]"
-
-                    # Try to convert to DataFrame if it's a list of objects
-                    if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
-                        try:
-                            df = pd.DataFrame(data[:10])  # Limit to 10 rows
-                            response_data['table_data'] = {
-                                'headers': df.columns.tolist(),
-                                'rows': df.head(9).values.tolist()  # 9 data rows + header = 10 total rows
-                            }
-                        except Exception as json_df_e:
-                            print(f"Error converting JSON to DataFrame: {str(json_df_e)}")
+                if encoding == 'auto':
+                    encoding = sniff_encoding(file_path)
+                preview_text, table_data = json_preview(file_path, encoding=encoding)
+                if table_data:
+                    response_data['table_data'] = table_data
             except Exception as e:
                 preview_text = f"Error reading JSON file: {str(e)}"
 
         else:
             # Generic text preview
-            with open(file_path, 'r', encoding=encoding) as f:
-                lines = [line.strip() for line in f.readlines()[:10]]
-                preview_text = '\n'.join(lines)
+            if encoding == 'auto':
+                encoding = sniff_encoding(file_path)
+            preview_text = '\n'.join(head_lines(file_path, encoding=encoding))
 
     except Exception as e:
         preview_text = f"Error generating preview: {str(e)}"
@@ -639,11 +502,7 @@ def reprocess_file(request, pk):
         create_new_version = request.POST.get('create_new_version') == 'on'
 
         # Check if a schema already exists for this datasource
-        try:
-            existing_schema = SchemaDefinition.objects.get(data_source=datasource)
-            schema_exists = True
-        except SchemaDefinition.DoesNotExist:
-            schema_exists = False
+        schema_exists = SchemaDefinition.objects.filter(data_source=datasource).exists()
 
         # Determine if we need a new version
         if schema_exists and create_new_version:
@@ -668,7 +527,11 @@ def reprocess_file(request, pk):
                 file=datasource.file,
                 canonical_name=datasource.canonical_name,
                 schema_version=datasource.schema_version + 1,
-                source_type=file_type
+                source_type=file_type,
+                user=datasource.user,
+                # The same file, so its profile and Parquet cache are reused
+                content_hash=datasource.content_hash,
+                content_size=datasource.content_size
             )
 
             # Store the target datasource for processing
@@ -678,74 +541,82 @@ def reprocess_file(request, pk):
             datasource.source_type = file_type
             datasource.save()
 
-            # Use the current datasource for processing
+            # Use the current datasource for processing; any existing schema
+            # is replaced once the new one has been detected
             target_datasource = datasource
 
-            # If a schema exists, remove it for reprocessing
-            if schema_exists:
-                # Remove related primary key candidates
-                PrimaryKeyCandidate.objects.filter(schema=existing_schema).delete()
+        job = enqueue_ingest(target_datasource, processing_options(request.POST, file_type), user=request.user)
+        if target_datasource.pk != datasource.pk:
+            messages.success(request, f'Queued new schema version (v{target_datasource.schema_version}) '
+                                      f'for {target_datasource.original_filename}')
+        else:
+            messages.success(request, f'Queued re-analysis of {target_datasource.original_filename}')
+        return redirect('schemascope:job_detail', pk=job.pk)
 
-                # Remove the schema itself
-                existing_schema.delete()
+    # Redirect back to the datasource detail
+    return redirect('schemascope:datasource_detail', pk=datasource.pk)
 
-        # Process based on file type
-        if file_type == 'csv':
-            # Get delimiter
-            delimiter_preset = request.POST.get('delimiter_preset')
-            delimiter = ','  # Default
-
-            if delimiter_preset == 'tab':
-                delimiter = '\t'
-            elif delimiter_preset == 'semicolon':
-                delimiter = ';'
-            elif delimiter_preset == 'pipe':
-                delimiter = '|'
-            elif delimiter_preset == 'custom':
-                custom_delimiter = request.POST.get('delimiter_custom')
-                if custom_delimiter:
-                    delimiter = custom_delimiter
-
-            encoding = request.POST.get('encoding', 'utf-8')
-
-            # Call function to process CSV with specific delimiter
-            success = process_csv_file(target_datasource, delimiter=delimiter, encoding=encoding)
 
-        elif file_type == 'excel':
-            sheet_name = request.POST.get('sheet_name')
-            # If sheet_name is a number, convert to int
-            if sheet_name and sheet_name.isdigit():
-                sheet_name = int(sheet_name)
-            # If empty, set to 0 (first sheet)
-            elif not sheet_name:
-                sheet_name = 0
+def add_quality_rule(request, pk):
+    """Add a data quality rule to a data source's schema and evaluate it"""
+    datasource = get_object_or_404(DataSource, pk=pk, user=request.user)
+    schema = get_object_or_404(SchemaDefinition, data_source=datasource)
 
-            success = process_excel_file(target_datasource, sheet_name=sheet_name)
+    if request.method == 'POST':
+        column_name = request.POST.get('column_name')
+        rule_type = request.POST.get('rule_type')
+        reference_source = None
+        try:
+            if column_name not in schema.get_columns():
+                raise ValueError(f"'{column_name}' is not a column of this schema")
+            parameters = rule_parameters(rule_type, request.POST)
+            if rule_type == 'reference':
+                reference_source = DataSource.objects.filter(
+                    pk=request.POST.get('reference_source') or None, user=request.user, schema__isnull=False
+                ).first()
+                if reference_source is None:
+                    raise ValueError('Choose the data source the column references')
+                if parameters['column'] not in reference_source.schema.get_columns():
+                    raise ValueError(f"{reference_source.original_filename} has no column '{parameters['column']}'")
+        except ValueError as e:
+            messages.error(request, f'Could not add the rule: {e}')
+            return redirect('schemascope:datasource_detail', pk=datasource.pk)
+
+        rule = QualityRule.objects.create(
+            schema=schema,
+            column_name=column_name,
+            rule_type=rule_type,
+            parameters=parameters,
+            reference_source=reference_source
+        )
+        job = enqueue_validation(datasource, rules=[rule], user=request.user)
+        messages.success(request, f'Added rule {rule}; checking it has been queued')
+        return redirect('schemascope:job_detail', pk=job.pk)
 
-        elif file_type == 'json':
-            encoding = request.POST.get('encoding', 'utf-8')
-            success = process_json_file(target_datasource, encoding=encoding)
+    return redirect('schemascope:datasource_detail', pk=datasource.pk)
 
-        else:
-            # Generic processing
-            success = process_file(target_datasource)
 
-        if success:
-            if target_datasource.pk != datasource.pk:
-                messages.success(request, f'Created new schema version (v{target_datasource.schema_version}) '
-                                          f'for {target_datasource.original_filename}')
-            else:
-                messages.success(request, f'Successfully re-analyzed {target_datasource.original_filename}')
-            return redirect('schemascope:datasource_detail', pk=target_datasource.pk)
-        else:
-            if target_datasource.pk != datasource.pk:
-                # If processing failed and we created a new datasource, delete it
-                target_datasource.delete()
-                messages.error(request, f'Failed to create new schema version for {datasource.original_filename}')
-            else:
-                messages.error(request, f'Failed to re-analyze {datasource.original_filename}')
+def delete_quality_rule(request, pk, rule_pk):
+    """Remove a data quality rule from a data source's schema"""
+    rule = get_object_or_404(QualityRule, pk=rule_pk, schema__data_source__pk=pk, schema__data_source__user=request.user)
+
+    if request.method == 'POST':
+        rule.delete()
+        messages.success(request, f'Removed rule: {rule}')
+
+    return redirect('schemascope:datasource_detail', pk=pk)
+
+
+def run_quality_checks(request, pk):
+    """Queue a check of all of a data source's quality rules"""
+    datasource = get_object_or_404(DataSource, pk=pk, user=request.user)
+    schema = get_object_or_404(SchemaDefinition, data_source=datasource)
+
+    if request.method == 'POST' and schema.quality_rules.exists():
+        job = enqueue_validation(datasource, user=request.user)
+        messages.success(request, 'Checking the data quality rules has been queued')
+        return redirect('schemascope:job_detail', pk=job.pk)
 
-    # Redirect back to the datasource detail
     return redirect('schemascope:datasource_detail', pk=datasource.pk)
 
 
@@ -755,24 +626,28 @@ def delete_datasource(request, pk):
 
     if request.method == 'POST':
         original_filename = datasource.original_filename
+        content_hash = datasource.content_hash
+
+        lineage = datasource.lineage
+        user_id = datasource.user_id
 
         # Delete the datasource (this will cascade to schema, primary keys, etc.)
         datasource.delete()
 
-        messages.success(request, f'Successfully deleted "{original_filename}"')
+        # Later versions are now diffed against the version before this one
+        if lineage is not None:
+            if lineage.versions.exists():
+                rebuild_lineage(lineage)
+            else:
+                lineage.delete()
 
-    return redirect('schemascope:schema_list')
+        # The user's catalog pages may list it
+        invalidate_catalog(user_id)
 
-class CustomJSONEncoder(DjangoJSONEncoder):
-    def default(self, obj):
-        from decimal import Decimal
-        import datetime
+        # Cached parses are shared by sources with the same file content
+        if content_hash and not DataSource.objects.filter(content_hash=content_hash).exists():
+            remove_cache(content_hash)
 
-        if isinstance(obj, Decimal):
-            return float(obj)
-        elif isinstance(obj, datetime.datetime):
-            return obj.strftime('%Y-%m-%d %H:%M:%S')
-        elif isinstance(obj, datetime.date):
-            return obj.strftime('%Y-%m-%d')
-        return super().default(obj)
+        messages.success(request, f'Successfully deleted "{original_filename}"')
 
+    return redirect('schemascope:schema_list')
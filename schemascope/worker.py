@@ -0,0 +1,9 @@
+# schemascope/worker.py
+# Kept free of model imports: pool processes import this module to run
+# setup_worker before Django has been configured.
+import django
+
+
+def setup_worker():
+    """Configure Django in a freshly spawned worker process"""
+    django.setup()